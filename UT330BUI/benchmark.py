@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 14:05:12 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Microbenchmarks for the model, controller, and view hot paths. The data is
+synthetic, from 100 records up to a full device (the readings limit), and the
+device is the simulator in model/simulator.py, so no hardware is needed. Each
+benchmark reports its best time over several runs, its throughput, and its
+peak memory (measured with tracemalloc in a separate run).
+
+To run the benchmarks and save the results, go to the UT330BUI folder and
+type in:
+
+    python benchmark.py --output before.json
+
+To compare a new run against saved results:
+
+    python benchmark.py --output after.json --compare before.json
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import argparse
+import base64
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from model.UT330 import UT330, modbusCRC
+from model.UT330Fleet import UT330Fleet
+from model.simulator import UT330Simulator, make_payload
+from view.readdisplay import ReadDisplay
+from view.readsave import ReadSave
+
+
+# %%---------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# The number of records to benchmark with, the last is a full device
+SIZES = [100, 1000, 10000, 60000]
+
+# The number of config or offset responses parsed per timed run
+PARSES = 1000
+
+
+# %%---------------------------------------------------------------------------
+# Controller
+# -----------------------------------------------------------------------------
+class BenchmarkController():
+    """Stands in for the Controller so the views can be benchmarked without
+    a Bokeh server or a device."""
+
+    def __init__(self):
+
+        self.status = ""
+        self.connected = False
+        self.device_data = None
+        self.device_config = None
+        self.device_offsets = None
+        self.store_version = 0
+
+    def update(self):
+
+        pass
+
+    def store_data(self):
+
+        # The benchmarks don't include the store
+        return 0
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def measure(function, repeat):
+    """Returns the best time in seconds over repeat runs of function, and
+    the peak memory in bytes of one more run."""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(times), peak
+
+
+def result(name, records, byte_count, seconds, peak):
+    """Returns the benchmark results as a dict ready for JSON"""
+
+    return {'benchmark': name,
+            'records': records,
+            'bytes': byte_count,
+            'seconds': seconds,
+            'records per second': records/seconds if seconds else None,
+            'MB per second': byte_count/seconds/1e6 if seconds else None,
+            'peak memory (MB)': peak/1e6}
+
+
+def data_frame(payload):
+    """Returns the read_data response body for the records: the records
+    followed by the CRC."""
+
+    header = b'\xab\xcd\x00\x19' + (len(payload) + 2).to_bytes(4, 'little')
+    msb, lsb = modbusCRC(header + payload)
+
+    return payload + bytes([lsb, msb])
+
+
+def benchmark_crc(size, repeat):
+    """modbusCRC over a full read_data response"""
+
+    frame = b'\xab\xcd\x00\x19' + bytes(4) + make_payload(size)
+
+    seconds, peak = measure(lambda: modbusCRC(frame), repeat)
+
+    return [result('modbusCRC', size, len(frame), seconds, peak)]
+
+
+def benchmark_decode(size, repeat):
+    """Decoding a read_data response in each mode"""
+
+    body = data_frame(make_payload(size))
+    ut330 = UT330()
+    results = []
+
+    for mode in ['batch', 'records', 'columns', 'runs']:
+
+        def decode():
+            ut330._buffer = body
+            ut330._decode_data(len(body), mode)
+
+        seconds, peak = measure(decode, repeat)
+        results.append(result('read_data decode ({0})'.format(mode),
+                              size, len(body), seconds, peak))
+
+    return results
+
+
+def benchmark_read_data(size, repeat):
+    """read_data from the simulator: command, transfer, checks, decode"""
+
+    results = []
+
+    with UT330Simulator(records=size) as simulator:
+
+        ut330 = UT330()
+        ut330.connect(simulator.port)
+
+        for mode in ['batch', 'records', 'columns']:
+            seconds, peak = measure(lambda: ut330.read_data(mode=mode),
+                                    repeat)
+            results.append(result('read_data simulator ({0})'.format(mode),
+                                  size, size*12, seconds, peak))
+
+        ut330.disconnect()
+
+    return results
+
+
+def benchmark_parse(repeat):
+    """Parsing the read_config and read_offsets responses"""
+
+    with UT330Simulator(records=100) as simulator:
+        responses = {'read_config': simulator.respond(0x11),
+                     'read_offsets': simulator.respond(0x17)}
+
+    ut330 = UT330()
+    results = []
+
+    for name, response in responses.items():
+
+        decoder = ut330._decode_config if name == 'read_config' \
+            else ut330._decode_offsets
+
+        def parse():
+            ut330._buffer = response
+            for _ in range(PARSES):
+                decoder()
+
+        seconds, peak = measure(parse, repeat)
+        results.append(result('{0} parse'.format(name), PARSES,
+                              PARSES*len(response), seconds, peak))
+
+    return results
+
+
+def benchmark_views(size, repeat, folder):
+    """ReadSave writing a CSV file and ReadDisplay reading it back"""
+
+    with UT330Simulator(records=size) as simulator:
+        ut330 = UT330()
+        ut330.connect(simulator.port)
+        data = ut330.read_data()
+        ut330.disconnect()
+
+    controller = BenchmarkController()
+    controller.device_data = data
+
+    readsave = ReadSave(controller)
+    readsave.folder = folder
+    readsave.file_format.value = 'CSV'
+
+    seconds, peak = measure(readsave.callback_write_to_disk, repeat)
+
+    file_name = readsave.status.text.replace('Wrote data to file ', '')[:-1]
+    byte_count = os.path.getsize(file_name)
+
+    results = [result('ReadSave write CSV', size, byte_count, seconds, peak)]
+
+    with open(file_name, 'rb') as csv_file:
+        contents = csv_file.read()
+
+    readdisplay = ReadDisplay(controller)
+    readdisplay.select_file.filename = os.path.basename(file_name)
+    readdisplay.select_file.value = base64.b64encode(contents).decode('ascii')
+
+    seconds, peak = measure(
+        lambda: readdisplay.callback_select_file('value', None, None), repeat)
+
+    results.append(result('ReadDisplay select file', size, byte_count,
+                          seconds, peak))
+
+    os.remove(file_name)
+
+    return results
+
+
+def benchmark_fleet(size, devices, repeat, folder):
+    """Downloading from several devices at once with UT330Fleet, then
+    writing each device's data to its own file"""
+
+    # Each device starts logging on a different day, so each device's data
+    # file gets a different name
+    simulators = [UT330Simulator(records=make_payload(
+                      size, datetime.datetime(2020, 1, 1 + seed), seed=seed))
+                  for seed in range(devices)]
+
+    try:
+        fleet = UT330Fleet(ports=[simulator.port
+                                  for simulator in simulators])
+        fleet.connect()
+
+        seconds, peak = measure(lambda: fleet.read_data(mode='columns'),
+                                repeat)
+        results = [result('UT330Fleet read_data ({0} devices)'
+                          .format(devices), size*devices, size*devices*12,
+                          seconds, peak)]
+
+        data = fleet.read_data()
+        fleet.disconnect()
+    finally:
+        for simulator in simulators:
+            simulator.close()
+
+    controller = BenchmarkController()
+    readsave = ReadSave(controller)
+    readsave.folder = folder
+
+    def write_archive():
+        for readings in data.values():
+            controller.device_data = readings
+            readsave.callback_write_to_disk()
+
+    seconds, peak = measure(write_archive, repeat)
+    byte_count = sum(entry.stat().st_size for entry in os.scandir(folder))
+    results.append(result('ReadSave write archive ({0} devices)'
+                          .format(devices), size*devices, byte_count,
+                          seconds, peak))
+
+    return results
+
+
+def metadata():
+    """Returns details of the run so results can be compared fairly"""
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(
+                                    os.path.realpath(__file__))
+                                ).stdout.strip()
+    except OSError:
+        commit = ''
+
+    return {'timestamp': datetime.datetime.now().isoformat(),
+            'commit': commit,
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor()}
+
+
+def compare(results, old_file):
+    """Prints how much faster or slower each benchmark is than the saved
+    results in old_file"""
+
+    with open(old_file) as json_file:
+        old = {(entry['benchmark'], entry['records']): entry['seconds']
+               for entry in json.load(json_file)['results']}
+
+    print("\nCompared with {0}:".format(old_file))
+
+    for entry in results:
+        key = (entry['benchmark'], entry['records'])
+        if key not in old:
+            continue
+        print("{0:<42} {1:>7} {2:>7.2f}x".format(
+            entry['benchmark'], entry['records'], old[key]/entry['seconds']))
+
+
+# %%---------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+def main():
+    """Runs the benchmarks, prints the results, and saves them as JSON."""
+
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the UT330BUI model, controller, and views.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='record counts to benchmark (default: {0})'
+                             .format(SIZES))
+    parser.add_argument('--devices', type=int, default=4,
+                        help='number of simulated devices for the '
+                             'multi-device benchmarks (default: 4)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs per benchmark, the best time is used '
+                             '(default: 5)')
+    parser.add_argument('--output', default=None,
+                        help='JSON file to save the results to')
+    parser.add_argument('--compare', default=None,
+                        help='JSON file of earlier results to compare with')
+    args = parser.parse_args()
+
+    results = benchmark_parse(args.repeat)
+
+    with tempfile.TemporaryDirectory() as folder:
+
+        for size in args.sizes:
+            results += benchmark_crc(size, args.repeat)
+            results += benchmark_decode(size, args.repeat)
+            results += benchmark_read_data(size, args.repeat)
+            results += benchmark_views(size, args.repeat, folder)
+
+        results += benchmark_fleet(max(args.sizes), args.devices,
+                                   args.repeat, folder)
+
+    print("{0:<42} {1:>7} {2:>10} {3:>12} {4:>8} {5:>9}".format(
+        'Benchmark', 'Records', 'Time (ms)', 'Records/s', 'MB/s',
+        'Peak (MB)'))
+    for entry in results:
+        print("{0:<42} {1:>7} {2:>10.3f} {3:>12.0f} {4:>8.1f} {5:>9.2f}"
+              .format(entry['benchmark'], entry['records'],
+                      entry['seconds']*1000, entry['records per second'],
+                      entry['MB per second'], entry['peak memory (MB)']))
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump({'metadata': metadata(), 'results': results},
+                      json_file, indent=2)
+        print("\nSaved the results to {0}".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 14:47:30 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+A command line tool for the UT330 that doesn't need the GUI. It only imports
+the model layer, and NumPy only when data is downloaded, so it starts quickly
+enough to run from cron or udev on small computers. Here's how to use it:
+
+    python cli.py download --folder data --erase
+    python cli.py download --output - --store > readings.csv
+    python cli.py config
+    python cli.py offsets
+    python cli.py sync-time
+    python cli.py erase
+    python cli.py tuning --page-size 8192
+
+Every command takes --port to choose the serial port, otherwise the last
+UT330 found is used. Errors go to stderr and give an exit code of 1. The
+page size, read timeout, and pauses learned for each port are kept in
+TUNING_FILE between runs (--tuning-file to use another file).
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import argparse
+import datetime
+import json
+import os
+import sys
+
+from model.UT330 import (UT330, CommandPacer, PartialDataError, ReadTuner,
+                         STORE_FILE, TUNING_FILE, find_ports, load_tuning,
+                         save_tuning)
+
+
+# %%---------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# The CSV column headings, the same as the files the GUI writes
+HEADER = ('Timestamp,Temperature (C),Relative humidity (%),'
+          'Pressure (hPa)\n')
+
+# The number of rows formatted and written at a time
+CHUNK = 8192
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def write_csv(columns, output):
+    """Writes the read_data columns (or RecordBatch) to the open text file
+    output as CSV, a chunk of rows at a time."""
+
+    import numpy as np
+
+    timestamps = np.datetime_as_string(columns['Timestamp'], unit='s')
+    temperatures = columns['Temperature (C)']
+    humidities = columns['Relative humidity (%)']
+    pressures = columns['Pressure (hPa)']
+
+    output.write(HEADER)
+
+    for start in range(0, len(timestamps), CHUNK):
+
+        stop = start + CHUNK
+
+        output.write(''.join(
+            '{0} {1},{2},{3},{4}\n'.format(timestamp[:10], timestamp[11:],
+                                           temperature, humidity, pressure)
+            for timestamp, temperature, humidity, pressure in zip(
+                timestamps[start:stop].tolist(),
+                temperatures[start:stop].tolist(),
+                humidities[start:stop].tolist(),
+                pressures[start:stop].tolist())))
+
+
+def print_dict(values):
+    """Prints a config or offsets dict as one 'name: value' per line"""
+
+    sys.stdout.write(''.join('{0}: {1}\n'.format(name, value)
+                             for name, value in values.items()))
+
+
+def download(ut330, args):
+    """Downloads the data and writes it to a file, or to stdout if the output
+    is -"""
+
+    # If the download stopped part way, save the records that did arrive
+    partial = None
+    try:
+        data = ut330.read_data()
+    except PartialDataError as error:
+        partial = error
+        data = error.data
+
+    count = len(data)
+
+    if count == 0:
+        if partial is not None:
+            raise partial
+        print("No data on the device.", file=sys.stderr)
+        return
+
+    if args.output == '-':
+        write_csv(data, sys.stdout)
+    else:
+
+        output = args.output
+        if output is None:
+            # Name the file after the most recent reading, like the GUI does
+            latest = data.timestamps.max().item()
+            output = os.path.join(
+                args.folder,
+                'UT330_data_{0}'.format(latest.strftime("%Y%m%d_%H%M%S")))
+            os.makedirs(args.folder, exist_ok=True)
+
+        if args.format == 'Parquet':
+            from model.archive import write_frame
+            output = write_frame(data, os.path.splitext(output)[0],
+                                 'Parquet')
+        else:
+            if os.path.splitext(output)[1] == '':
+                output += '.csv'
+            with open(output, 'w', newline='') as csv_file:
+                write_csv(data, csv_file)
+
+        print("Wrote {0} records to {1}".format(count, output),
+              file=sys.stderr)
+
+    # Add the readings to the store as well, without duplicating any that
+    # are there from earlier downloads
+    if args.store is not None:
+        from model.store import DataStore
+        with DataStore(args.store) as store:
+            added = store.ingest(ut330.read_device_name(), data)
+        print("Added {0} new readings to {1}".format(added, args.store),
+              file=sys.stderr)
+
+    # Report the missing records now the rest are safe, and don't erase them
+    if partial is not None:
+        raise partial
+
+    # Only erase the data once it's safely written
+    if args.erase:
+        ut330.delete_data()
+
+
+def config(ut330, args):
+    """Prints the device configuration"""
+
+    print_dict(ut330.read_config())
+
+
+def offsets(ut330, args):
+    """Prints the current readings and offsets"""
+
+    print_dict(ut330.read_offsets())
+
+
+def sync_time(ut330, args):
+    """Sets the device clock to the computer's clock"""
+
+    timestamp = datetime.datetime.now().replace(microsecond=0)
+    ut330.write_datetime(timestamp)
+
+    print("Set the device time to {0}".format(timestamp), file=sys.stderr)
+
+
+def erase(ut330, args):
+    """Erases the data on the device"""
+
+    ut330.delete_data()
+
+    print("Erased the data on the device.", file=sys.stderr)
+
+
+def tuning_port(args):
+    """Returns the port to show or change the tuning for: --port, the last
+    UT330 found, or the only port in the tuning file. The device doesn't
+    need to be plugged in."""
+
+    if args.port is not None:
+        return args.port
+
+    ports = find_ports()
+    if ports:
+        return ports[-1]
+
+    try:
+        with open(args.tuning_file) as tuning_file:
+            saved = sorted(json.load(tuning_file))
+    except (OSError, ValueError):
+        saved = []
+
+    if len(saved) == 1:
+        return saved[0]
+
+    raise IOError('Error! No UT330 was found, use --port to choose which '
+                  'port to tune. The tuning file has the ports {0}.'
+                  .format(saved))
+
+
+def tuning(ut330, args):
+    """Prints the learned page size, read timeout, and pauses, after
+    making any changes asked for. Setting the page size or read timeout
+    stops them being learned until --learn is given. This only changes the
+    tuning file, so it doesn't connect to the device."""
+
+    port = tuning_port(args)
+
+    if args.reset:
+        ut330.tuner = ReadTuner()
+        ut330.pacer = CommandPacer()
+    else:
+        saved = load_tuning(args.tuning_file, port)
+        if saved is not None:
+            ut330.load_tuning(saved)
+
+    tuner = ut330.tuner
+
+    if args.page_size is not None and \
+       not tuner.min_page_size <= args.page_size <= tuner.max_page_size:
+        raise ValueError('Error! The page size is {0} but it must be '
+                         'between {1} and {2}'.format(args.page_size,
+                                                      tuner.min_page_size,
+                                                      tuner.max_page_size))
+
+    if args.read_timeout is not None and \
+       not tuner.min_read_timeout <= args.read_timeout <= \
+       tuner.max_read_timeout:
+        raise ValueError('Error! The read timeout is {0} but it must be '
+                         'between {1} and {2}'.format(args.read_timeout,
+                                                      tuner.min_read_timeout,
+                                                      tuner.max_read_timeout))
+
+    if args.page_size is not None:
+        ut330.tuner.page_size = args.page_size
+        ut330.tuner.learn = False
+
+    if args.read_timeout is not None:
+        ut330.tuner.read_timeout = args.read_timeout
+        ut330.tuner.learn = False
+
+    if args.learn:
+        ut330.tuner.learn = True
+
+    settings = ut330.tuning()
+    save_tuning(args.tuning_file, port, settings)
+
+    print_dict({'port': port})
+    print_dict(settings['transport'])
+    print_dict({'pause ' + command: gap
+                for command, gap in settings['pacer']['gaps'].items()})
+
+
+def parse_args(argv=None):
+    """Returns the parsed command line arguments"""
+
+    parser = argparse.ArgumentParser(
+        prog='ut330', description='Controls a UT330 data logger.')
+    parser.add_argument('--port', default=None,
+                        help='serial port the UT330 is on (default: the '
+                             'last UT330 found)')
+    parser.add_argument('--tuning-file', default=TUNING_FILE,
+                        help='file to keep the learned page size, read '
+                             'timeout, and pauses in (default: {0})'
+                             .format(TUNING_FILE))
+    parser.set_defaults(connect=True)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_download = commands.add_parser(
+        'download', help='download the data to a file')
+    parser_download.add_argument('--output', default=None,
+                                 help='file to write, - for stdout '
+                                      '(default: named after the most recent '
+                                      'reading, in the folder)')
+    parser_download.add_argument('--folder', default='.',
+                                 help='folder to write the file in '
+                                      '(default: the current folder)')
+    parser_download.add_argument('--format', choices=['CSV', 'Parquet'],
+                                 default='CSV',
+                                 help='file format (default: CSV)')
+    parser_download.add_argument('--store', nargs='?', default=None,
+                                 const=STORE_FILE,
+                                 help='also add the readings to a SQLite '
+                                      'store (default: {0})'
+                                      .format(STORE_FILE))
+    parser_download.add_argument('--erase', action='store_true',
+                                 help='erase the data on the device once '
+                                      "it's written")
+    parser_download.set_defaults(function=download)
+
+    commands.add_parser(
+        'config', help='print the device configuration'
+    ).set_defaults(function=config)
+    commands.add_parser(
+        'offsets', help='print the current readings and offsets'
+    ).set_defaults(function=offsets)
+    commands.add_parser(
+        'sync-time', help="set the device clock to the computer's clock"
+    ).set_defaults(function=sync_time)
+    commands.add_parser(
+        'erase', help='erase the data on the device'
+    ).set_defaults(function=erase)
+
+    parser_tuning = commands.add_parser(
+        'tuning', help='print or change the learned page size, read '
+                       'timeout, and pauses')
+    parser_tuning.add_argument('--page-size', type=int, default=None,
+                               help='read the device this many bytes at a '
+                                    'time')
+    parser_tuning.add_argument('--read-timeout', type=float, default=None,
+                               help='seconds to wait for the device')
+    parser_tuning.add_argument('--learn', action='store_true',
+                               help='go back to learning the page size and '
+                                    'read timeout')
+    parser_tuning.add_argument('--reset', action='store_true',
+                               help='forget everything learned')
+    parser_tuning.set_defaults(function=tuning, connect=False)
+
+    return parser.parse_args(argv)
+
+
+# %%---------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    """Runs the command, returns the exit code"""
+
+    args = parse_args(argv)
+
+    ut330 = UT330(tuning_file=args.tuning_file)
+
+    try:
+        # The tuning command only changes the tuning file
+        if args.connect:
+            ut330.connect(args.port)
+        args.function(ut330, args)
+    except (IOError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 1
+    finally:
+        ut330.disconnect()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,10 +12,18 @@ This code is licensed under the MIT license
 # %%---------------------------------------------------------------------------
 # Imports
 # -----------------------------------------------------------------------------
+import datetime
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from bokeh.io import curdoc
 from bokeh.models.widgets import Tabs
-from model.UT330 import UT330
+from model.UT330 import UT330, PartialDataError, TUNING_FILE
+from model.cache import CachedUT330
+from model.store import DataStore, STORE_FILE
 from view.intro import Intro
+from view.live import Live
 from view.readdisplay import ReadDisplay
 from view.settings import Settings
 from view.readsave import ReadSave
@@ -28,6 +36,9 @@ class Controller():
     """The Controller class is part of the model-view-controller architecture.
     Links views and Model and controls interaction between them."""
 
+    # The shortest time (s) between download progress updates in the UI
+    PROGRESS_INTERVAL = 0.25
+
     # %%
     def __init__(self):
         """Method initializes object. First part of two-part initialization.
@@ -36,22 +47,68 @@ class Controller():
 
         self.status = "UT330B not connected."
         self.connected = False
+
+        # The data read from the device, as a RecordBatch
         self.device_data = None
         self.device_config = None
         self.device_offsets = None
-
-        self.UT330B = UT330()
+        self.device_current = None
+
+        # The latest read_data progress report, and when it was sent to the
+        # document
+        self.device_progress = None
+        self.progress_time = 0
+
+        # When the config was read, the computer time before and after
+        self.device_config_times = None
+
+        # The latest snapshot of the device name, config, and offsets
+        self.device_snapshot = None
+
+        # The name of the device the data was read from
+        self.device_name = None
+
+        # The store of readings from every device, opened when it's first
+        # used. The version goes up when readings are added.
+        self.store = None
+        self.store_version = 0
+
+        # If there's a UT330 broker, the device is used through it so it can
+        # be shared with other sessions and processes
+        if os.environ.get('UT330_BROKER'):
+            from model.broker import UT330Client
+            self.UT330B = UT330Client(os.environ['UT330_BROKER'])
+        else:
+            self.UT330B = UT330(tuning_file=TUNING_FILE)
+
+        # The configuration, offsets, and device name can be cached so
+        # repeated reads don't go to the device
+        self.cache = None
+        if os.environ.get('UT330_CACHE_TTL'):
+            self.cache = CachedUT330(self.UT330B,
+                                     ttl=float(os.environ['UT330_CACHE_TTL']))
+            self.UT330B = self.cache
+
+        # Device actions run on this worker thread so they don't block the
+        # Bokeh server. There's one worker, so they run one at a time.
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.busy = False
+
+        # The document the results go back to, set when it's displayed
+        self.document = None
 
         # Instantiate each of the tabs.
         intro = Intro(self)
         readdisplay = ReadDisplay(self)
         settings = Settings(self)
         readsave = ReadSave(self)
+        live = Live(self)
 
         self.panels = [intro,
                        readdisplay,
                        settings,
-                       readsave]
+                       readsave,
+                       live]
 
         # Create tabs, note the order here is the display order.
         self.tabs = Tabs(tabs=[p.panel for p in self.panels])
@@ -75,115 +132,277 @@ class Controller():
         browser.
         Returns:
         None"""
-        curdoc().add_root(self.tabs)
-        curdoc().title = 'UT330BUI'
+        self.document = curdoc()
+        self.document.add_root(self.tabs)
+        self.document.title = 'UT330BUI'
+        self.document.on_session_destroyed(self.callback_session_destroyed)
+
+    # %%
+    def callback_session_destroyed(self, session_context):
+        """Releases the device and the worker thread when the browser
+        session closes"""
+
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+        # The worker may be part way through a download, so the device is
+        # disconnected as the worker's last job rather than from under it.
+        # Waiting here would hold up the server's other sessions.
+        def release():
+            if self.connected:
+                self.UT330B.disconnect()
+                self.connected = False
+
+        self.executor.submit(release)
+        self.executor.shutdown(wait=False)
 
     # %%
     # Device level actions
     # --------------------
+    # Each action checks it can run, then runs the device commands on the
+    # worker thread. When they finish, the action's done method runs with
+    # the document locked, sets the status, and updates the panels. callback
+    # is an optional method for the calling panel to run after that.
+
+    # %%
+    def run(self, work, done, callback=None):
+        """Runs work() on the worker thread, then done(future) and callback()
+        on the document's thread. Without a document (e.g. no Bokeh server),
+        everything runs straight away."""
+
+        self.busy = True
+
+        if self.document is None:
+            future = self.executor.submit(work)
+            future.exception()
+            self.finish(future, done, callback)
+            return
+
+        def finished(future):
+            # add_next_tick_callback is the thread safe way back into the
+            # document
+            self.document.add_next_tick_callback(
+                partial(self.finish, future, done, callback))
+
+        self.executor.submit(work).add_done_callback(finished)
+
+    # %%
+    def finish(self, future, done, callback):
+        """Handles the end of a device action"""
+
+        self.busy = False
+
+        done(future)
+        self.update()
+
+        if callback is not None:
+            callback()
 
     # %%
-    def connect(self):
+    def check_ready(self, action, connected=True):
+        """Returns True if the action can run. Otherwise, sets the status to
+        say why not and returns False."""
+
+        if self.busy:
+            self.status = ("Cannot {0} because the UT330B is busy. Please "
+                           "try again when it's finished.".format(action))
+        elif connected and not self.connected:
+            self.status = ("Cannot {0} because the UT330B is not "
+                           "connected.".format(action))
+        elif not connected and self.connected:
+            self.status = ("Cannot {0} because the UT330B is already "
+                           "connected.".format(action))
+        else:
+            return True
+
+        self.update()
+
+        return False
+
+    # %%
+    def connect(self, callback=None):
         """Connects to UT330B device."""
-        
-        if self.connected:
-            self.status = ("Cannot connect to UT330B because "
-                           "the UT330B is already connected.")
-            self.update()
+
+        if not self.check_ready("connect to UT330B", connected=False):
             return
 
+        self.status = "Connecting to UT330B..."
+        self.update()
+
+        self.run(self.UT330B.connect, self.connect_done, callback)
+
+    def connect_done(self, future):
         try:
-            self.UT330B.connect()
+            future.result()
             self.status = "Successful connection to UT330B."
             self.connected = True
         except IOError as error:
             self.status = error.__str__()
             self.connected = False
 
-        # Update all panels
-        self.update()
-
-
     # %%
-    def disconnect(self):
+    def disconnect(self, callback=None):
         """Disconnects from UT330B device."""
-        
-        if not self.connected:
-            self.status = ("Cannot disconnect UT330B because "
-                           "the UT330B is not connected.")
-            self.update()
+
+        if not self.check_ready("disconnect UT330B"):
             return
 
+        self.run(self.UT330B.disconnect, self.disconnect_done, callback)
+
+    def disconnect_done(self, future):
         try:
-            self.UT330B.disconnect()
+            future.result()
             self.status = "Disconnected from UT330B."
             self.connected = False
         except IOError as error:
             self.status = error.__str__()
 
-        self.update()
-
-
     # %%
-    def erase(self):
+    def erase(self, callback=None):
         """Erases data from UT330B device."""
-        
-        if not self.connected:
-            self.status = ("Cannot erase UT330B data because "
-                           "the UT330B is not connected.")
-            self.update()
+
+        if not self.check_ready("erase UT330B data"):
             return
 
+        self.status = "Erasing UT330B data..."
+        self.update()
+
+        self.run(self.UT330B.delete_data, self.erase_done, callback)
+
+    def erase_done(self, future):
         try:
-            self.UT330B.delete_data()
+            future.result()
             self.status = "Data erased from UT330B."
             self.device_data = None
         except IOError as error:
             self.status = error.__str__()
 
-        self.update()
-
     # %%
-    def read_data(self):
+    def read_data(self, callback=None):
         """Reads data from UT330B device."""
 
-        if not self.connected:
-            self.status = ("Cannot read UT330B data because the UT330B is "
-                           "not connected.")
-            self.update()
+        if not self.check_ready("read UT330B data"):
             return
 
-        self.status = ("Reading UT330B data. This may take some time "
-                       "if there's a lot of data...")
+        self.status = "Reading UT330B data..."
+        self.device_progress = None
         self.update()
-        
-        curdoc().add_next_tick_callback(self.read_data_2)
 
-    def read_data_2(self):
+        def work():
+            # The name is needed to put the data in the store
+            self.device_name = self.UT330B.read_device_name()
+            return self.UT330B.read_data(progress=self.read_data_progress)
+
+        self.run(work, self.read_data_done, callback)
+
+    def read_data_progress(self, progress):
+        """Passes download progress to the document. This is called on the
+        worker thread for every page read, so it's throttled."""
+
+        now = time.monotonic()
+        if now - self.progress_time < self.PROGRESS_INTERVAL and \
+           progress['bytes received'] < progress['bytes total']:
+            return
+
+        self.progress_time = now
+
+        if self.document is None:
+            self.show_progress(progress)
+        else:
+            self.document.add_next_tick_callback(
+                partial(self.show_progress, progress))
+
+    def show_progress(self, progress):
+        """Shows the download progress"""
+
+        # The download may have finished before this got here
+        if not self.busy:
+            return
+
+        self.device_progress = progress
+
+        self.status = ("Reading UT330B data: {0:,} of {1:,} bytes "
+                       "({2:,} records)".format(progress['bytes received'],
+                                                progress['bytes total'],
+                                                progress['records received']))
+        if progress['rate']:
+            self.status += ", {0:.1f} kB/s".format(progress['rate']/1000)
+        if progress['time left'] is not None:
+            self.status += ", about {0:.0f}s left".format(
+                progress['time left'])
+        self.status += "."
+
+        self.update()
+
+    def read_data_done(self, future):
+        # The download is over, however it ended
+        self.device_progress = None
+
         try:
-            self.device_data = self.UT330B.read_data()
+            self.device_data = future.result()
             self.status = "Data read from UT330B."
 
             if len(self.device_data) == 0:
                 self.status = "No data to read on device."
 
+        except PartialDataError as error:
+            # Keep the records that arrived rather than throw them away
+            self.device_data = error.data
+            self.status = error.__str__()
         except IOError as error:
             self.status = error.__str__()
 
-        self.update()
+    # %%
+    def data_store(self, create=True):
+        """Returns the store of readings, opening it if needed. If create is
+        False and there's no store file yet, returns None rather than make
+        an empty store."""
+
+        if self.store is None:
+            if not create and not os.path.exists(STORE_FILE):
+                return None
+
+            self.store = DataStore()
+
+        return self.store
 
     # %%
-    def read_config(self):
+    def store_data(self):
+        """Adds the data read from the device to the store, without
+        duplicating readings already there. Returns the number of readings
+        added."""
+
+        added = self.data_store().ingest(self.device_name, self.device_data)
+
+        if added:
+            self.store_version += 1
+
+        return added
+
+    # %%
+    def read_config(self, callback=None):
         """Reads config from UT330B device."""
-        
-        if not self.connected:
-            self.status = ("Cannot read UT330B configuration because "
-                           "the UT330B is not connected.")
-            self.update()
+
+        if not self.check_ready("read UT330B configuration"):
             return
 
+        def work():
+            before = datetime.datetime.now()
+            config = self.UT330B.read_config()
+            times = (before, datetime.datetime.now())
+
+            # A cached config was read earlier, so use the times then
+            if self.cache is not None:
+                times = self.cache.read_times('read_config') or times
+
+            return config, times
+
+        self.run(work, self.read_config_done, callback)
+
+    def read_config_done(self, future):
         try:
-            self.device_config = self.UT330B.read_config()
+            self.device_config, self.device_config_times = future.result()
             self.status = "Configuration read from UT330B."
 
             if len(self.device_config) == 0:
@@ -192,43 +411,66 @@ class Controller():
         except IOError as error:
             self.status = error.__str__()
 
-        self.update()
-
     # %%
-    def write_config(self, config):
+    def read_snapshot(self, callback=None):
+        """Reads the device name, config, and offsets from UT330B device in
+        one go."""
+
+        if not self.check_ready("read UT330B settings"):
+            return
+
+        self.run(self.UT330B.snapshot, self.read_snapshot_done, callback)
+
+    def read_snapshot_done(self, future):
+        try:
+            snapshot = future.result()
+            self.device_snapshot = snapshot
+            self.device_config = snapshot['config']
+            self.device_config_times = snapshot['config times']
+            self.device_offsets = snapshot['offsets']
+            self.status = ("Configuration and offsets read from UT330B in "
+                           "{0:.0f}ms.".format(snapshot['total time']*1000))
+        except IOError as error:
+            # The config and offsets from before aren't fresh, so they
+            # aren't shown as the snapshot
+            self.device_snapshot = None
+            self.status = error.__str__()
 
+    # %%
+    def write_config(self, config, callback=None):
         """Writes config data to UT330B device."""
 
-        if not self.connected:
-            self.status = ("Cannot write UT330B configuration because "
-                           "the UT330B is not connected.")
-            self.update()
+        if not self.check_ready("write UT330B configuration"):
             return
 
-        try:
+        def work():
             self.UT330B.write_config(config)
-            self.status = "Configuration written to UT330B. "
             self.UT330B.write_datetime(config['timestamp'])
-            self.status += "Datetime written to UT330B."
+
+        self.run(work, self.write_config_done, callback)
+
+    def write_config_done(self, future):
+        try:
+            future.result()
+            self.status = ("Configuration written to UT330B. "
+                           "Datetime written to UT330B.")
         except IOError as error:
-            self.status = error.__str__()          
+            self.status = error.__str__()
         except ValueError as error:
-            self.status = error.__str__()            
-
-        self.update()
+            self.status = error.__str__()
 
     # %%
-    def read_offsets(self):
+    def read_offsets(self, callback=None):
         """Reads offsets from UT330B device."""
 
-        if not self.connected:
-            self.status = ("Cannot read UT330B offsets because "
-                           "the UT330B is not connected.")
-            self.update()
+        if not self.check_ready("read UT330B offsets"):
             return
 
+        self.run(self.UT330B.read_offsets, self.read_offsets_done, callback)
+
+    def read_offsets_done(self, future):
         try:
-            self.device_offsets = self.UT330B.read_offsets()
+            self.device_offsets = future.result()
             self.status = "Offsets read from UT330B."
 
             if len(self.device_offsets) == 0:
@@ -237,26 +479,52 @@ class Controller():
         except IOError as error:
             self.status = error.__str__()
 
-        self.update()
+    # %%
+    def read_current(self, callback=None):
+        """Reads the current temperature and humidity from UT330B device
+        into device_current, which is None if they couldn't be read. The
+        status is only changed if there's a problem, so it can be called
+        every few seconds. If the UT330B is busy, nothing happens."""
+
+        if self.busy:
+            return
+
+        if not self.check_ready("read the current UT330B readings"):
+            self.device_current = None
+            if callback is not None:
+                callback()
+            return
+
+        # The readings must be current, so they're never from the cache
+        if self.cache is not None:
+            read = partial(self.cache.read_offsets, max_age=0)
+        else:
+            read = self.UT330B.read_offsets
+
+        self.run(read, self.read_current_done, callback)
+
+    def read_current_done(self, future):
+        try:
+            self.device_current = future.result()
+        except IOError as error:
+            self.device_current = None
+            self.status = error.__str__()
 
     # %%
-    def write_offsets(self, offsets):
+    def write_offsets(self, offsets, callback=None):
+        """Writes offsets data to UT330B device."""
 
-        """Writes config data to UT330B device."""
-        
-        if not self.connected:
-            self.status = ("Cannot write UT330B offsets because "
-                           "the UT330B is not connected.")
-            self.update()
+        if not self.check_ready("write UT330B offsets"):
             return
 
+        self.run(partial(self.UT330B.write_offsets, offsets),
+                 self.write_offsets_done, callback)
+
+    def write_offsets_done(self, future):
         try:
-            self.UT330B.write_offsets(offsets)
-            self.status = "Configuration written to UT330B. "
+            future.result()
+            self.status = "Offsets written to UT330B."
         except IOError as error:
             self.status = error.__str__()
         except ValueError as error:
             self.status = error.__str__()
-            
-        self.update()
-        
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 11:02:17 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Provides an asyncio interface to the UNI-T 330A/B/C data loggers. The
+AsyncUT330 class has coroutine versions of all the UT330 commands. The serial
+port is used in non-blocking mode and the pause between commands uses
+asyncio.sleep, so none of the commands block the event loop. This means one
+process can drive many devices without a thread per device.
+
+Here's how to use it:
+
+    async with AsyncUT330() as ut330:
+        name = await ut330.read_device_name()
+        data = await ut330.read_data()
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import asyncio
+import contextlib
+import datetime
+import io
+import time
+
+from model.UT330 import (UT330, PartialDataError, crc16, progress_report,
+                         DELETE_DATA_COMMAND, DELETE_DATA_RESPONSE,
+                         READ_CONFIG_COMMAND, READ_DATA_COMMAND,
+                         READ_DEVICE_NAME_COMMAND, READ_OFFSETS_COMMAND,
+                         RESTORE_FACTORY_COMMAND, RESTORE_FACTORY_RESPONSE,
+                         SNAPSHOT_COMMANDS, WRITE_CONFIG_RESPONSE,
+                         WRITE_DATETIME_RESPONSE, WRITE_OFFSETS_RESPONSE)
+
+
+# %%---------------------------------------------------------------------------
+# Function decorators
+# -----------------------------------------------------------------------------
+def async_buffer_safety(func):
+    """Coroutine version of buffer_safety. Waits for the pause the pacer
+    asks for between commands, and between retries, without blocking the
+    event loop. It also makes sure only one command at a time talks to the
+    device."""
+
+    command = func.__name__
+
+    async def run_command(self, *args, **kwargs):
+
+        # The most complete partial download so far
+        partial = None
+
+        for retry in [None] + self.retry.delays():
+
+            if retry is not None:
+                await asyncio.sleep(retry)
+                self._flush()
+
+            delay = self.pacer.delay(command)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            self._short_read = False
+
+            try:
+                data = await func(self, *args, **kwargs)
+            except (IOError, IndexError) as error:
+                self.pacer.record(command, False)
+                partial = PartialDataError.best(partial, error)
+                last_error = error
+                continue
+            except Exception:
+                self.pacer.record(command, None)
+                raise
+
+            self.pacer.record(command, not self._short_read)
+
+            return data
+
+        raise partial if partial is not None else last_error
+
+    async def buffer_protection(self, *args, **kwargs):
+
+        # A coroutine that already holds the lock (see snapshot) doesn't
+        # take it again, asyncio locks can't be taken twice
+        if self._lock_owner is asyncio.current_task():
+            return await run_command(self, *args, **kwargs)
+
+        async with self.device_lock():
+            return await run_command(self, *args, **kwargs)
+
+    return buffer_protection
+
+
+# %%---------------------------------------------------------------------------
+# AsyncUT330
+# -----------------------------------------------------------------------------
+class AsyncUT330(UT330):
+    """Provides an asyncio interface to the UT330. The commands and their
+    return values are the same as UT330, but they're coroutines."""
+
+    # %%
+    def __init__(self):
+
+        super().__init__()
+
+        # Only one command at a time can use the device, and the task
+        # using it
+        self._async_lock = asyncio.Lock()
+        self._lock_owner = None
+
+    # %%
+    @contextlib.asynccontextmanager
+    async def device_lock(self):
+        """Holds the device lock, so no other coroutine's commands can run
+        until it's released. The holder can still run commands."""
+
+        async with self._async_lock:
+            self._lock_owner = asyncio.current_task()
+            try:
+                yield
+            finally:
+                self._lock_owner = None
+
+    # %%
+    def connect(self, port=None):
+        """Connects to the device or raises an error. The serial port is put
+        into non-blocking mode, the timeouts are handled here instead."""
+
+        super().connect(port)
+
+        self._ut330.timeout = 0
+        self._ut330.write_timeout = 0
+
+    # %%
+    async def __aenter__(self):
+        """Function to make this class work with Python's async with
+        statement"""
+
+        self.connect()
+
+        return self
+
+    # %%
+    async def __aexit__(self, type_ex, value_ex, traceback_ex):
+        """Function to make this class work with Python's async with
+        statement"""
+
+        self.disconnect()
+
+    # %%
+    async def _wait_for_port(self, writing, timeout):
+        """Waits until the serial port can be read from (or written to), or
+        until timeout seconds have passed."""
+
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        def set_ready():
+            if not ready.done():
+                ready.set_result(None)
+
+        add, remove = (loop.add_writer, loop.remove_writer) if writing \
+            else (loop.add_reader, loop.remove_reader)
+
+        try:
+            port = self._ut330.fileno()
+            add(port, set_ready)
+        except (AttributeError, io.UnsupportedOperation, NotImplementedError):
+            # There's no readiness notification on this platform (e.g.
+            # Windows), so poll instead
+            await asyncio.sleep(min(timeout, 0.005))
+            return
+
+        try:
+            await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            remove(port)
+
+    # %%
+    async def _read_buffer_async(self, byte_count, progress=None):
+        """Reads byte_count bytes into a bytearray buffer, filled in place.
+        The data is read in pages, using the page size and read timeout
+        from the device's ReadTuner, which learns from each page as it does
+        for UT330._read_buffer. Stops early if a page gets no data for the
+        read timeout. progress is an optional function called with a
+        progress report after each page."""
+
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+
+        self._buffer = bytearray(byte_count)
+        received = 0
+
+        # See UT330._record_page
+        short_page = None
+
+        with memoryview(self._buffer) as view:
+            while received < byte_count:
+
+                requested = min(self.tuner.page_size, byte_count - received)
+                page_start = time.monotonic()
+                deadline = loop.time() + self.tuner.read_timeout
+                count = 0
+
+                # The port is non-blocking, so wait for the page to fill or
+                # the read timeout
+                while count < requested:
+
+                    read = self._ut330.readinto(
+                        view[received + count:received + requested]) or 0
+                    count += read
+
+                    if read:
+                        continue
+
+                    if loop.time() >= deadline:
+                        break
+
+                    await self._wait_for_port(False, deadline - loop.time())
+
+                short_page = self._record_page(
+                    (requested, count, time.monotonic() - page_start),
+                    short_page)
+
+                # Nothing read means the device timed out
+                if not count:
+                    break
+
+                received += count
+
+                if progress is not None:
+                    progress(progress_report(received, byte_count, start))
+
+        if received < byte_count:
+            del self._buffer[received:]
+            self._short_read = True
+
+    # %%
+    async def _write_buffer_async(self):
+        """Writes the command string to the buffer"""
+
+        loop = asyncio.get_running_loop()
+
+        data = bytearray(self._buffer)
+        deadline = loop.time() + self._write_timeout
+
+        while data:
+
+            bytes_written = self._ut330.write(data) or 0
+            del data[:bytes_written]
+
+            if not data:
+                break
+
+            if loop.time() >= deadline:
+                raise ValueError('Error! _write_buffer: not all command '
+                                 'bytes written')
+
+            await self._wait_for_port(True, deadline - loop.time())
+
+    # %%
+    async def _command(self, response_length):
+        """Writes the command in the buffer and reads the response"""
+
+        await self._write_buffer_async()
+        await self._read_buffer_async(response_length)
+
+    # %%
+    @async_buffer_safety
+    async def read_data(self, mode='batch', progress=None):
+        """Downloads the device buffer data (temperature, humidity, pressure),
+        and decodes it. See UT330.read_data for the modes and progress."""
+
+        self._check_mode(mode)
+
+        # The read data command, the response header tells us how much data
+        # follows
+        self._buffer = READ_DATA_COMMAND
+        await self._command(8)
+
+        length = self._data_length()
+
+        # No header, so there's nothing more to read
+        if length is None:
+            return self._check_data(0, mode)
+
+        self._header_crc = crc16(self._buffer)
+
+        # 22 is the minimum buffer length if there's actually data. The CRC
+        # follows whatever the length is, even zero.
+        if length < 22:
+
+            # Need to read the CRC code to clear the buffer
+            await self._read_buffer_async(2)
+            self._check_frame(2, self._header_crc)
+
+            print("Warning! No temperature/humidity/pressure data on the "
+                  "device")
+            length = 0
+
+        if length > 0:
+            await self._read_buffer_async(length, progress)
+
+        return self._check_data(length, mode)
+
+    # %%
+    @async_buffer_safety
+    async def delete_data(self):
+        """Deletes the temperature, humidity, and pressure data from the
+        device"""
+
+        self._buffer = DELETE_DATA_COMMAND
+        await self._command(7)
+
+        self._check_response(DELETE_DATA_RESPONSE,
+                             "Error! Delete data returned error code.")
+
+    # %%
+    @async_buffer_safety
+    async def read_config(self):
+        """Reads the configuration data from the device"""
+
+        self._buffer = READ_CONFIG_COMMAND
+        await self._command(46)
+        self._check_frame(46)
+
+        return self._decode_config()
+
+    # %%
+    @async_buffer_safety
+    async def write_config(self, config):
+        """Sets the configuration information on the device"""
+
+        self._config_command(config)
+        await self._command(7)
+
+        self._check_response(WRITE_CONFIG_RESPONSE,
+                             "Error! Config writing returned error code.")
+
+    # %%
+    @async_buffer_safety
+    async def write_datetime(self, timestamp):
+        """Syncs the time to the timestamp"""
+
+        self._datetime_command(timestamp)
+        await self._command(7)
+
+        self._check_response(WRITE_DATETIME_RESPONSE,
+                             "Error! Writing datetime returned error code.")
+
+    # %%
+    @async_buffer_safety
+    async def read_offsets(self):
+        """Reads the temperature, humidity, pressure offset"""
+
+        self._buffer = READ_OFFSETS_COMMAND
+        await self._command(18)
+        self._check_frame(18)
+
+        return self._decode_offsets()
+
+    # %%
+    @async_buffer_safety
+    async def write_offsets(self, offsets):
+        """Set the device offsets for temperature, humidity, pressure"""
+
+        self._offsets_command(offsets)
+        await self._command(7)
+
+        self._check_response(WRITE_OFFSETS_RESPONSE,
+                             "Error! Offset writing returned error code.")
+
+    # %%
+    @async_buffer_safety
+    async def restore_factory(self):
+        """This command is given as a factory reset in the Windows software"""
+
+        self._buffer = RESTORE_FACTORY_COMMAND
+        await self._command(7)
+
+        self._check_response(RESTORE_FACTORY_RESPONSE,
+                             "Error! Restore factory returned an error code.")
+
+    # %%
+    @async_buffer_safety
+    async def read_device_name(self):
+        """Returns the device name"""
+
+        self._buffer = READ_DEVICE_NAME_COMMAND
+        await self._command(16)
+        self._check_frame(16)
+
+        self._index = 4
+
+        return self._get_name()
+
+    # %%
+    async def snapshot(self):
+        """Reads the device name, configuration, and offsets one straight
+        after the other, with no other coroutine's commands in between.
+        Returns the same dict as UT330.snapshot."""
+
+        snapshot = {'timings': {}}
+
+        # No other coroutine's commands can run in between
+        async with self.device_lock():
+
+            start = time.monotonic()
+
+            for command, key in SNAPSHOT_COMMANDS:
+
+                before = datetime.datetime.now()
+                begin = time.monotonic()
+
+                snapshot[key] = await getattr(self, command)()
+
+                snapshot['timings'][command] = time.monotonic() - begin
+
+                if command == 'read_config':
+                    snapshot['config times'] = (before,
+                                                datetime.datetime.now())
+
+            snapshot['total time'] = time.monotonic() - start
+
+        return snapshot
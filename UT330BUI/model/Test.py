@@ -69,7 +69,7 @@ def device_readdata(ut330):
 
     DATA = ut330.read_data()
 
-    if DATA != []:
+    if DATA:
 
         TIMESTAMP = DATA[0]['Timestamp']
 
@@ -23,9 +23,46 @@ Created on Wed Mar  2 18:10:21 2016
 # Imports
 # =============================================================================
 import datetime
+import importlib
+import json
+import os
+import queue
+import threading
 import time
 import serial.tools.list_ports
 
+# crcmod's compiled CRC is faster than the pure Python version, but it's
+# optional
+try:
+    import crcmod.predefined
+    _crc16_compiled = crcmod.predefined.mkPredefinedCrcFun('modbus')
+except ImportError:
+    _crc16_compiled = None
+
+
+class _LazyModule():
+
+    """Stands in for a module and imports it the first time it's used.
+    NumPy takes longer to import than everything else here put together, and
+    most commands don't need it, so it's only imported when data is
+    decoded."""
+
+    def __init__(self, name):
+
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+
+        return getattr(self._module, attribute)
+
+
+np = _LazyModule('numpy')
+pd = _LazyModule('pandas')
+
 
 # =============================================================================
 # Module info
@@ -43,33 +80,96 @@ def buffer_safety(func):
 
     """There can be timing errors where a read takes place when the buffer
     is either partially written or not written at all. These errors can be
-    removed by a short pause of 10ms. This function decorator makes sure
-    there's at least 10ms between calls."""
+    removed by a short pause between commands. This function decorator
+    waits for the pause the device's CommandPacer asks for, then tells the
+    pacer whether the command worked so it can learn the shortest safe
+    pause. If the command fails, it's tried again as the device's
+    RetryPolicy says, with anything left over from the failed try thrown
+    away first."""
 
-    def buffer_protection(self, argument=None):
+    command = func.__name__
 
-        # If we're less than 10ms since the last call, wait 10ms
-        if datetime.datetime.now() - self.last_op_time \
-           < datetime.timedelta(0, 0, 10000):
-            time.sleep(0.01)
+    def buffer_protection(self, *args, **kwargs):
 
-        # Read functions have no arguments, write functions have one
-        if argument is None:
+        # Only one thread at a time can use the device and its buffer
+        with self._lock:
 
-            data = func(self)
+            # The most complete partial download so far
+            partial = None
 
-        else:
+            for retry in [None] + self.retry.delays():
 
-            data = func(self, argument)
+                if retry is not None:
+                    time.sleep(retry)
+                    self._flush()
 
-        # We don't know how long the operation took, so use the current time
-        # as the last op time
-        self.last_op_time = datetime.datetime.now()
+                self.pacer.wait(command)
 
-        return data
+                self._short_read = False
+
+                # Pass through whatever arguments the command takes. An
+                # IOError or a short buffer (IndexError) is a sign we went
+                # too fast, or there was a glitch, so it's worth trying
+                # again.
+                try:
+                    data = func(self, *args, **kwargs)
+                except (IOError, IndexError) as error:
+                    self.pacer.record(command, False)
+                    partial = PartialDataError.best(partial, error)
+                    last_error = error
+                    continue
+                except Exception:
+                    self.pacer.record(command, None)
+                    raise
+
+                self.pacer.record(command, not self._short_read)
+
+                return data
+
+            # Every try failed. If some data arrived, hand back what there
+            # is rather than throwing it all away.
+            raise partial if partial is not None else last_error
 
     return buffer_protection
 
+
+# =============================================================================
+# Exceptions
+# =============================================================================
+class PartialDataError(IOError):
+
+    """Raised by read_data when the device stopped sending part way through
+    the data on every try. data has the complete records that did arrive,
+    decoded in the mode asked for, and missing is how many records didn't
+    arrive. The CRC can't be checked, so the data isn't verified."""
+
+    def __init__(self, data, expected, received):
+
+        super().__init__('Error! The device stopped sending part way '
+                         'through the data. {0} of {1} records arrived, {2} '
+                         'are missing.'.format(received, expected,
+                                               expected - received))
+
+        self.data = data
+        self.expected = expected
+        self.received = received
+        self.missing = expected - received
+
+    @staticmethod
+    def best(partial, error):
+
+        """Returns whichever of partial and error is the PartialDataError
+        with the most records, or None if neither is"""
+
+        if not isinstance(error, PartialDataError):
+            return partial
+
+        if partial is None or error.received > partial.received:
+            return error
+
+        return partial
+
+
 # =============================================================================
 # Functions
 # =============================================================================
@@ -108,22 +208,892 @@ TABLE = (
     0x8201, 0x42C0, 0x4380, 0x8341, 0x4100, 0x81C1, 0x8081, 0x4040)
 
 
-def modbusCRC(data):
+# The CRC table for two bytes at a time. It's built the first time a large
+# payload is checked.
+_PAIR_TABLE = []
+
+# Payloads at least this long use the two bytes at a time CRC
+PAIR_THRESHOLD = 1024
+
+
+def _pair_table():
+
+    """Returns the two bytes at a time CRC table, building it if needed. For
+    a 16 bit CRC, adding two bytes replaces the whole register, so the new
+    CRC only depends on the old CRC xor the two bytes."""
+
+    if not _PAIR_TABLE:
+        _PAIR_TABLE.extend(
+            (TABLE[word & 0xFF] >> 8) ^
+            TABLE[((word >> 8) ^ TABLE[word & 0xFF]) & 0xFF]
+            for word in range(65536))
+
+    return _PAIR_TABLE
+
+
+def crc16(data, crc=0xFFFF):
+
+    """Returns the Modbus CRC of data as an integer. data can be bytes, a
+    bytearray, a memoryview, or a list of integers. To carry on a CRC over
+    several pieces of data, pass the CRC so far as crc."""
+
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+
+    if _crc16_compiled is not None:
+        return _crc16_compiled(data, crc)
+
+    table = TABLE
+
+    # Large payloads are done two bytes at a time
+    if len(data) >= PAIR_THRESHOLD:
+
+        pair_table = _pair_table()
+
+        words = np.frombuffer(data, dtype='<u2', count=len(data) // 2)
+
+        for word in words.tolist():
+            crc = pair_table[crc ^ word]
+
+        data = data[len(data) - len(data) % 2:]
+
+    for number in data:
+        crc = (crc >> 8) ^ table[(crc ^ number) & 0xFF]
+
+    return crc
+
+
+def modbusCRC(data):
+
+    """Returns the Modbus CRC as two bytes. Be careful of the order."""
+
+    crc = crc16(data)
+
+    MSB = crc >> 8  # Most Significant Byte
+    LSB = crc & 255  # Least Significant Byte
+
+    return MSB, LSB
+
+
+def command_frame(command, payload=b''):
+
+    """Builds a complete command frame: the 0xab 0xcd start bytes, the
+    length, the command, the payload, and the CRC with the least significant
+    byte first"""
+
+    frame = bytearray([0xab, 0xcd, len(payload) + 3, command])
+    frame += payload
+
+    crc = crc16(frame)
+    frame += bytes([crc & 255, crc >> 8])
+
+    return bytes(frame)
+
+
+# The fixed commands, built once
+READ_CONFIG_COMMAND = command_frame(0x11)
+READ_OFFSETS_COMMAND = command_frame(0x17)
+DELETE_DATA_COMMAND = command_frame(0x18)
+READ_DATA_COMMAND = command_frame(0x19)
+RESTORE_FACTORY_COMMAND = command_frame(0x20)
+READ_DEVICE_NAME_COMMAND = command_frame(0x51)
+
+# The responses that show a command worked. These have the same layout as
+# commands, with a zero status byte as the payload.
+WRITE_CONFIG_RESPONSE = command_frame(0x10, b'\x00')
+WRITE_DATETIME_RESPONSE = command_frame(0x12, b'\x00')
+WRITE_OFFSETS_RESPONSE = command_frame(0x16, b'\x00')
+DELETE_DATA_RESPONSE = command_frame(0x18, b'\x00')
+RESTORE_FACTORY_RESPONSE = command_frame(0x20, b'\x00')
+
+# Where the learned page sizes, timeouts, and pauses are kept between runs
+TUNING_FILE = os.path.join(os.path.expanduser('~'), '.ut330', 'tuning.json')
+
+# The default store of readings from every device (see model.store). It's
+# here, next to the tuning file, so the CLI can use it without importing
+# NumPy.
+STORE_FILE = os.path.join(os.path.expanduser('~'), '.ut330', 'ut330.sqlite')
+
+# Only one thread at a time can write the tuning file
+_TUNING_LOCK = threading.Lock()
+
+# The commands snapshot runs, in order, and the keys for their results
+SNAPSHOT_COMMANDS = (('read_device_name', 'device name'),
+                     ('read_config', 'config'),
+                     ('read_offsets', 'offsets'))
+
+
+def progress_report(received, total, start):
+
+    """Returns a read_data progress report: a dict of the bytes received so
+    far, the total bytes expected, the records received, the transfer rate
+    in bytes per second, and the estimated seconds left. start is the
+    time.monotonic() time the transfer started. The rate and time left are
+    None until they can be worked out."""
+
+    elapsed = time.monotonic() - start
+    rate = received/elapsed if elapsed > 0 else None
+
+    return {'bytes received': received,
+            'bytes total': total,
+            'records received': received // RECORD_SIZE,
+            'rate': rate,
+            'time left': (total - received)/rate if rate else None}
+
+
+def find_ports():
+
+    """Returns the names of all the serial ports with a UT330 attached"""
+
+    # I'm not sure this is specific enough for general use. It may give a
+    # false report if another device using the same controller is connected.
+    # However, I can't find a more specific check.
+    return [port.device for port in serial.tools.list_ports.comports()
+            if port.vid == 4292 and port.pid == 60000]
+
+
+def load_tuning(path, port):
+
+    """Returns the tuning settings saved for port in the JSON file at path,
+    or None if there aren't any"""
+
+    try:
+        with open(path) as tuning_file:
+            return json.load(tuning_file).get(port)
+    except (OSError, ValueError):
+        return None
+
+
+def save_tuning(path, port, settings):
+
+    """Saves the tuning settings for port in the JSON file at path, keeping
+    the settings for other ports"""
+
+    with _TUNING_LOCK:
+
+        try:
+            with open(path) as tuning_file:
+                tuning = json.load(tuning_file)
+        except (OSError, ValueError):
+            tuning = {}
+
+        tuning[port] = settings
+
+        # Write a new file and swap it in, so a crash can't leave half a
+        # file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as tuning_file:
+            json.dump(tuning, tuning_file, indent=4, sort_keys=True)
+        os.replace(temporary, path)
+
+
+# Each data record is 12 bytes: a six byte timestamp (year - 2000, month,
+# day, hour, minute, second), then temperature, humidity, and pressure as
+# little-endian 16 bit numbers in tenths. Only temperature can be negative.
+RECORD_SIZE = 12
+
+# The most records the device holds
+MAX_RECORDS = 60000
+
+# The NumPy dtype for a record, RECORD_DTYPE. It's built the first time it's
+# used so importing this module doesn't import NumPy.
+_RECORD_DTYPE = []
+
+
+def _record_dtype():
+
+    """Returns the NumPy dtype for a record, building it if needed"""
+
+    if not _RECORD_DTYPE:
+        _RECORD_DTYPE.append(np.dtype([('year', 'u1'),
+                                       ('month', 'u1'),
+                                       ('day', 'u1'),
+                                       ('hour', 'u1'),
+                                       ('minute', 'u1'),
+                                       ('second', 'u1'),
+                                       ('temperature', '<i2'),
+                                       ('humidity', '<u2'),
+                                       ('pressure', '<u2')]))
+
+    return _RECORD_DTYPE[0]
+
+
+def __getattr__(name):
+
+    """Provides the module attributes that are built when first used"""
+
+    if name == 'RECORD_DTYPE':
+        return _record_dtype()
+
+    raise AttributeError("module {0!r} has no attribute {1!r}"
+                         .format(__name__, name))
+
+
+def decode_timestamps(records):
+
+    """Returns the record timestamps as a datetime64[s] array. Raises a
+    ValueError for impossible dates, just like datetime.datetime does."""
+
+    year = records['year'].astype(np.int64) + 2000
+    month = records['month'].astype(np.int64)
+    day = records['day'].astype(np.int64)
+    hour = records['hour'].astype(np.int64)
+    minute = records['minute'].astype(np.int64)
+    second = records['second'].astype(np.int64)
+
+    # Months since the epoch, from which we get the first day of the month
+    months = (year - 1970)*12 + month - 1
+    month_start = months.astype('datetime64[M]').astype('datetime64[D]')
+    month_end = (months + 1).astype('datetime64[M]').astype('datetime64[D]')
+    date = month_start + (day - 1)
+
+    if np.any((month < 1) | (month > 12) | (day < 1) | (date >= month_end) |
+              (hour > 23) | (minute > 59) | (second > 59)):
+        raise ValueError('Error! The device data contains an invalid '
+                         'timestamp')
+
+    return date.astype('datetime64[s]') + (hour*3600 + minute*60 + second)
+
+
+def decode_records(payload):
+
+    """Decodes a read data payload into columns of NumPy arrays. The
+    payload is the data part of the read data response, any trailing bytes
+    that don't make a complete record (e.g. the CRC) are ignored.
+
+    The payload can be bytes, a bytearray or a memoryview. The values are
+    the same as read_data gives, but the timestamps are
+    datetime64[s] rather than datetime objects."""
+
+    count = len(payload) // RECORD_SIZE
+
+    # This is a view on the payload, not a copy
+    records = np.frombuffer(payload, dtype=_record_dtype(), count=count)
+
+    return {'Timestamp': decode_timestamps(records),
+            'Temperature (C)': records['temperature'] / 10,
+            'Relative humidity (%)': records['humidity'] / 10,
+            'Pressure (hPa)': records['pressure'] / 10}
+
+
+# =============================================================================
+# class CommandPacer
+# =============================================================================
+class CommandPacer():
+
+    """Works out how long to wait between commands. By experiment, a 10ms
+    pause between commands always works, but it's often longer than the
+    device needs. The pacer starts with a 10ms pause for each command type,
+    shortens it a little each time the command works, and lengthens it if
+    the command fails. Once a pause has failed, the pacer never goes back
+    below twice that pause for that command. Times come from a monotonic
+    clock, so changes to the system clock don't matter."""
+
+    # %%
+    def __init__(self, gap=0.01, min_gap=0.0, max_gap=0.5):
+
+        # The starting pause for commands we haven't seen yet, in seconds
+        self.gap = gap
+
+        # The limits for the pause, in seconds
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+
+        # The learned pause for each command type
+        self.gaps = {}
+
+        # The shortest pause each command type is allowed, raised on failure
+        self.floors = {}
+
+        # The monotonic time the last command finished
+        self.last_time = None
+
+    # %%
+    def delay(self, command):
+
+        """Returns how long to wait, in seconds, before sending command"""
+
+        if self.last_time is None:
+            return 0
+
+        gap = self.gaps.get(command, self.gap)
+
+        return max(0, self.last_time + gap - time.monotonic())
+
+    # %%
+    def wait(self, command):
+
+        """Waits until it's safe to send command"""
+
+        delay = self.delay(command)
+
+        if delay > 0:
+            time.sleep(delay)
+
+    # %%
+    def record(self, command, success):
+
+        """Records the end of a command. success is True if the command
+        worked, False if it looks like it failed because it was sent too
+        soon, and None if we can't tell."""
+
+        self.last_time = time.monotonic()
+
+        if success is None:
+            return
+
+        gap = self.gaps.get(command, self.gap)
+        floor = self.floors.get(command, self.min_gap)
+
+        if success:
+            gap = max(floor, gap*0.75)
+        else:
+            floor = min(self.max_gap, max(2*gap, 0.002))
+            self.floors[command] = floor
+            gap = floor
+
+        self.gaps[command] = gap
+
+    # %%
+    def settings(self):
+
+        """Returns the learned settings as a dict"""
+
+        return {'gap': self.gap,
+                'min gap': self.min_gap,
+                'max gap': self.max_gap,
+                'gaps': dict(self.gaps),
+                'floors': dict(self.floors)}
+
+    # %%
+    def load(self, settings):
+
+        """Loads settings returned by the settings method, e.g. to carry
+        learned pauses over from an earlier run"""
+
+        self.gap = settings['gap']
+        self.min_gap = settings['min gap']
+        self.max_gap = settings['max gap']
+        self.gaps = dict(settings['gaps'])
+        self.floors = dict(settings['floors'])
+
+
+# =============================================================================
+# class ReadTuner
+# =============================================================================
+class ReadTuner():
+
+    """Works out the page size and read timeout for reading responses. Large
+    pages are faster, but with some USB stacks and hubs they come back
+    partially filled, and the best size depends on the computer. The tuner
+    starts with 32kB pages and a 5s timeout. If a page comes back partially
+    filled, the page size is halved and never goes back up to the size that
+    failed. After a run of full pages, the page size is doubled to see if
+    that's faster. The read timeout is set to a few times how long a page
+    takes at the measured transfer rate, so a device that's gone quiet is
+    noticed quickly. Both stay within safe limits. Set learn to False to
+    keep the page size and timeout as they are, e.g. after setting them by
+    hand."""
+
+    # The number of full pages in a row before trying a bigger page
+    GROW_AFTER = 16
+
+    # The read timeout is this many times the time to read a page
+    TIMEOUT_FACTOR = 4
+
+    # Pages smaller than this are mostly waiting for the device to answer,
+    # so they aren't used to measure the transfer rate
+    RATE_MIN_BYTES = 1024
+
+    # %%
+    def __init__(self, page_size=32768, min_page_size=1024,
+                 max_page_size=65536, read_timeout=5, min_read_timeout=1,
+                 max_read_timeout=10):
+
+        # The page size in bytes, and its limits
+        self.page_size = page_size
+        self.min_page_size = min_page_size
+        self.max_page_size = max_page_size
+
+        # The read timeout in seconds, and its limits
+        self.read_timeout = read_timeout
+        self.min_read_timeout = min_read_timeout
+        self.max_read_timeout = max_read_timeout
+
+        # The smallest page size that's come back partially filled
+        self.ceiling = None
+
+        # The measured transfer rate in bytes per second, a moving average
+        self.rate = None
+
+        # The number of pages read, and how many came back partially filled
+        self.pages = 0
+        self.short_pages = 0
+
+        # The number of full pages in a row
+        self._run = 0
+
+        # Change the page size and read timeout as pages are read
+        self.learn = True
+
+    # %%
+    def record(self, requested, received, seconds):
+
+        """Records reading a page: the bytes asked for, the bytes that
+        arrived, and how long it took. A page with no bytes means the device
+        has stopped sending, which says nothing about the page size."""
+
+        if received == 0:
+            return
+
+        self.pages += 1
+
+        if received < requested:
+            self.short_pages += 1
+
+        if not self.learn:
+            return
+
+        # A partially filled page, use smaller pages from now on
+        if received < requested:
+            self.ceiling = min(self.ceiling or requested, requested)
+            self.page_size = max(self.min_page_size, self.page_size//2)
+            self._run = 0
+            return
+
+        if requested >= self.RATE_MIN_BYTES and seconds > 0:
+            rate = received/seconds
+            self.rate = rate if self.rate is None else \
+                0.8*self.rate + 0.2*rate
+
+        # Only full size pages show the page size works
+        if requested < self.page_size:
+            return
+
+        self._run += 1
+
+        if self._run >= self.GROW_AFTER:
+            self._run = 0
+            bigger = self.page_size*2
+            if bigger <= self.max_page_size and \
+               (self.ceiling is None or bigger < self.ceiling):
+                self.page_size = bigger
+
+        if self.rate:
+            self.read_timeout = min(self.max_read_timeout,
+                                    max(self.min_read_timeout,
+                                        self.TIMEOUT_FACTOR *
+                                        self.page_size/self.rate))
+
+    # %%
+    def settings(self):
+
+        """Returns the learned settings as a dict"""
+
+        return {'page size': self.page_size,
+                'min page size': self.min_page_size,
+                'max page size': self.max_page_size,
+                'read timeout': self.read_timeout,
+                'min read timeout': self.min_read_timeout,
+                'max read timeout': self.max_read_timeout,
+                'ceiling': self.ceiling,
+                'rate': self.rate,
+                'pages': self.pages,
+                'short pages': self.short_pages,
+                'learn': self.learn}
+
+    # %%
+    def load(self, settings):
+
+        """Loads settings returned by the settings method, e.g. to carry
+        learned values over from an earlier run"""
+
+        self.min_page_size = settings['min page size']
+        self.max_page_size = settings['max page size']
+        self.min_read_timeout = settings['min read timeout']
+        self.max_read_timeout = settings['max read timeout']
+
+        # Keep the values inside the limits, in case they were edited
+        self.page_size = min(self.max_page_size,
+                             max(self.min_page_size, settings['page size']))
+        self.read_timeout = min(self.max_read_timeout,
+                                max(self.min_read_timeout,
+                                    settings['read timeout']))
+
+        self.ceiling = settings['ceiling']
+        self.rate = settings['rate']
+        self.pages = settings['pages']
+        self.short_pages = settings['short pages']
+        self.learn = settings['learn']
+
+
+# =============================================================================
+# class RetryPolicy
+# =============================================================================
+class RetryPolicy():
+
+    """Says how many times to try a command and how long to wait between
+    tries. A USB hub glitch or a timeout part way through a response often
+    clears up on its own, so a failed command is tried again after a pause
+    that doubles each time (exponential backoff)."""
+
+    # %%
+    def __init__(self, attempts=3, backoff=0.05, factor=2, max_backoff=2.0):
+
+        if attempts < 1:
+            raise ValueError('Error! The number of attempts is {0} but it '
+                             'must be at least 1'.format(attempts))
+
+        # The number of times to try a command, including the first
+        self.attempts = attempts
+
+        # The pause before the first retry, in seconds, and how much each
+        # pause is multiplied by for the next retry
+        self.backoff = backoff
+        self.factor = factor
+
+        # The longest pause, in seconds
+        self.max_backoff = max_backoff
+
+    # %%
+    def delays(self):
+
+        """Returns a list of the pauses, in seconds, before each retry"""
+
+        return [min(self.max_backoff, self.backoff*self.factor**retry)
+                for retry in range(self.attempts - 1)]
+
+
+# =============================================================================
+# class TimestampRuns
+# =============================================================================
+class TimestampRuns():
+
+    """Stores the timestamps of a download as runs of readings at a constant
+    interval. The device takes readings at its sampling interval, so a
+    download is normally a handful of regular runs separated by gaps where
+    logging was restarted, delayed, or wrapped around. Each run is stored
+    as (start, step, count), and the full timestamp array is only built when
+    it's asked for."""
+
+    # %%
+    def __init__(self, starts, steps, counts):
+
+        # The first timestamp of each run
+        self.starts = np.asarray(starts, dtype='datetime64[s]')
+
+        # The interval between readings in each run
+        self.steps = np.asarray(steps, dtype='timedelta64[s]')
+
+        # The number of readings in each run
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    # %%
+    @classmethod
+    def from_timestamps(cls, timestamps):
+
+        """Finds the runs of constant interval in an array of timestamps.
+        Runs are found greedily from the start: a run takes the interval
+        between its first two readings and continues for as long as the
+        interval stays the same."""
+
+        seconds = np.asarray(timestamps, dtype='datetime64[s]')
+        count = len(seconds)
+
+        starts, steps, counts = [], [], []
+
+        diffs = np.diff(seconds.astype(np.int64))
+
+        # The positions where the interval changes from the one before
+        changes = np.flatnonzero(diffs[1:] != diffs[:-1]) + 1
+
+        # There's one pass round this loop per run, not per reading
+        first = 0
+        while first < count:
+
+            # A lone reading at the end is a run of one
+            if first == count - 1:
+                starts.append(seconds[first])
+                steps.append(0)
+                counts.append(1)
+                break
+
+            # The run ends at the first interval change after it starts
+            position = np.searchsorted(changes, first + 1)
+            last = changes[position] if position < len(changes) \
+                else count - 1
+
+            starts.append(seconds[first])
+            steps.append(diffs[first])
+            counts.append(last - first + 1)
+
+            first = last + 1
+
+        return cls(starts, steps, counts)
+
+    # %%
+    def __len__(self):
+
+        return int(self.counts.sum())
+
+    # %%
+    def ends(self):
+
+        """Returns the last timestamp of each run"""
+
+        return self.starts + self.steps*np.maximum(self.counts - 1, 0)
+
+    # %%
+    def timestamps(self):
+
+        """Builds the full datetime64[s] timestamp array"""
+
+        # The position of each reading within its run
+        run_first = np.cumsum(self.counts) - self.counts
+        position = np.arange(len(self)) - np.repeat(run_first, self.counts)
+
+        return (np.repeat(self.starts, self.counts) +
+                position*np.repeat(self.steps, self.counts))
+
+    # %%
+    def gaps(self, interval=None, delay=None):
+
+        """Returns a list of the discontinuities between runs. interval is
+        the sampling interval in seconds and delay is the delay timing in
+        seconds, both as read_config reports them. If interval isn't given,
+        the step of the longest run is used.
+
+        Each discontinuity is a dict giving the index of the first reading
+        after it, the timestamps either side of it, the gap in seconds, and
+        its kind:
+        'wraparound' - time goes backwards, the records wrapped around when
+                       overwrite records is on
+        'interval change' - the readings carry on without a gap, but at a
+                            different interval
+        'delay start' - the gap matches the delay timing
+        'restart' - any other gap, e.g. the device was stopped and started
+        """
+
+        if interval is None:
+            if len(self.counts) == 0:
+                return []
+            interval = int(self.steps[np.argmax(self.counts)].astype(
+                np.int64))
+
+        ends = self.ends()
+        run_first = np.cumsum(self.counts) - self.counts
+
+        gaps = []
+
+        for run in range(1, len(self.counts)):
+
+            gap = int((self.starts[run] - ends[run - 1]).astype(np.int64))
+
+            if gap <= 0:
+                kind = 'wraparound'
+            elif gap == interval or gap == int(self.steps[run].astype(
+                    np.int64)):
+                kind = 'interval change'
+            elif delay is not None and abs(gap - delay) <= interval:
+                kind = 'delay start'
+            else:
+                kind = 'restart'
+
+            gaps.append({'index': int(run_first[run]),
+                         'before': ends[run - 1],
+                         'after': self.starts[run],
+                         'gap': gap,
+                         'kind': kind})
+
+        return gaps
+
+
+# =============================================================================
+# class RecordBatch
+# =============================================================================
+class RecordBatch():
+
+    """The readings from a download as columns: the timestamps as
+    datetime64[s], and the temperature, humidity, and pressure as 16 bit
+    tenths, just as the device sends them. Temperature is int16, as it can
+    be negative, humidity and pressure are uint16. That's 14 bytes a
+    reading rather than the hundreds a dict of a datetime and three floats
+    takes.
+
+    A batch also works like the list of dicts read_data's 'records' mode
+    gives: len() is the number of readings, batch[i] is reading i as a dict,
+    and iterating gives each reading as a dict. The dicts are only built as
+    they're asked for. batch['Temperature (C)'] gives a whole column as
+    floats, like the 'columns' mode dict."""
+
+    # The reading columns, and the attributes holding them as tenths
+    TENTHS = {'Temperature (C)': 'temperature',
+              'Relative humidity (%)': 'humidity',
+              'Pressure (hPa)': 'pressure'}
+
+    # The column names, in order
+    COLUMNS = ['Timestamp'] + list(TENTHS)
+
+    # Iterating builds the dicts for this many readings at a time
+    CHUNK = 4096
+
+    # %%
+    def __init__(self, timestamps, temperature, humidity, pressure):
+
+        """timestamps are datetime64 (or anything NumPy can make into them),
+        and the readings are tenths"""
+
+        self.timestamps = np.asarray(timestamps, dtype='datetime64[s]')
+        self.temperature = np.asarray(temperature, dtype=np.int16)
+        self.humidity = np.asarray(humidity, dtype=np.uint16)
+        self.pressure = np.asarray(pressure, dtype=np.uint16)
+
+        lengths = {len(self.timestamps), len(self.temperature),
+                   len(self.humidity), len(self.pressure)}
+        if len(lengths) != 1:
+            raise ValueError('Error! The record batch columns have different '
+                             'lengths {0}'.format(sorted(lengths)))
+
+    # %%
+    @classmethod
+    def from_payload(cls, payload):
+
+        """Decodes a read data payload (see decode_records). The readings
+        are copied out of the payload, so the payload can be reused."""
+
+        count = len(payload) // RECORD_SIZE
+
+        # This is a view on the payload, astype makes the copies
+        records = np.frombuffer(payload, dtype=_record_dtype(), count=count)
+
+        return cls(decode_timestamps(records),
+                   records['temperature'].astype(np.int16),
+                   records['humidity'].astype(np.uint16),
+                   records['pressure'].astype(np.uint16))
+
+    # %%
+    @classmethod
+    def from_columns(cls, columns):
+
+        """Makes a batch from columns of readings: read_data's 'columns' or
+        'runs' mode dict, or a dataframe from a data file"""
+
+        timestamps = columns['Timestamp']
+        if isinstance(timestamps, TimestampRuns):
+            timestamps = timestamps.timestamps()
+
+        return cls(np.asarray(timestamps, dtype='datetime64[s]'),
+                   *[np.round(np.asarray(columns[column], dtype=np.float64)
+                              * 10)
+                     for column in cls.TENTHS])
+
+    # %%
+    @classmethod
+    def from_records(cls, records):
+
+        """Makes a batch from read_data's 'records' mode list of dicts"""
+
+        return cls.from_columns(
+            {column: [record[column] for record in records]
+             for column in cls.COLUMNS})
+
+    # %%
+    def __len__(self):
+
+        return len(self.timestamps)
+
+    # %%
+    def keys(self):
+
+        """Returns the column names, so dict(batch) gives the columns"""
+
+        return list(self.COLUMNS)
+
+    # %%
+    def __getitem__(self, key):
+
+        """A column name gives the column, an integer gives that reading as
+        a dict, and a slice, index array, or mask gives a new batch"""
+
+        if isinstance(key, str):
+            if key == 'Timestamp':
+                return self.timestamps
+            if key not in self.TENTHS:
+                raise KeyError(key)
+            return getattr(self, self.TENTHS[key]) / 10
 
-    """Returns the Modbus CRC as two bytes. Be careful of the order."""
+        if isinstance(key, (int, np.integer)):
+            return {'Timestamp': self.timestamps[key].item(),
+                    'Temperature (C)': int(self.temperature[key]) / 10,
+                    'Relative humidity (%)': int(self.humidity[key]) / 10,
+                    'Pressure (hPa)': int(self.pressure[key]) / 10}
 
-    # If the contnets of the data list are not all integers, this function
-    # will have problems. Future action is to check all elements are ints
+        return RecordBatch(self.timestamps[key], self.temperature[key],
+                           self.humidity[key], self.pressure[key])
 
-    crc = 0xFFFF
+    # %%
+    def __iter__(self):
 
-    for number in data:
-        crc = (crc >> 8) ^ TABLE[(crc ^ number) & 0xFF]
+        """Yields each reading as a dict"""
 
-    MSB = crc >> 8  # Most Significant Byte
-    LSB = crc & 255  # Least Significant Byte
+        for first in range(0, len(self), self.CHUNK):
 
-    return MSB, LSB
+            chunk = self[first:first + self.CHUNK]
+
+            for timestamp, temperature, humidity, pressure in zip(
+                    chunk.timestamps.tolist(),
+                    (chunk.temperature / 10).tolist(),
+                    (chunk.humidity / 10).tolist(),
+                    (chunk.pressure / 10).tolist()):
+
+                yield {'Timestamp': timestamp,
+                       'Temperature (C)': temperature,
+                       'Relative humidity (%)': humidity,
+                       'Pressure (hPa)': pressure}
+
+    # %%
+    @property
+    def nbytes(self):
+
+        """The memory the readings take in bytes"""
+
+        return (self.timestamps.nbytes + self.temperature.nbytes +
+                self.humidity.nbytes + self.pressure.nbytes)
+
+    # %%
+    def records(self):
+
+        """Returns the readings as a list of dicts, like the 'records'
+        mode"""
+
+        return list(self)
+
+    # %%
+    def columns(self):
+
+        """Returns the readings as a dict of arrays, like the 'columns'
+        mode"""
+
+        return {column: self[column] for column in self.COLUMNS}
+
+    # %%
+    def to_frame(self):
+
+        """Returns the readings as a dataframe with the standard columns"""
+
+        return pd.DataFrame(self.columns())
+
+    # %%
+    def sorted(self):
+
+        """Returns the batch in timestamp order. Downloads that wrapped
+        around aren't in order."""
+
+        if np.all(self.timestamps[1:] >= self.timestamps[:-1]):
+            return self
+
+        return self[np.argsort(self.timestamps, kind='stable')]
 
 
 # =============================================================================
@@ -146,11 +1116,34 @@ class UT330():
     """
 
     # %%
-    def __init__(self):
+    def __init__(self, tuning_file=None):
+
+        """tuning_file is a JSON file (e.g. TUNING_FILE) to keep the learned
+        page size, read timeout, and pauses between runs. They're loaded on
+        connect and saved on disconnect, for each serial port."""
+
+        # Works out the pause needed between commands
+        self.pacer = CommandPacer()
 
-        # The time of the last function call. Set to min initially because
-        # there hasn't been a last call when the software starts.
-        self.last_op_time = datetime.datetime.min
+        # Works out the page size and read timeout
+        self.tuner = ReadTuner()
+
+        self.tuning_file = tuning_file
+
+        # The serial port the device is on
+        self.port = None
+
+        # How often to try a failed command
+        self.retry = RetryPolicy()
+
+        # Set if the last read returned fewer bytes than were asked for
+        self._short_read = False
+
+        # The CRC of the read data header, which the data CRC carries on from
+        self._header_crc = 0xFFFF
+
+        # Check the CRC of every response
+        self.validate_crc = True
 
         # The PySerial object
         self._ut330 = None
@@ -161,44 +1154,81 @@ class UT330():
         # Index to the position of the current element being processed
         self._index = 0
 
-        # Time to wait before timing out
-        self._read_timeout = 5
+        # Time to wait before timing out, the read timeout is the tuner's
         self._write_timeout = 5
 
+        # Commands share the buffer, so only one thread at a time can run a
+        # command
+        self._lock = threading.RLock()
+
     # %%
     def __del__(self):
 
-        self.disconnect()
+        # The tuning isn't saved here, the interpreter may be shutting down
+        if self._ut330 is not None:
+            self._ut330.close()
+
+    # %%
+    @property
+    def _read_timeout(self):
+
+        """The time to wait, in seconds, before a read times out"""
+
+        return self.tuner.read_timeout
+
+    @_read_timeout.setter
+    def _read_timeout(self, value):
+
+        self.tuner.read_timeout = value
 
     # %%
-    def connect(self):
+    def tuning(self):
 
-        """Connects to the device or raises an error"""
+        """Returns the learned page size, read timeout, and pauses between
+        commands as a dict"""
+
+        return {'transport': self.tuner.settings(),
+                'pacer': self.pacer.settings()}
+
+    # %%
+    def load_tuning(self, tuning):
+
+        """Loads settings returned by the tuning method"""
+
+        self.tuner.load(tuning['transport'])
+        self.pacer.load(tuning['pacer'])
+
+    # %%
+    def connect(self, port=None):
+
+        """Connects to the device or raises an error. port is the name of the
+        serial port to use, if it's not given, the port is found
+        automatically."""
 
         # Get the port the device is connected to
         # ---------------------------------------
-        port = None
+        if port is None:
 
-        # Get all the serial ports
-        port_list = serial.tools.list_ports.comports()
-        serial.tools.list_ports.comports
+            ports = find_ports()
 
-        # Now find which port has our device
-        for trial in port_list:
+            if not ports:
+                raise IOError('Error! The UT330 device was not detected on '
+                              'any USB port.')
 
-            # I'm not sure this is specific enough for general use. It may
-            # give a false report if another device using the same controller
-            # is connected. However, I can't find a more specific check.
-            if trial.vid == 4292 and trial.pid == 60000:
-                port = trial
+            # If there's more than one device, use the last one found
+            port = ports[-1]
 
-        if port is None:
-            raise IOError('Error! The UT330 device was not detected on any '
-                          'USB port.')
+        self.port = port
+
+        # Carry on from what was learned about this port last time
+        if self.tuning_file is not None:
+            tuning = load_tuning(self.tuning_file, port)
+            if tuning is not None:
+                self.load_tuning(tuning)
 
         # Attempt a connection to the port
         # --------------------------------
-        self._ut330 = serial.Serial(port=port.device,
+        self._ut330 = serial.Serial(port=port,
                                     baudrate=115200,
                                     timeout=self._read_timeout,
                                     write_timeout=self._write_timeout)
@@ -225,31 +1255,93 @@ class UT330():
         self.disconnect()
 
     # %%
-    def _read_buffer(self, byte_count):
+    def _read_buffer(self, byte_count, progress=None):
 
-        """Reads the contents of the buffer and returns it as an integer list.
-        """
+        """Reads byte_count bytes from the device into the buffer. The buffer
+        is a bytearray allocated once at the full size and filled in place,
+        so large downloads don't build up lists of Python ints. If the
+        device stops sending, the buffer is cut down to what arrived.
+        progress is an optional function called with a progress report (see
+        progress_report) after each page is read. The page size and read
+        timeout come from the device's ReadTuner, which learns from each
+        page."""
+
+        self._buffer = bytearray(byte_count)
+        received = 0
+        start = time.monotonic()
+
+        # A partially filled page only shows the page is too big if more
+        # data follows it, otherwise the device just stopped sending
+        short_page = None
+
+        # Read in data in as large chuncks as possible to speed up reading,
+        # straight into the buffer.
+        with memoryview(self._buffer) as view:
+            while received < byte_count:
+
+                # The tuner may have changed the timeout
+                if self._ut330.timeout != self.tuner.read_timeout:
+                    self._ut330.timeout = self.tuner.read_timeout
 
-        # If the page_size is set much larger than this number we tend
-        # to get problems with partially filled buffers
-        page_size = 32768
+                requested = min(self.tuner.page_size, byte_count - received)
+                page_start = time.monotonic()
 
-        self._buffer = []
+                count = self._ut330.readinto(
+                    view[received:received + requested]) or 0
 
-        # Read in data in as large chuncks as possible to speed up reading.
-        # Read in the largest possible chunks first.
-        for i in range(int(byte_count/page_size)):
-            self._buffer += self._ut330.read(page_size)
+                short_page = self._record_page(
+                    (requested, count, time.monotonic() - page_start),
+                    short_page)
 
-        # Now read in the smallest chunk.
-        self._buffer += self._ut330.read(byte_count % page_size)
+                # Nothing read means the device timed out
+                if not count:
+                    break
+
+                received += count
+
+                if progress is not None:
+                    progress(progress_report(received, byte_count, start))
+
+        if received < byte_count:
+            del self._buffer[received:]
+            self._short_read = True
+
+    # %%
+    def _record_page(self, page, short_page):
+
+        """Tells the tuner about a page read. page is the bytes asked for,
+        the bytes that arrived, and how long it took. A partially filled
+        page only counts if more data follows it, so it's held back until
+        the next page arrives. short_page is the page held back last time.
+        Returns the page to hold back, or None."""
+
+        requested, count, _ = page
+
+        if short_page is not None and count:
+            self.tuner.record(*short_page)
+
+        if 0 < count < requested:
+            return page
+
+        self.tuner.record(*page)
+
+        return None
+
+    # %%
+    def _flush(self):
+
+        """Throws away anything the device has sent that hasn't been read,
+        e.g. the rest of a response that timed out, so it doesn't get mixed
+        up with the next response"""
+
+        self._ut330.reset_input_buffer()
 
     # %%
     def _write_buffer(self):
 
         """Writes the command string to the buffer"""
 
-        bytes_written = self._ut330.write(bytearray(self._buffer))
+        bytes_written = self._ut330.write(self._buffer)
 
         if bytes_written != len(self._buffer):
             raise ValueError('Error! _write_buffer: not all command bytes '
@@ -295,27 +1387,68 @@ class UT330():
 
         return ''.join(chr(entry) for entry in temp).strip()
 
+    # %%
+    def _check_frame(self, length, crc=0xFFFF):
+
+        """Raises an IOError if the response in the buffer isn't length bytes
+        long or its CRC is wrong. The CRC is the last two bytes, least
+        significant byte first, and covers the whole frame. crc is the CRC
+        of any earlier part of the frame that's no longer in the buffer."""
+
+        if len(self._buffer) != length:
+            raise IOError('Error! The device sent {0} bytes when {1} were '
+                          'expected.'.format(len(self._buffer), length))
+
+        if not self.validate_crc:
+            return
+
+        with memoryview(self._buffer) as view:
+            crc = crc16(view[:-2], crc)
+
+        if crc != self._buffer[-2] + 256*self._buffer[-1]:
+            raise IOError('Error! The response from the device is corrupted '
+                          '(bad CRC).')
+
+    # %%
+    def _check_response(self, expected, message):
+
+        """Raises an IOError with message if the response in the buffer
+        isn't the expected one"""
+
+        self._check_frame(len(expected))
+
+        if bytes(expected) != self._buffer:
+            raise IOError(message)
+
     # %%
     def disconnect(self):
 
         """Disconnect the device"""
 
-        if self._ut330 is not None:
+        if self._ut330 is not None and self._ut330.isOpen():
+
+            if self.tuning_file is not None:
+                try:
+                    save_tuning(self.tuning_file, self.port, self.tuning())
+                except OSError as error:
+                    print("Warning! Can't save the UT330 tuning to {0}: {1}"
+                          .format(self.tuning_file, error))
+
             self._ut330.close()
 
     # %%
-    @buffer_safety
-    def read_data(self):
+    def _read_data_header(self):
 
-        """Downloads the device buffer data (temperature, humidity, pressure),
-        and decodes it"""
+        """Sends the read data command and reads the response header. Returns
+        the length of the data part that follows, or zero if there's no
+        data."""
 
-        # We split this function into a header and data part to speed up
+        # We split reading data into a header and data part to speed up
         # reading. Reading the header tells us how much data there is in the
         # data part
 
         # The read data command
-        self._buffer = [0xab, 0xcd, 0x03, 0x19, 0x70, 0xc5]
+        self._buffer = READ_DATA_COMMAND
 
         # Write the command
         self._write_buffer()
@@ -325,30 +1458,314 @@ class UT330():
         # Now get the header data from the buffer
         self._read_buffer(8)
 
-        # Check that some data has actually been returned
-        if len(self._buffer) == 0:
-            print("Warning! Empty buffer returned by device")
-            return []
+        length = self._data_length()
 
-        # Get the length of data in the buffer
-        length = (self._buffer[4] + 256*self._buffer[5] +
-                  256*256*self._buffer[6] + 256*256*256*self._buffer[7])
+        # No header, so there's nothing more to read
+        if length is None:
+            return 0
+
+        self._header_crc = crc16(self._buffer)
 
         # Check that there's actually some data on the device - 22 is the
-        # minimum buffer length if there's actually data
+        # minimum buffer length if there's actually data. The CRC follows
+        # whatever the length is, even zero.
         if length < 22:
 
             # Need to read the CRC code and so clear the buffer before
             # returning - gives an error later if this isn't done.
             self._read_buffer(2)
+            self._check_frame(2, self._header_crc)
 
             print("Warning! No temperature/humidity/pressure data on the " \
                   "device")
-            return []
+            return 0
+
+        return length
+
+    # %%
+    def _data_length(self):
+
+        """Returns the length of the data part given in the read data
+        response header in the buffer, or None if the device didn't send a
+        header. Raises an IOError if the header is cut short, or gives a
+        length the data can't be."""
+
+        # Check that some data has actually been returned
+        if len(self._buffer) == 0:
+            print("Warning! Empty buffer returned by device")
+            return None
+
+        if len(self._buffer) < 8:
+            raise IOError('Error! The device sent {0} bytes when 8 were '
+                          'expected.'.format(len(self._buffer)))
+
+        # Get the length of data in the buffer
+        length = int.from_bytes(self._buffer[4:8], 'little')
+
+        # Under 22 bytes means there's no data. Otherwise the data is whole
+        # records and the CRC, and no more than the device holds. This is
+        # checked before the buffer for the data is allocated, so a corrupted
+        # header can't ask for gigabytes.
+        if length >= 22 and ((length - 2) % RECORD_SIZE or
+                             (length - 2)//RECORD_SIZE > MAX_RECORDS):
+
+            # The rest of the response can't be read without its length, so
+            # it mustn't get mixed up with the next response
+            self._flush()
+
+            raise IOError('Error! The read data header gives a length of {0} '
+                          'bytes, but it must be 2 + {1}n for up to {2} '
+                          'records.'.format(length, RECORD_SIZE,
+                                            MAX_RECORDS))
+
+        return length
+
+    # %%
+    def _read_pages(self, byte_count, page_size, pages, stop):
+
+        """Reads byte_count bytes from the device a page at a time and puts
+        each page on the pages queue, followed by None when done. Runs on its
+        own thread so the next page is read while the last one is decoded.
+        If stop is set, the remaining bytes are still read (so they don't
+        corrupt the next command), but they're thrown away."""
+
+        def put(item):
+            # Don't block forever if the consumer has gone away
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        try:
+            while byte_count > 0:
+                page = self._ut330.read(min(page_size, byte_count))
+
+                # A short read means the device timed out
+                if len(page) == 0:
+                    break
+
+                byte_count -= len(page)
+
+                put(page)
+
+        except Exception as error:
+            put(error)
+
+        put(None)
+
+    # %%
+    def iter_records(self, page_size=4096):
+
+        """Generator version of read_data. Yields each reading as a dict (the
+        same as read_data gives) as soon as the page containing it has
+        arrived, rather than waiting for the whole download. A reader thread
+        reads the next page while the current one is decoded."""
+
+        with self._lock:
+            yield from self._iter_records(page_size)
+
+    # %%
+    def _iter_records(self, page_size):
+
+        """Does the work for iter_records, the caller holds the lock"""
+
+        self.pacer.wait('read_data')
+
+        self._short_read = False
+        success = False
+
+        try:
+            length = self._read_data_header()
+
+            if length == 0:
+                success = not self._short_read
+                return
+
+            # At most two pages are waiting to be decoded at any time
+            pages = queue.Queue(maxsize=2)
+            stop = threading.Event()
+
+            reader = threading.Thread(target=self._read_pages,
+                                      args=(length, page_size, pages, stop),
+                                      daemon=True)
+            reader.start()
+
+            # The last two bytes are the CRC, everything before is records
+            remaining = length - 2
+            partial = b''
+
+            # The CRC is checked as the pages arrive
+            crc = self._header_crc
+            trailer = b''
+
+            try:
+                while True:
+                    page = pages.get()
+
+                    if page is None:
+                        break
+
+                    if isinstance(page, Exception):
+                        raise page
+
+                    # Only decode complete records, carry the rest over to
+                    # the next page. Anything after the records is the CRC.
+                    data = page[:max(remaining, 0)]
+                    trailer += page[len(data):]
+                    crc = crc16(data, crc)
+
+                    page = partial + data
+                    remaining -= len(data)
+                    complete = len(page) - len(page) % RECORD_SIZE
+                    partial = page[complete:]
+
+                    columns = decode_records(page[:complete])
+
+                    for timestamp, temperature, humidity, pressure in zip(
+                            columns['Timestamp'].tolist(),
+                            columns['Temperature (C)'].tolist(),
+                            columns['Relative humidity (%)'].tolist(),
+                            columns['Pressure (hPa)'].tolist()):
+
+                        # The consumer stopping early (GeneratorExit) or
+                        # throwing an exception in says nothing about the
+                        # device, so it isn't recorded as a failure
+                        try:
+                            yield {'Timestamp': timestamp,
+                                   'Temperature (C)': temperature,
+                                   'Relative humidity (%)': humidity,
+                                   'Pressure (hPa)': pressure}
+                        except BaseException:
+                            success = None
+                            raise
+
+                if remaining > 0 or len(trailer) < 2:
+                    raise IOError('Error! The device sent {0} bytes when {1} '
+                                  'were expected.'.format(
+                                      length - remaining - 2 + len(trailer),
+                                      length))
+
+                if self.validate_crc and \
+                   crc != trailer[0] + 256*trailer[1]:
+                    raise IOError('Error! The response from the device is '
+                                  'corrupted (bad CRC).')
+
+                success = True
+
+            finally:
+                stop.set()
+                reader.join()
+
+        finally:
+            self.pacer.record('read_data', success)
+
+    # %%
+    def _decode_columns(self, payload, mode):
+
+        """Decodes the read data payload for the columns and runs modes"""
+
+        columns = decode_records(payload)
+
+        if mode == 'runs':
+            columns['Timestamp'] = \
+                TimestampRuns.from_timestamps(columns['Timestamp'])
+
+        return columns
+
+    # %%
+    @buffer_safety
+    def read_data(self, mode='batch', progress=None):
+
+        """Downloads the device buffer data (temperature, humidity, pressure),
+        and decodes it.
+
+        mode 'batch' returns a RecordBatch, which holds the readings in
+        NumPy arrays but can be used like a list of dicts too. mode
+        'records' returns a list of dicts, one per reading. mode
+        'columns' decodes the whole payload in one go with NumPy and returns
+        a dict of arrays, which is much faster for large downloads. mode
+        'runs' is the same as 'columns', but the timestamps are stored as
+        a TimestampRuns object. mode 'raw' doesn't decode the data, it
+        returns the 12 byte records as bytes (see decode_records).
+
+        progress is an optional function that's called with a progress
+        report (see progress_report) as the data arrives. It's called on
+        the thread doing the download.
+
+        If the device stops sending part way through the data on every try
+        (see RetryPolicy), a PartialDataError is raised with the complete
+        records that did arrive and the number missing."""
+
+        self._check_mode(mode)
+
+        length = self._read_data_header()
 
         # Now get the data
         # ----------------
-        self._read_buffer(length)
+        if length > 0:
+            self._read_buffer(length, progress)
+
+        return self._check_data(length, mode)
+
+    # %%
+    def _check_data(self, length, mode):
+
+        """Checks the read data payload in the buffer and decodes it. If the
+        device stopped sending part way through, raises a PartialDataError
+        with the complete records that did arrive."""
+
+        if length == 0:
+            return self._decode_data(length, mode)
+
+        if len(self._buffer) < length:
+
+            # Only keep whole records
+            complete = min(len(self._buffer), length - 2)
+            complete -= complete % RECORD_SIZE
+            del self._buffer[complete:]
+
+            # _decode_data expects the 2 CRC bytes on the end of the length
+            raise PartialDataError(self._decode_data(complete + 2, mode),
+                                   (length - 2)//RECORD_SIZE,
+                                   complete//RECORD_SIZE)
+
+        self._check_frame(length, self._header_crc)
+
+        return self._decode_data(length, mode)
+
+    # %%
+    def _check_mode(self, mode):
+
+        """Checks the read data mode is one we know about"""
+
+        if mode not in ('batch', 'records', 'columns', 'runs', 'raw'):
+            raise ValueError('Error! read_data mode is {0} but it must be '
+                             'batch, records, columns, runs, or raw'
+                             .format(mode))
+
+    # %%
+    def _decode_data(self, length, mode):
+
+        """Decodes the read data payload in the buffer"""
+
+        # The records as the device sent them, without the CRC
+        if mode == 'raw':
+            return bytes(self._buffer[:length - 2]) if length else b''
+
+        if mode == 'batch':
+            with memoryview(self._buffer) as view:
+                return RecordBatch.from_payload(view[:max(length - 2, 0)])
+
+        if length == 0:
+            return [] if mode == 'records' else \
+                self._decode_columns(b'', mode)
+
+        # The last two bytes are the CRC, everything before is records
+        if mode != 'records':
+            with memoryview(self._buffer) as view:
+                return self._decode_columns(view[:length - 2], mode)
 
         self._index = 0  # This is the offset of the first data item
 
@@ -388,9 +1805,7 @@ class UT330():
         device"""
 
         # The delete command
-        self._buffer = [0xab, 0xcd, 0x03, 0x18, 0xb1, 0x05]
-
-        self._buffer[5], self._buffer[4] = modbusCRC(self._buffer[0:4])
+        self._buffer = DELETE_DATA_COMMAND
 
         # Write the command
         self._write_buffer()
@@ -398,9 +1813,9 @@ class UT330():
         # Now get the response data from the buffer
         self._read_buffer(7)
 
-        # Check the return code shows the data was correctly deleted
-        if [171, 205, 4, 24, 0, 116, 181] != self._buffer:
-            raise IOError("Error! Delete data returned error code.")
+        # Check the return code shows the command worked
+        self._check_response(DELETE_DATA_RESPONSE,
+                             "Error! Delete data returned error code.")
 
     # %%
     @buffer_safety
@@ -409,7 +1824,7 @@ class UT330():
         """Read the configuration data from the device, saves it to disk"""
 
         # Send the read info command to the device
-        self._buffer = [0xab, 0xcd, 0x03, 0x11, 0x71, 0x03]
+        self._buffer = READ_CONFIG_COMMAND
 
         # Write the command
         self._write_buffer()
@@ -417,8 +1832,15 @@ class UT330():
         # Now get the data from the buffer. We know the returned length will
         # be 46.
         self._read_buffer(46)
+        self._check_frame(46)
+
+        return self._decode_config()
+
+    # %%
+    def _decode_config(self):
+
+        """Interprets the configuration data in the buffer"""
 
-        # Now, interpret the data in the buffer
         config = {}
 
         # Get the device name
@@ -471,9 +1893,27 @@ class UT330():
 
         """Sets the configuration information on the device"""
 
+        self._config_command(config)
+
+        # Write the buffer
+        self._write_buffer()
+
+        # Now get the response data from the buffer
+        self._read_buffer(7)
+
+        # Check the return code shows the command worked
+        self._check_response(WRITE_CONFIG_RESPONSE,
+                             "Error! Config writing returned error code.")
+
+    # %%
+    def _config_command(self, config):
+
+        """Checks the config and builds the set configuration command in the
+        buffer"""
+
         # The command to send, note we'll be overriding some bytes
-        self._buffer = [0xab, 0xcd, 0x1a, 0x10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-                        0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+        self._buffer = bytearray(29)
+        self._buffer[0:4] = [0xab, 0xcd, 0x1a, 0x10]
 
         # Check config parameters
         # -----------------------
@@ -536,24 +1976,31 @@ class UT330():
         # Add the CRC bytes
         self._buffer[28], self._buffer[27] = modbusCRC(self._buffer[0:27])
 
-        # Write the buffer
+    # %%
+    @buffer_safety
+    def write_datetime(self, timestamp):
+
+        """Syncs the time to the timestamp"""
+
+        self._datetime_command(timestamp)
+
         self._write_buffer()
 
         # Now get the response data from the buffer
         self._read_buffer(7)
 
-        # Check the return code shows the data was correctly written
-        if [171, 205, 4, 16, 0, 115, 117] != self._buffer:
-            raise IOError("Error! Config writing returned error code.")
+        # Check the return code shows the command worked
+        self._check_response(WRITE_DATETIME_RESPONSE,
+                             "Error! Writing datetime returned error code.")
 
     # %%
-    @buffer_safety
-    def write_datetime(self, timestamp):
+    def _datetime_command(self, timestamp):
 
-        """Syncs the time to the timestamp"""
+        """Builds the synch time command in the buffer"""
 
         # The command to send, note we'll be overriding some bytes
-        self._buffer = [0xab, 0xcd, 0x09, 0x12, 0, 0, 0, 0, 0, 0, 0, 0]
+        self._buffer = bytearray(12)
+        self._buffer[0:4] = [0xab, 0xcd, 0x09, 0x12]
 
         self._buffer[4] = timestamp.year - 2000
         self._buffer[5] = timestamp.month
@@ -565,29 +2012,26 @@ class UT330():
         # Add the CRC bytes
         self._buffer[11], self._buffer[10] = modbusCRC(self._buffer[0:10])
 
-        self._write_buffer()
-
-        # Now get the response data from the buffer
-        self._read_buffer(7)
-
-        # Check the return code shows the data was correctly written
-        if [171, 205, 4, 18, 0, 114, 21] != self._buffer:
-            raise IOError("Error! Writing datetime returned error code.")
-
     # %%
     @buffer_safety
     def read_offsets(self):
 
         """Reads the temperature, humidity, pressure offset"""
-        self._buffer = [0xab, 0xcd, 0x03, 0x17, 0xF1, 0x01]
+        self._buffer = READ_OFFSETS_COMMAND
 
         self._write_buffer()
 
         # Now get the response data from the buffer. The returned buffer length
         # is known to be 18.
         self._read_buffer(18)
+        self._check_frame(18)
 
-        # Decode the data
+        return self._decode_offsets()
+
+    # %%
+    def _decode_offsets(self):
+
+        """Interprets the offsets data in the buffer"""
 
         offsets = {}
 
@@ -623,6 +2067,23 @@ class UT330():
 
         """Set the device offsets for temperature, humidity, pressure"""
 
+        self._offsets_command(offsets)
+
+        self._write_buffer()
+
+        # Now get the response data from the buffer
+        self._read_buffer(7)
+
+        # Check the return code shows the command worked
+        self._check_response(WRITE_OFFSETS_RESPONSE,
+                             "Error! Offset writing returned error code.")
+
+    # %%
+    def _offsets_command(self, offsets):
+
+        """Checks the offsets and builds the set offsets command in the
+        buffer"""
+
         # Check for errors in parameters
         if offsets['temperature offset'] > 6.1 or \
            offsets['temperature offset'] < -6:
@@ -641,51 +2102,43 @@ class UT330():
                              format(offsets['pressure offset']))
 
         # The command to send, note we'll be overriding some bytes
-        self._buffer = [0xab, 0xcd, 0x06, 0x16, 0, 0, 0, 0, 0]
+        self._buffer = bytearray(9)
+        self._buffer[0:4] = [0xab, 0xcd, 0x06, 0x16]
 
         if offsets['temperature offset'] < 0:
-            self._buffer[4] = 256 - int(offsets['temperature offset']*10)
+            self._buffer[4] = 256 + round(offsets['temperature offset']*10)
         else:
-            self._buffer[4] = int(offsets['temperature offset']*10)
+            self._buffer[4] = round(offsets['temperature offset']*10)
 
         if offsets['humidity offset'] < 0:
-            self._buffer[5] = 256 - int(offsets['humidity offset']*10)
+            self._buffer[5] = 256 + round(offsets['humidity offset']*10)
         else:
-            self._buffer[5] = int(offsets['humidity offset']*10)
+            self._buffer[5] = round(offsets['humidity offset']*10)
 
         if offsets['pressure offset'] < 0:
-            self._buffer[6] = 256 - int(offsets['pressure offset']*10)
+            self._buffer[6] = 256 + round(offsets['pressure offset']*10)
         else:
-            self._buffer[6] = int(offsets['pressure offset']*10)
+            self._buffer[6] = round(offsets['pressure offset']*10)
 
         # Add the CRC bytes
         self._buffer[8], self._buffer[7] = modbusCRC(self._buffer[0:7])
 
-        self._write_buffer()
-
-        # Now get the response data from the buffer
-        self._read_buffer(7)
-
-        # Check the return code shows the data was correctly written
-        if [171, 205, 4, 22, 0, 112, 213] != self._buffer:
-            raise IOError("Error! Offset writing returned error code.")
-
     # %%
     @buffer_safety
     def restore_factory(self):
 
         """This command is given as a factory reset in the Windows software"""
 
-        self._buffer = [0xab, 0xcd, 0x03, 0x20, 0xb0, 0xd7]
+        self._buffer = RESTORE_FACTORY_COMMAND
 
         self._write_buffer()
 
         # Now get the data from the buffer
         self._read_buffer(7)
 
-        # Check the return code shows the data was correctly written
-        if [171, 205, 4, 32, 0, 103, 117] != self._buffer:
-            raise IOError("Error! Restore factory returned an error code.")
+        # Check the return code shows the command worked
+        self._check_response(RESTORE_FACTORY_RESPONSE,
+                             "Error! Restore factory returned an error code.")
 
     # %%
     @buffer_safety
@@ -693,14 +2146,49 @@ class UT330():
 
         """Returns the device name"""
 
-        self._buffer = [0xab, 0xcd, 0x03, 0x51, 0x70, 0xF3]
+        self._buffer = READ_DEVICE_NAME_COMMAND
 
         self._write_buffer()
 
         # Now get the response data from the buffer, we know the length is
         # fixed to 16 bytes
         self._read_buffer(16)
+        self._check_frame(16)
 
         self._index = 4
 
         return self._get_name()
+
+    # %%
+    def snapshot(self):
+
+        """Reads the device name, configuration, and offsets one straight
+        after the other, with only the pauses the pacer has learned between
+        them, and no other thread's commands in between. Returns a dict with
+        the 'device name', 'config', and 'offsets', the 'timings' of each
+        command in seconds (including its pause), the 'total time', and the
+        'config times' - the computer time before and after the
+        configuration was read, for comparing with the device clock."""
+
+        snapshot = {'timings': {}}
+
+        with self._lock:
+
+            start = time.monotonic()
+
+            for command, key in SNAPSHOT_COMMANDS:
+
+                before = datetime.datetime.now()
+                begin = time.monotonic()
+
+                snapshot[key] = getattr(self, command)()
+
+                snapshot['timings'][command] = time.monotonic() - begin
+
+                if command == 'read_config':
+                    snapshot['config times'] = (before,
+                                                datetime.datetime.now())
+
+            snapshot['total time'] = time.monotonic() - start
+
+        return snapshot
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 11:48:03 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Controls every UT330 attached to the computer at once. UT330Fleet opens a
+connection to each device and runs commands on all of them in parallel, one
+thread per device, so downloading from many devices takes about as long as
+downloading from the slowest one.
+
+Here's how to use it:
+
+    with UT330Fleet() as fleet:
+        data = fleet.read_data()
+        for name, readings in data.items():
+            print(name, len(readings))
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+from concurrent.futures import ThreadPoolExecutor
+
+from model.UT330 import UT330, find_ports
+from model.cache import CachedUT330
+
+
+# %%---------------------------------------------------------------------------
+# UT330Fleet
+# -----------------------------------------------------------------------------
+class UT330Fleet():
+    """Runs UT330 commands on many devices in parallel. Results are returned
+    as a dict keyed by device name. If a command fails on a device, its
+    result is the exception, so one bad device doesn't stop the others."""
+
+    # %%
+    def __init__(self, ports=None, cache_ttl=None, tuning_file=None):
+        """ports is a list of serial port names to use. If it's not given,
+        every port with a UT330 attached is used. If cache_ttl is given, the
+        configuration, offsets, and device name of each device are cached
+        for cache_ttl seconds (see CachedUT330), so repeated status checks
+        don't go to the devices. tuning_file keeps what's learned about each
+        device between runs (see UT330)."""
+
+        self.ports = ports
+        self.cache_ttl = cache_ttl
+        self.tuning_file = tuning_file
+
+        # The UT330 objects keyed by device name
+        self.devices = {}
+
+        # The port each device is on, keyed by device name
+        self.device_ports = {}
+
+        # The error for each port that couldn't be connected to, keyed by
+        # port
+        self.failures = {}
+
+        self._executor = None
+
+    # %%
+    def __enter__(self):
+        """Function to make this class work with Python's with statement"""
+
+        self.connect()
+
+        return self
+
+    # %%
+    def __exit__(self, type_ex, value_ex, traceback_ex):
+        """Function to make this class work with Python's with statement"""
+
+        self.disconnect()
+
+    # %%
+    def _connect_port(self, port):
+        """Connects to the device on port and returns it with its name"""
+
+        device = UT330(tuning_file=self.tuning_file)
+        if self.cache_ttl is not None:
+            device = CachedUT330(device, ttl=self.cache_ttl)
+
+        try:
+            device.connect(port)
+            name = device.read_device_name()
+        except Exception:
+            device.disconnect()
+            raise
+
+        return name, device
+
+    # %%
+    def connect(self):
+        """Connects to every device and reads their names. A device that
+        can't be connected to is left out and its error is put in failures,
+        so one bad device doesn't stop the others. Raises an IOError if
+        there are no devices, or none of them could be connected to."""
+
+        ports = self.ports if self.ports is not None else find_ports()
+
+        if not ports:
+            raise IOError('Error! No UT330 devices were detected on any USB '
+                          'port.')
+
+        self._executor = ThreadPoolExecutor(max_workers=len(ports))
+        self.failures = {}
+
+        futures = [(port, self._executor.submit(self._connect_port, port))
+                   for port in ports]
+
+        for port, future in futures:
+
+            try:
+                name, device = future.result()
+            except Exception as error:
+                self.failures[port] = error
+                continue
+
+            # Devices can have the same name, so make the keys unique
+            if name in self.devices:
+                name = '{0} ({1})'.format(name, port)
+
+            self.devices[name] = device
+            self.device_ports[name] = port
+
+        if not self.devices:
+            self.disconnect()
+            raise IOError('Error! No UT330 devices could be connected to. '
+                          '{0}'.format('; '.join(
+                              '{0}: {1}'.format(port, error)
+                              for port, error in self.failures.items())))
+
+    # %%
+    def disconnect(self):
+        """Disconnects from every device"""
+
+        for device in self.devices.values():
+            device.disconnect()
+
+        self.devices = {}
+        self.device_ports = {}
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    # %%
+    def run(self, command, *args, **kwargs):
+        """Runs the UT330 method called command on every device in parallel.
+        Returns a dict of results keyed by device name."""
+
+        def call(device):
+            try:
+                return getattr(device, command)(*args, **kwargs)
+            except Exception as error:
+                return error
+
+        futures = {name: self._executor.submit(call, device)
+                   for name, device in self.devices.items()}
+
+        return {name: future.result() for name, future in futures.items()}
+
+    # %%
+    def read_data(self, mode='batch'):
+        """Downloads the data from every device"""
+
+        return self.run('read_data', mode=mode)
+
+    # %%
+    def read_config(self):
+        """Reads the configuration from every device"""
+
+        return self.run('read_config')
+
+    # %%
+    def read_offsets(self):
+        """Reads the offsets from every device"""
+
+        return self.run('read_offsets')
+
+    # %%
+    def read_device_name(self):
+        """Reads the name of every device"""
+
+        return self.run('read_device_name')
+
+    # %%
+    def snapshot(self):
+        """Reads the name, configuration, and offsets of every device, for
+        checking the health of the fleet (see UT330.snapshot)"""
+
+        return self.run('snapshot')
+
+    # %%
+    def write_datetime(self, timestamp):
+        """Syncs the time on every device to the timestamp"""
+
+        return self.run('write_datetime', timestamp)
+
+    # %%
+    def delete_data(self):
+        """Deletes the data from every device"""
+
+        return self.run('delete_data')
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 10:12:40 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Reads and writes UT330 data files. Data can be saved as CSV or as
+compressed Parquet. The Parquet files store the readings as 16 bit tenths
+and the timestamps as datetime64, so they're much smaller and much faster to
+load than CSV.
+
+To convert a folder of existing CSV files to Parquet, go to the UT330BUI
+folder and type in:
+
+    python -m model.archive data
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+
+from model.UT330 import RecordBatch
+
+
+# %%---------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# The columns in a UT330 data file, in order
+COLUMNS = ['Timestamp',
+           'Temperature (C)',
+           'Relative humidity (%)',
+           'Pressure (hPa)']
+
+# Parquet files store the readings as tenths, these are the column names
+TENTHS = {'Temperature (C)': 'Temperature (0.1 C)',
+          'Relative humidity (%)': 'Relative humidity (0.1 %)',
+          'Pressure (hPa)': 'Pressure (0.1 hPa)'}
+
+# Older files call the pressure column 'Pressure (Pa)', even though the
+# values are in hPa
+RENAMES = {'Pressure (Pa)': 'Pressure (hPa)'}
+
+# The file formats we can write, and their file extensions
+FORMATS = {'CSV': '.csv',
+           'Parquet': '.parquet'}
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def to_frame(data):
+    """Converts the output of UT330.read_data to a dataframe with the
+    timestamp as datetime64."""
+
+    if isinstance(data, RecordBatch):
+        return data.to_frame()
+
+    df = pd.DataFrame(data, columns=COLUMNS)
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+
+    return df
+
+
+def write_frame(df, file_name, file_format='CSV'):
+    """Writes the dataframe (or RecordBatch) to file_name (without an
+    extension) in the given format. Returns the full file name written."""
+
+    if file_format not in FORMATS:
+        raise ValueError('Error! The file format is {0} but it must be one '
+                         'of {1}'.format(file_format, list(FORMATS)))
+
+    file_name += FORMATS[file_format]
+
+    if file_format == 'CSV':
+        if isinstance(df, RecordBatch):
+            df = df.to_frame()
+        df.to_csv(file_name, index=False)
+        return file_name
+
+    # Readings are stored as tenths in the smallest integer that holds them.
+    # A batch already has them.
+    if not isinstance(df, RecordBatch):
+        df = RecordBatch.from_columns(df)
+
+    parquet = pd.DataFrame({'Timestamp': df.timestamps})
+    for column, tenths in TENTHS.items():
+        parquet[tenths] = getattr(df, RecordBatch.TENTHS[column])
+
+    parquet.to_parquet(file_name, index=False, compression='zstd')
+
+    return file_name
+
+
+def read_frame(file_name, contents=None):
+    """Reads a CSV or Parquet data file into a dataframe with the standard
+    columns. The format comes from the file name extension. If contents is
+    given, it's the bytes of the file, otherwise the file is read from
+    disk."""
+
+    source = file_name if contents is None else BytesIO(contents)
+
+    if os.path.splitext(file_name)[1].lower() == FORMATS['Parquet']:
+
+        df = pd.read_parquet(source)
+
+        # Convert the tenths back to the readings
+        for column, tenths in TENTHS.items():
+            if tenths in df.columns:
+                df[column] = df.pop(tenths) / 10
+
+    else:
+
+        df = pd.read_csv(source)
+        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+
+    return df.rename(columns=RENAMES)
+
+
+def convert_file(csv_name):
+    """Converts a CSV data file to a Parquet file next to it. Returns the
+    Parquet file name."""
+
+    df = read_frame(csv_name)
+
+    return write_frame(df, os.path.splitext(csv_name)[0], 'Parquet')
+
+
+def convert_folder(folder, workers=None):
+    """Converts every UT330 CSV data file in folder to Parquet, using a pool
+    of worker processes. workers is the number of processes, the default is
+    one per CPU. Returns the Parquet file names written."""
+
+    csv_names = sorted(glob.glob(os.path.join(folder, 'UT330_data_*.csv')))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(convert_file, csv_names, chunksize=16))
+
+
+# %%---------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+def main():
+    """Bulk converter from CSV to Parquet."""
+
+    parser = argparse.ArgumentParser(
+        description='Converts a folder of UT330 CSV data files to Parquet.')
+    parser.add_argument('folder',
+                        help='folder containing the UT330_data_*.csv files')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per '
+                             'CPU)')
+    args = parser.parse_args()
+
+    converted = convert_folder(args.folder, args.workers)
+
+    print("Converted {0} files in {1}".format(len(converted), args.folder))
+
+
+if __name__ == '__main__':
+    main()
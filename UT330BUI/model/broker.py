@@ -0,0 +1,721 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 16:10:52 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+A broker daemon that owns the UT330 devices so several programs can share
+them. Only one program at a time can open a serial port, so two browser
+sessions (or a Bokeh server with --num-procs) would otherwise fight over
+the device. The broker opens each device once, runs the commands for each
+device one at a time, and serves clients over a Unix socket (Linux and
+macOS only).
+
+To start the broker, go to the UT330BUI folder and type in:
+
+    python -m model.broker
+
+UT330Client has the same methods as UT330, but sends the commands to the
+broker:
+
+    with UT330Client() as ut330:
+        data = ut330.read_data()
+
+To make the GUI use the broker, set the UT330_BROKER environment variable to
+the socket path before starting the Bokeh server.
+
+The protocol is simple. Each message is a five byte header - the body
+length (4 bytes, big-endian) and a code (1 byte) - followed by the body. For
+requests, the code is the command and the body is JSON giving the port and
+the arguments. For responses, the code says what the body is: a JSON result,
+the raw read_data records (12 bytes each, decoded by the client), a JSON
+read_data progress report (more messages follow), a JSON error, or the
+complete records of a download that stopped part way (after the number of
+records expected, 4 bytes, big-endian).
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import argparse
+import datetime
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import threading
+
+import serial
+
+from model.UT330 import (UT330, PartialDataError, RECORD_SIZE, TUNING_FILE,
+                         RecordBatch, TimestampRuns, decode_records,
+                         find_ports)
+from model.cache import CachedUT330
+
+
+# %%---------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Where the broker listens by default. The folder must be one only this user
+# can write to, otherwise another user could take the socket path first and
+# pretend to be the broker. That's the user's runtime folder if there is one,
+# or a folder of their own in the temporary folder.
+DEFAULT_SOCKET = os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR') or
+    os.path.join(tempfile.gettempdir(), 'ut330-{0}'.format(os.getuid())),
+    'ut330-broker.sock')
+
+# The message header: body length and code
+HEADER = struct.Struct('>IB')
+
+# The request codes are the positions in this list
+COMMANDS = ['connect',
+            'ports',
+            'read_data',
+            'delete_data',
+            'read_config',
+            'write_config',
+            'write_datetime',
+            'read_offsets',
+            'write_offsets',
+            'restore_factory',
+            'read_device_name',
+            'snapshot']
+
+# The response codes
+RESULT = 0
+DATA = 1
+PROGRESS = 2
+ERROR = 3
+PARTIAL = 4
+
+# The start of a PARTIAL body, the number of records expected. The complete
+# records that arrived follow it.
+COUNT = struct.Struct('>I')
+
+# The read_data modes
+MODES = ('batch', 'records', 'columns', 'runs', 'raw')
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def _default(value):
+    """JSON encoding for datetimes"""
+
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+
+    raise TypeError('Error! Cannot send a {0} to the UT330 broker'
+                    .format(type(value).__name__))
+
+
+def _object_hook(value):
+    """JSON decoding for datetimes"""
+
+    if list(value) == ['$datetime']:
+        return datetime.datetime.fromisoformat(value['$datetime'])
+
+    return value
+
+
+def encode(value):
+    """Returns value as a JSON message body"""
+
+    return json.dumps(value, default=_default,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def decode(body):
+    """Returns the value in a JSON message body"""
+
+    return json.loads(body.decode('utf-8'), object_hook=_object_hook)
+
+
+def check_folder(path):
+    """Raises an IOError unless the folder the socket path is in belongs to
+    this user and no one else can write to it"""
+
+    folder = os.path.dirname(os.path.abspath(path))
+
+    try:
+        status = os.lstat(folder)
+    except OSError as error:
+        raise IOError('Error! Cannot use the folder {0} for the UT330 broker '
+                      'socket: {1}'.format(folder, error))
+
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or \
+       status.st_mode & 0o022:
+        raise IOError('Error! The folder {0} for the UT330 broker socket '
+                      'must belong to this user, and no one else can be able '
+                      'to write to it'.format(folder))
+
+
+def send(connection, code, body):
+    """Sends a message on the socket connection"""
+
+    connection.sendall(HEADER.pack(len(body), code))
+    connection.sendall(body)
+
+
+def _receive_exactly(connection, count):
+    """Returns the next count bytes from the socket connection"""
+
+    buffer = bytearray(count)
+    received = 0
+
+    with memoryview(buffer) as view:
+        while received < count:
+            size = connection.recv_into(view[received:])
+            if not size:
+                raise IOError('Error! The connection to the UT330 broker '
+                              'closed.')
+            received += size
+
+    return buffer
+
+
+def receive(connection):
+    """Returns the code and body of the next message on the socket
+    connection"""
+
+    length, code = HEADER.unpack(_receive_exactly(connection, HEADER.size))
+
+    return code, _receive_exactly(connection, length)
+
+
+# %%---------------------------------------------------------------------------
+# UT330Broker
+# -----------------------------------------------------------------------------
+class _ClientGone(Exception):
+    """Raised when a reply can't be sent because the client has gone. It
+    isn't an IOError, so it's never mistaken for a device failure."""
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Runs the requests from one client connection"""
+
+    def handle(self):
+
+        def reply(code, body):
+            try:
+                send(self.request, code, body)
+            except OSError as error:
+                raise _ClientGone() from error
+
+        while True:
+            try:
+                code, body = receive(self.request)
+            except (IOError, struct.error):
+                # The client has gone
+                return
+
+            try:
+                self.server.broker.handle(code, body, reply)
+            except _ClientGone:
+                return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A Unix socket server with a thread per client"""
+
+    daemon_threads = True
+
+
+class UT330Broker():
+    """Owns the UT330 devices and runs commands on them for clients. Each
+    device is opened the first time a client uses it, and commands for a
+    device run one at a time."""
+
+    # %%
+    def __init__(self, path=DEFAULT_SOCKET, ports=None, cache_ttl=None,
+                 tuning_file=TUNING_FILE):
+        """path is the Unix socket to listen on. ports is a list of the
+        serial ports to use, if it's not given, every port with a UT330
+        attached is used. If cache_ttl is given, each device's
+        configuration, offsets, and name are cached for cache_ttl seconds
+        (see CachedUT330). tuning_file keeps what's learned about each
+        device between runs (see UT330)."""
+
+        self.path = path
+        self.ports = ports
+        self.cache_ttl = cache_ttl
+        self.tuning_file = tuning_file
+
+        # The UT330 objects, and a lock for each, keyed by port
+        self.devices = {}
+        self.locks = {}
+
+        # Guards devices and locks
+        self._lock = threading.Lock()
+
+        self._server = None
+        self._thread = None
+
+    # %%
+    def _find_ports(self):
+        """Returns the ports the broker can use"""
+
+        return self.ports if self.ports is not None else find_ports()
+
+    # %%
+    def device(self, port):
+        """Returns the port, UT330 object, and lock for port, connecting to
+        the device if needed. If port is None, the last UT330 found is
+        used, just like UT330.connect."""
+
+        with self._lock:
+
+            if port is None:
+                ports = self._find_ports()
+                if not ports:
+                    raise IOError('Error! No UT330 device was detected on '
+                                  'any USB port.')
+                port = ports[-1]
+
+            if port not in self.devices:
+                device = UT330(tuning_file=self.tuning_file)
+                if self.cache_ttl is not None:
+                    device = CachedUT330(device, ttl=self.cache_ttl)
+                device.connect(port)
+                self.devices[port] = device
+                self.locks[port] = threading.Lock()
+
+            return port, self.devices[port], self.locks[port]
+
+    # %%
+    def forget(self, port):
+        """Closes the device on port, it's reopened when it's next used"""
+
+        with self._lock:
+            device = self.devices.pop(port, None)
+            self.locks.pop(port, None)
+
+        if device is not None:
+            device.disconnect()
+
+    # %%
+    def handle(self, code, body, reply):
+        """Runs a request from a client. reply(code, body) sends a response
+        message, it raises _ClientGone if the client has gone."""
+
+        port = None
+
+        try:
+            if code >= len(COMMANDS):
+                raise ValueError('Error! Unknown UT330 broker command {0}'
+                                 .format(code))
+
+            command = COMMANDS[code]
+            request = decode(body)
+
+            if command == 'ports':
+                reply(RESULT, encode(self._find_ports()))
+                return
+
+            port, device, lock = self.device(request['port'])
+
+            if command == 'connect':
+                reply(RESULT, encode(port))
+                return
+
+            with lock:
+
+                if command == 'read_data':
+
+                    # If the client goes part way through, stop sending it
+                    # progress but finish the download, so the device isn't
+                    # asked for it again and the rest of it isn't left in
+                    # the port
+                    gone = []
+
+                    def progress(report):
+                        if gone:
+                            return
+                        try:
+                            reply(PROGRESS, encode(report))
+                        except _ClientGone as error:
+                            gone.append(error)
+
+                    try:
+                        data = device.read_data(mode='raw', progress=progress)
+                    except PartialDataError as error:
+                        data = error
+
+                    if gone:
+                        raise gone[0]
+
+                    if isinstance(data, PartialDataError):
+                        reply(PARTIAL, COUNT.pack(data.expected) + data.data)
+                    else:
+                        reply(DATA, data)
+                    return
+
+                result = getattr(device, command)(*request['args'])
+
+            reply(RESULT, encode(result))
+
+        except (IOError, ValueError) as error:
+
+            # The serial port has failed (e.g. the device was unplugged), so
+            # open it again next time
+            if isinstance(error, serial.SerialException) and port:
+                self.forget(port)
+
+            reply(ERROR, encode({'type': type(error).__name__,
+                                 'message': str(error)}))
+
+    # %%
+    def _bind(self):
+        """Creates the socket server"""
+
+        # The default folder is made here, only this user can use it
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700,
+                    exist_ok=True)
+        check_folder(self.path)
+
+        # Check there isn't a broker running already before replacing the
+        # socket file
+        if os.path.exists(self.path):
+            test = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                test.connect(self.path)
+            except OSError:
+                os.remove(self.path)
+            else:
+                raise IOError('Error! A UT330 broker is already running on '
+                              '{0}'.format(self.path))
+            finally:
+                test.close()
+
+        # Only this user can use the devices. The socket is made with these
+        # permissions, so there's no time when anyone else can connect.
+        umask = os.umask(0o177)
+        try:
+            self._server = _Server(self.path, _Handler)
+        finally:
+            os.umask(umask)
+
+        self._server.broker = self
+
+    # %%
+    def serve_forever(self):
+        """Serves clients until interrupted"""
+
+        self._bind()
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._close_server()
+
+    # %%
+    def start(self):
+        """Serves clients on a background thread, call close to stop"""
+
+        self._bind()
+
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    # %%
+    def close(self):
+        """Stops serving clients started with start"""
+
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+
+        self._close_server()
+
+    # %%
+    def _close_server(self):
+        """Closes the socket and the devices"""
+
+        if self._server is None:
+            return
+
+        self._server.server_close()
+        self._server = None
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        for port in list(self.devices):
+            self.forget(port)
+
+
+# %%---------------------------------------------------------------------------
+# UT330Client
+# -----------------------------------------------------------------------------
+class UT330Client():
+    """Has the same methods as UT330, but the commands are run by the UT330
+    broker. The data is decoded here, so read_data returns the same values
+    as UT330.read_data."""
+
+    # %%
+    def __init__(self, path=DEFAULT_SOCKET):
+        """path is the broker's Unix socket"""
+
+        self.path = path
+
+        # The serial port of the device on the broker
+        self.port = None
+
+        self._socket = None
+
+        # Only one command at a time can use the connection
+        self._lock = threading.Lock()
+
+    # %%
+    def __enter__(self):
+        """Function to make this class work with Python's with statement"""
+
+        self.connect()
+
+        return self
+
+    # %%
+    def __exit__(self, type_ex, value_ex, traceback_ex):
+        """Function to make this class work with Python's with statement"""
+
+        self.disconnect()
+
+    # %%
+    def connect(self, port=None):
+        """Connects to the broker, and through it to the device on port (or
+        the last UT330 found). Raises an IOError if either isn't there."""
+
+        self.disconnect()
+
+        # Only talk to a broker this user started
+        check_folder(self.path)
+
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            connection.connect(self.path)
+        except OSError as error:
+            connection.close()
+            raise IOError('Error! Cannot connect to the UT330 broker on '
+                          '{0}: {1}'.format(self.path, error))
+
+        self._socket = connection
+        self.port = port
+
+        try:
+            self.port = self._command('connect')
+        except IOError:
+            self.disconnect()
+            raise
+
+    # %%
+    def disconnect(self):
+        """Disconnects from the broker, the broker keeps the device open"""
+
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    # %%
+    def _command(self, command, *args, progress=None):
+        """Sends the command to the broker and returns the result"""
+
+        if self._socket is None:
+            raise IOError('Error! Not connected to the UT330 broker.')
+
+        with self._lock:
+
+            send(self._socket, COMMANDS.index(command),
+                 encode({'port': self.port, 'args': args}))
+
+            while True:
+
+                code, body = receive(self._socket)
+
+                if code == PROGRESS:
+                    if progress is not None:
+                        progress(decode(body))
+                    continue
+
+                if code == DATA:
+                    return body
+
+                if code == PARTIAL:
+                    expected, = COUNT.unpack_from(body)
+                    data = bytes(body[COUNT.size:])
+                    raise PartialDataError(data, expected,
+                                           len(data)//RECORD_SIZE)
+
+                if code == ERROR:
+                    error = decode(body)
+                    if error['type'] == 'ValueError':
+                        raise ValueError(error['message'])
+                    raise IOError(error['message'])
+
+                return decode(body)
+
+    # %%
+    def ports(self):
+        """Returns the serial ports the broker can use"""
+
+        return self._command('ports')
+
+    # %%
+    def read_data(self, mode='batch', progress=None):
+        """Downloads the device buffer data (temperature, humidity, pressure),
+        and decodes it. See UT330.read_data for the modes and progress."""
+
+        if mode not in MODES:
+            raise ValueError('Error! read_data mode is {0} but it must be '
+                             'batch, records, columns, runs, or raw'
+                             .format(mode))
+
+        try:
+            payload = self._command('read_data', progress=progress)
+        except PartialDataError as error:
+            raise PartialDataError(self._decode_data(error.data, mode),
+                                   error.expected, error.received)
+
+        return self._decode_data(payload, mode)
+
+    # %%
+    @staticmethod
+    def _decode_data(payload, mode):
+        """Decodes the records from the broker in the read_data mode"""
+
+        if mode == 'raw':
+            return bytes(payload)
+
+        if mode == 'batch':
+            return RecordBatch.from_payload(payload)
+
+        columns = decode_records(payload)
+
+        if mode == 'runs':
+            columns['Timestamp'] = \
+                TimestampRuns.from_timestamps(columns['Timestamp'])
+
+        if mode != 'records':
+            return columns
+
+        return [{'Timestamp': timestamp,
+                 'Temperature (C)': temperature,
+                 'Relative humidity (%)': humidity,
+                 'Pressure (hPa)': pressure}
+                for timestamp, temperature, humidity, pressure in zip(
+                    columns['Timestamp'].tolist(),
+                    columns['Temperature (C)'].tolist(),
+                    columns['Relative humidity (%)'].tolist(),
+                    columns['Pressure (hPa)'].tolist())]
+
+    # %%
+    def delete_data(self):
+        """Deletes the temperature, humidity, and pressure data from the
+        device"""
+
+        self._command('delete_data')
+
+    # %%
+    def read_config(self):
+        """Reads the configuration data from the device"""
+
+        return self._command('read_config')
+
+    # %%
+    def write_config(self, config):
+        """Sets the configuration information on the device"""
+
+        self._command('write_config', config)
+
+    # %%
+    def write_datetime(self, timestamp):
+        """Syncs the time to the timestamp"""
+
+        self._command('write_datetime', timestamp)
+
+    # %%
+    def read_offsets(self):
+        """Reads the temperature, humidity, pressure offset"""
+
+        return self._command('read_offsets')
+
+    # %%
+    def write_offsets(self, offsets):
+        """Set the device offsets for temperature, humidity, pressure"""
+
+        self._command('write_offsets', offsets)
+
+    # %%
+    def restore_factory(self):
+        """This command is given as a factory reset in the Windows software"""
+
+        self._command('restore_factory')
+
+    # %%
+    def read_device_name(self):
+        """Returns the device name"""
+
+        return self._command('read_device_name')
+
+    # %%
+    def snapshot(self):
+        """Reads the device name, configuration, and offsets in one go, see
+        UT330.snapshot"""
+
+        snapshot = self._command('snapshot')
+        snapshot['config times'] = tuple(snapshot['config times'])
+
+        return snapshot
+
+
+# %%---------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+def main():
+    """Runs the broker until it's stopped."""
+
+    parser = argparse.ArgumentParser(
+        description='Shares UT330 devices between programs.')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET,
+                        help='Unix socket to listen on (default: {0})'
+                             .format(DEFAULT_SOCKET))
+    parser.add_argument('--ports', nargs='+', default=None,
+                        help='serial ports to use (default: every port with '
+                             'a UT330 attached)')
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help='seconds to cache the configuration, offsets, '
+                             'and device name (default: no cache)')
+    parser.add_argument('--tuning-file', default=TUNING_FILE,
+                        help='file to keep the learned page size, read '
+                             'timeout, and pauses in (default: {0})'
+                             .format(TUNING_FILE))
+    args = parser.parse_args()
+
+    broker = UT330Broker(args.socket, args.ports, cache_ttl=args.cache_ttl,
+                         tuning_file=args.tuning_file)
+
+    # Stop cleanly on kill as well as Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print("UT330 broker listening on {0}".format(args.socket))
+
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
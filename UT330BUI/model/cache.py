@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 16:24:37 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+A cache for the UT330 commands that read device settings. The Settings tab
+and fleet status checks read the configuration, offsets, and device name
+over and over, and each read is a serial round trip. CachedUT330 wraps a
+UT330 (or a UT330Client) and keeps these results for a while, so repeated
+reads don't go to the device. Any command that changes the device clears
+the results it affects.
+
+Here's how to use it:
+
+    ut330 = CachedUT330(UT330(), ttl=30)
+    ut330.connect()
+    config = ut330.read_config()    # Read from the device
+    config = ut330.read_config()    # From the cache
+    ut330.write_config(config)      # Clears the cached config
+    print(ut330.stats())
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import datetime
+import threading
+import time
+
+from model.UT330 import SNAPSHOT_COMMANDS
+
+
+# %%---------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# The commands whose results are cached
+CACHED = ('read_config', 'read_offsets', 'read_device_name')
+
+# The cached results each command makes out of date. The device name is part
+# of the configuration, and the configuration has the device clock and the
+# number of readings.
+INVALIDATES = {'write_config': ('read_config', 'read_device_name'),
+               'write_datetime': ('read_config',),
+               'write_offsets': ('read_offsets',),
+               'delete_data': ('read_config',),
+               'restore_factory': CACHED,
+               'connect': CACHED,
+               'disconnect': CACHED}
+
+
+# %%---------------------------------------------------------------------------
+# CachedUT330
+# -----------------------------------------------------------------------------
+class CachedUT330():
+    """Has the same methods as the device it wraps, but read_config,
+    read_offsets, and read_device_name results are kept for ttl seconds.
+    Other methods go straight to the device."""
+
+    # %%
+    def __init__(self, device, ttl=30):
+        """device is the UT330 (or UT330Client) to cache. ttl is how long,
+        in seconds, a result is used for before it's read again."""
+
+        if ttl < 0:
+            raise ValueError('Error! The cache time to live is {0} but it '
+                             'must be at least 0'.format(ttl))
+
+        self.device = device
+        self.ttl = ttl
+
+        # The cached results keyed by command. Each entry is the result, the
+        # monotonic time it was read, and the computer time before and after
+        # the read.
+        self._entries = {}
+
+        # Goes up every time the cache is cleared, so a read that was running
+        # when the device changed isn't cached
+        self._generation = 0
+
+        # The cache is shared by the threads using the device
+        self._lock = threading.Lock()
+
+        self.hits = {command: 0 for command in CACHED}
+        self.misses = {command: 0 for command in CACHED}
+        self.invalidations = 0
+
+    # %%
+    def __getattr__(self, attribute):
+        """Methods that aren't cached or don't change the device are the
+        device's own"""
+
+        return getattr(self.device, attribute)
+
+    # %%
+    def __enter__(self):
+        """Function to make this class work with Python's with statement"""
+
+        self.connect()
+
+        return self
+
+    # %%
+    def __exit__(self, type_ex, value_ex, traceback_ex):
+        """Function to make this class work with Python's with statement"""
+
+        self.disconnect()
+
+    # %%
+    def _read(self, command, max_age):
+        """Returns the result of command, from the cache if it's younger than
+        max_age (the ttl if None) seconds, otherwise from the device"""
+
+        max_age = self.ttl if max_age is None else max_age
+
+        with self._lock:
+            entry = self._entries.get(command)
+            if entry is not None and time.monotonic() - entry[1] < max_age:
+                self.hits[command] += 1
+                return self._copy(entry[0])
+
+            self.misses[command] += 1
+            generation = self._generation
+
+        before = datetime.datetime.now()
+        result = getattr(self.device, command)()
+        entry = (result, time.monotonic(), (before, datetime.datetime.now()))
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[command] = entry
+
+        return self._copy(result)
+
+    # %%
+    @staticmethod
+    def _copy(result):
+        """Returns a copy of a cached result, so callers can't change the
+        cache"""
+
+        return dict(result) if isinstance(result, dict) else result
+
+    # %%
+    def _change(self, command, *args, **kwargs):
+        """Runs a command that changes the device, clearing the cached
+        results it affects"""
+
+        try:
+            return getattr(self.device, command)(*args, **kwargs)
+        finally:
+            # Clear the cache even if the command failed, as it may have got
+            # part way
+            self.invalidate(*INVALIDATES[command])
+
+    # %%
+    def invalidate(self, *commands):
+        """Clears the cached results for commands, or all of them if no
+        commands are given"""
+
+        with self._lock:
+            for command in commands or CACHED:
+                self._entries.pop(command, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    # %%
+    def read_times(self, command):
+        """Returns the computer times before and after the device read that
+        gave the cached result for command, or None if it isn't cached"""
+
+        with self._lock:
+            entry = self._entries.get(command)
+
+        return None if entry is None else entry[2]
+
+    # %%
+    def stats(self):
+        """Returns the number of cache hits, misses, and invalidations, and
+        the hit rate"""
+
+        with self._lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+
+            return {'hits': hits,
+                    'misses': misses,
+                    'hit rate': hits/(hits + misses) if hits + misses else 0,
+                    'invalidations': self.invalidations,
+                    'commands': {command: {'hits': self.hits[command],
+                                           'misses': self.misses[command]}
+                                 for command in CACHED}}
+
+    # %%
+    def read_config(self, max_age=None):
+        """Returns the configuration. max_age is the oldest (s) cached result
+        to use, 0 always reads the device."""
+
+        return self._read('read_config', max_age)
+
+    # %%
+    def read_offsets(self, max_age=None):
+        """Returns the offsets and current readings. max_age is the oldest
+        (s) cached result to use, 0 always reads the device."""
+
+        return self._read('read_offsets', max_age)
+
+    # %%
+    def read_device_name(self, max_age=None):
+        """Returns the device name. max_age is the oldest (s) cached result
+        to use, 0 always reads the device."""
+
+        return self._read('read_device_name', max_age)
+
+    # %%
+    def snapshot(self):
+        """Reads the device name, configuration, and offsets from the device
+        (see UT330.snapshot), and caches them"""
+
+        with self._lock:
+            generation = self._generation
+
+        snapshot = self.device.snapshot()
+        now = time.monotonic()
+        times = snapshot['config times']
+
+        with self._lock:
+            if generation == self._generation:
+                for command, key in SNAPSHOT_COMMANDS:
+                    self._entries[command] = (self._copy(snapshot[key]),
+                                             now, times)
+
+        return snapshot
+
+    # %%
+    def connect(self, *args, **kwargs):
+        """Connects to the device, there may be a different device on the
+        port, so the cache is cleared"""
+
+        return self._change('connect', *args, **kwargs)
+
+    # %%
+    def disconnect(self):
+        """Disconnects from the device and clears the cache"""
+
+        return self._change('disconnect')
+
+    # %%
+    def write_config(self, config):
+        """Writes the configuration and clears the cached configuration and
+        device name"""
+
+        return self._change('write_config', config)
+
+    # %%
+    def write_datetime(self, timestamp):
+        """Writes the device time and clears the cached configuration"""
+
+        return self._change('write_datetime', timestamp)
+
+    # %%
+    def write_offsets(self, offsets):
+        """Writes the offsets and clears the cached offsets"""
+
+        return self._change('write_offsets', offsets)
+
+    # %%
+    def delete_data(self):
+        """Deletes the data and clears the cached configuration"""
+
+        return self._change('delete_data')
+
+    # %%
+    def restore_factory(self):
+        """Does a factory reset and clears the cache"""
+
+        return self._change('restore_factory')
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 15:02:11 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Reduces a long series to a few points per pixel before it's plotted. A
+multi-year archive has hundreds of thousands of readings, but a chart is only
+a couple of thousand pixels wide, so sending every reading to the browser
+just makes it slow.
+
+There are two methods for readings:
+
+    lttb - Largest-Triangle-Three-Buckets. Picks the point in each bucket
+           that makes the largest triangle with its neighbours, which keeps
+           the shape of the line, including peaks.
+    min_max - keeps the lowest and highest point in each bucket, so no
+              excursion (e.g. past an alarm limit) is ever lost.
+
+Both return the x and y values of the points they keep, in order.
+
+Rollups (see model/store.py) already have the min and max of each period, so
+they're reduced with merge_periods instead, which merges neighbouring periods
+and keeps their overall min and max.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import numpy as np
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def _as_float(x):
+    """Returns x as float64 so datetimes and numbers can be used the same
+    way"""
+
+    x = np.asarray(x)
+
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.view(np.int64).astype(np.float64)
+
+    return x.astype(np.float64)
+
+
+def lttb(x, y, points):
+    """Downsamples the series to at most points points with the
+    Largest-Triangle-Three-Buckets method. The first and last points are
+    always kept. x can be numbers or datetime64."""
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    count = len(x)
+
+    if points >= count or points < 3:
+        return x, y
+
+    x_float = _as_float(x)
+    y_float = y.astype(np.float64)
+
+    # The points between the first and the last are split into points - 2
+    # buckets, one point is picked from each
+    edges = np.arange(points - 1)*(count - 2)//(points - 2) + 1
+    edges[-1] = count - 1
+
+    # The average of each bucket, with the last point as a final bucket
+    sizes = np.diff(np.append(edges, count))
+    x_average = np.add.reduceat(x_float, edges)/sizes
+    y_average = np.add.reduceat(y_float, edges)/sizes
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = count - 1
+
+    previous = 0
+    for bucket in range(points - 2):
+
+        start, stop = edges[bucket], edges[bucket + 1]
+
+        # Twice the area of the triangle made by the previous point, each
+        # point in this bucket, and the average of the next bucket
+        areas = np.abs(
+            (x_float[previous] - x_average[bucket + 1]) *
+            (y_float[start:stop] - y_float[previous]) -
+            (x_float[previous] - x_float[start:stop]) *
+            (y_average[bucket + 1] - y_float[previous]))
+
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return x[selected], y[selected]
+
+
+def min_max(x, y, points):
+    """Downsamples the series to at most points points by keeping the
+    lowest and highest point in each of points/2 buckets. x can be numbers
+    or datetime64."""
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    count = len(x)
+
+    if points >= count or points < 2:
+        return x, y
+
+    buckets = points // 2
+    size = -(-count // buckets)
+
+    # Pad the last bucket with copies of the last point so the buckets can
+    # be a 2D array
+    padded = np.pad(y, (0, buckets*size - count), mode='edge')
+    padded = padded.reshape(buckets, size)
+
+    offsets = np.arange(buckets)*size
+    lowest = offsets + np.argmin(padded, axis=1)
+    highest = offsets + np.argmax(padded, axis=1)
+
+    selected = np.unique(np.minimum(np.concatenate([lowest, highest]),
+                                    count - 1))
+
+    return x[selected], y[selected]
+
+
+def merge_periods(x, count, mean, low, high, points):
+    """Merges neighbouring rollup periods so there are at most points of
+    them. x is the start of each period, count the number of readings in
+    it, and mean, low, and high the mean, min, and max of the readings. Each
+    merged period keeps the lowest min and highest max, so no excursion is
+    lost, and its mean is weighted by the counts. Returns x, mean, low, and
+    high for the merged periods."""
+
+    x = np.asarray(x)
+    length = len(x)
+
+    if points >= length or points < 1:
+        return x, mean, low, high
+
+    size = -(-length // points)
+    starts = np.arange(0, length, size)
+
+    count = np.asarray(count, dtype=np.float64)
+    total = np.add.reduceat(np.asarray(mean)*count, starts)
+
+    return (x[starts],
+            total/np.add.reduceat(count, starts),
+            np.minimum.reduceat(low, starts),
+            np.maximum.reduceat(high, starts))
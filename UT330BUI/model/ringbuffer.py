@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 15:31:08 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+A fixed size buffer of readings held in NumPy arrays. Once the buffer is
+full, each new reading replaces the oldest, so the memory used stays the same
+no matter how long readings are added for - e.g. days of live monitoring.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import numpy as np
+
+
+# %%---------------------------------------------------------------------------
+# RingBuffer
+# -----------------------------------------------------------------------------
+class RingBuffer():
+    """Holds the most recent capacity readings. Each reading is a dict with a
+    value for each column."""
+
+    # %%
+    def __init__(self, capacity, dtypes):
+        """capacity is the number of readings kept. dtypes is a dict of the
+        NumPy dtype for each column, keyed by column name."""
+
+        if capacity < 1:
+            raise ValueError('Error! The ring buffer capacity is {0} but it '
+                             'must be at least 1'.format(capacity))
+
+        self.capacity = capacity
+
+        self._arrays = {name: np.zeros(capacity, dtype=dtype)
+                        for name, dtype in dtypes.items()}
+
+        # Where the next reading goes, and how many readings there are
+        self._next = 0
+        self._count = 0
+
+    # %%
+    def __len__(self):
+        """The number of readings in the buffer"""
+
+        return self._count
+
+    # %%
+    def append(self, reading):
+        """Adds a reading, replacing the oldest if the buffer is full"""
+
+        for name, array in self._arrays.items():
+            array[self._next] = reading[name]
+
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    # %%
+    def resize(self, capacity):
+        """Changes the number of readings kept, keeping the most recent
+        readings that fit"""
+
+        if capacity < 1:
+            raise ValueError('Error! The ring buffer capacity is {0} but it '
+                             'must be at least 1'.format(capacity))
+
+        columns = self.columns()
+        count = min(self._count, capacity)
+
+        self.capacity = capacity
+        self._arrays = {name: np.zeros(capacity, dtype=values.dtype)
+                        for name, values in columns.items()}
+
+        for name, values in columns.items():
+            self._arrays[name][:count] = values[len(values) - count:]
+
+        self._next = count % capacity
+        self._count = count
+
+    # %%
+    def clear(self):
+        """Removes all the readings"""
+
+        self._next = 0
+        self._count = 0
+
+    # %%
+    def columns(self):
+        """Returns a copy of the readings as a dict of arrays, oldest
+        first"""
+
+        if self._count < self.capacity:
+            return {name: array[:self._count].copy()
+                    for name, array in self._arrays.items()}
+
+        return {name: np.concatenate((array[self._next:],
+                                      array[:self._next]))
+                for name, array in self._arrays.items()}
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 13:21:45 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+A UT330 device simulator for testing and benchmarking without hardware. The
+simulator opens a pseudo-terminal (Linux and macOS only) and answers the UT330
+commands on it, just like a real device. Connect to it by giving the UT330
+its port:
+
+    with UT330Simulator(records=10000) as simulator:
+        ut330 = UT330()
+        ut330.connect(simulator.port)
+        data = ut330.read_data()
+
+The number of records, the link bandwidth, the delay before each response,
+and the rate of faults (dropped, corrupted, or truncated responses) can all
+be set.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import datetime
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+import numpy as np
+
+from model.UT330 import RECORD_DTYPE, command_frame, crc16
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def make_payload(count, start=datetime.datetime(2020, 1, 1), interval=300,
+                 seed=0):
+    """Returns count synthetic records as bytes, in the device's 12 byte
+    record format. The readings start at start and are interval seconds
+    apart. The temperature and humidity follow a daily cycle plus noise."""
+
+    generator = np.random.default_rng(seed)
+
+    seconds = np.arange(count, dtype=np.int64)*interval
+    timestamps = np.datetime64(start, 's') + seconds
+
+    # Split the timestamps into the fields the device uses
+    days = timestamps.astype('datetime64[D]')
+    months = timestamps.astype('datetime64[M]')
+    years = timestamps.astype('datetime64[Y]')
+    time_of_day = (timestamps - days).astype(np.int64)
+
+    records = np.zeros(count, dtype=RECORD_DTYPE)
+    records['year'] = years.astype(np.int64) + 1970 - 2000
+    records['month'] = (months - years).astype(np.int64) + 1
+    records['day'] = (days - months).astype(np.int64) + 1
+    records['hour'] = time_of_day // 3600
+    records['minute'] = time_of_day // 60 % 60
+    records['second'] = time_of_day % 60
+
+    # Readings in tenths
+    cycle = np.sin(2*np.pi*time_of_day/86400)
+    records['temperature'] = np.round(
+        200 + 50*cycle + generator.normal(0, 5, count))
+    records['humidity'] = np.clip(np.round(
+        500 - 100*cycle + generator.normal(0, 10, count)), 0, 1000)
+    records['pressure'] = 0
+
+    return records.tobytes()
+
+
+def _device_time(timestamp):
+    """Returns the timestamp in the device's six byte format"""
+
+    return bytes([timestamp.year - 2000, timestamp.month, timestamp.day,
+                  timestamp.hour, timestamp.minute, timestamp.second])
+
+
+def _signed(value):
+    """Returns a signed byte value as an unsigned byte"""
+
+    return value + 256 if value < 0 else value
+
+
+# %%---------------------------------------------------------------------------
+# UT330Simulator
+# -----------------------------------------------------------------------------
+class UT330Simulator():
+    """Simulates a UT330 on a pseudo-terminal. Starts answering commands as
+    soon as it's created, call close (or use it in a with statement) to stop
+    it."""
+
+    FACTORY_CONFIG = {'device name': 'UT330B',
+                      'sampling interval': 300,
+                      'overwrite records': False,
+                      'delay start': False,
+                      'delay timing': 0,
+                      'high temperature alarm': 40,
+                      'low temperature alarm': -10,
+                      'high humidity alarm': 95,
+                      'low humidity alarm': 10}
+
+    # %%
+    def __init__(self, records=1000, bandwidth=None, latency=0.0,
+                 faults=None, readings_limit=60000, seed=0):
+        """records is the number of records on the device, or the record
+        bytes themselves. bandwidth is the link speed in bytes per second
+        (None is as fast as possible). latency is the delay in seconds before
+        each response. faults is a dict of the chance (0 to 1) of each kind
+        of fault on a response: 'drop' sends nothing, 'corrupt' flips a bit,
+        and 'truncate' cuts the response short."""
+
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.faults = dict(faults or {})
+        self.readings_limit = readings_limit
+
+        self._random = random.Random(seed)
+
+        self.config = dict(self.FACTORY_CONFIG)
+        self.offsets = {'temperature offset': 0,
+                        'humidity offset': 0,
+                        'pressure offset': 0}
+
+        # The difference between the device clock and the computer clock
+        self.clock_offset = datetime.timedelta(0)
+
+        if isinstance(records, int):
+            records = make_payload(records,
+                                   interval=self.config['sampling interval'],
+                                   seed=seed)
+        self.payload = bytes(records)
+
+        # A count of the commands received, keyed by command number
+        self.commands = {}
+
+        # Open the pseudo-terminal. The client uses the port, we use the
+        # controller end.
+        self._controller, self._port_fd = os.openpty()
+        tty.setraw(self._port_fd)
+        self.port = os.ttyname(self._port_fd)
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    # %%
+    def __enter__(self):
+        """Function to make this class work with Python's with statement"""
+
+        return self
+
+    # %%
+    def __exit__(self, type_ex, value_ex, traceback_ex):
+        """Function to make this class work with Python's with statement"""
+
+        self.close()
+
+    # %%
+    def close(self):
+        """Stops the simulator and closes the pseudo-terminal"""
+
+        if self._stop.is_set():
+            return
+
+        self._stop.set()
+        self._thread.join()
+
+        os.close(self._controller)
+        os.close(self._port_fd)
+
+    # %%
+    def _read(self, count):
+        """Reads count bytes from the client. Returns None if the simulator
+        is stopped first."""
+
+        data = b''
+
+        while len(data) < count:
+
+            ready, _, _ = select.select([self._controller], [], [], 0.05)
+
+            if self._stop.is_set():
+                return None
+
+            if ready:
+                data += os.read(self._controller, count - len(data))
+
+        return data
+
+    # %%
+    def _write(self, data):
+        """Writes data to the client, no faster than the bandwidth"""
+
+        view = memoryview(data)
+        chunk = 4096
+        start = time.monotonic()
+        sent = 0
+
+        while sent < len(view):
+
+            _, ready, _ = select.select([], [self._controller], [], 0.05)
+
+            if self._stop.is_set():
+                return
+
+            if not ready:
+                continue
+
+            sent += os.write(self._controller, view[sent:sent + chunk])
+
+            # Hold back until the link could have sent this much
+            if self.bandwidth:
+                delay = start + sent/self.bandwidth - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+    # %%
+    def _serve(self):
+        """Reads commands and sends the responses until stopped"""
+
+        while not self._stop.is_set():
+
+            # Find the start of a frame
+            if self._read(1) != b'\xab':
+                continue
+            if self._read(1) != b'\xcd':
+                continue
+
+            length = self._read(1)
+            if length is None:
+                return
+
+            body = self._read(length[0])
+            if body is None:
+                return
+
+            frame = b'\xab\xcd' + length + body
+
+            # Ignore commands with a bad CRC, like a real device
+            if crc16(frame[:-2]) != frame[-2] + 256*frame[-1]:
+                continue
+
+            command = body[0]
+            self.commands[command] = self.commands.get(command, 0) + 1
+
+            response = self.respond(command, body[1:-2])
+
+            if response is None:
+                continue
+
+            if self.latency:
+                time.sleep(self.latency)
+
+            self._write(self._fault(response))
+
+    # %%
+    def _fault(self, response):
+        """Applies any faults to the response"""
+
+        if self._random.random() < self.faults.get('drop', 0):
+            return b''
+
+        if self._random.random() < self.faults.get('truncate', 0):
+            response = response[:self._random.randrange(len(response))]
+
+        if response and \
+           self._random.random() < self.faults.get('corrupt', 0):
+            response = bytearray(response)
+            response[self._random.randrange(len(response))] ^= \
+                1 << self._random.randrange(8)
+            response = bytes(response)
+
+        return response
+
+    # %%
+    def respond(self, command, payload=b''):
+        """Carries out the command and returns the response frame, or None
+        if there's no response"""
+
+        ok = b'\x00'
+
+        if command == 0x10:
+            self._set_config(payload)
+            return command_frame(command, ok)
+
+        if command == 0x11:
+            return self._config_frame()
+
+        if command == 0x12:
+            timestamp = datetime.datetime(2000 + payload[0], *payload[1:6])
+            self.clock_offset = timestamp - datetime.datetime.now()
+            return command_frame(command, ok)
+
+        if command == 0x16:
+            for index, key in enumerate(['temperature offset',
+                                         'humidity offset',
+                                         'pressure offset']):
+                value = payload[index]
+                self.offsets[key] = (value - 256 if value >= 128
+                                     else value)/10
+            return command_frame(command, ok)
+
+        if command == 0x17:
+            return self._offsets_frame()
+
+        if command == 0x18:
+            self.payload = b''
+            return command_frame(command, ok)
+
+        if command == 0x19:
+            return self._data_frame()
+
+        if command == 0x20:
+            self.config = dict(self.FACTORY_CONFIG)
+            return command_frame(command, ok)
+
+        if command == 0x51:
+            return command_frame(command, self._name())
+
+        # We don't know this command, so don't answer
+        return None
+
+    # %%
+    def _name(self):
+        """Returns the device name padded to 10 bytes"""
+
+        return self.config['device name'][:10].rjust(10).encode('ascii')
+
+    # %%
+    def _set_config(self, payload):
+        """Sets the config from a set configuration command payload"""
+
+        def signed(value):
+            return value - 256 if value >= 128 else value
+
+        self.config = {
+            'device name': payload[0:10].decode('ascii').strip(),
+            'sampling interval': int.from_bytes(payload[10:13], 'little'),
+            'overwrite records': bool(payload[13]),
+            'delay start': bool(payload[14]),
+            'delay timing': int.from_bytes(payload[15:18], 'little'),
+            'high temperature alarm': signed(payload[19]),
+            'low temperature alarm': signed(payload[20]),
+            'high humidity alarm': payload[21],
+            'low humidity alarm': payload[22]}
+
+    # %%
+    def _config_frame(self):
+        """Returns the read configuration response"""
+
+        config = self.config
+        now = datetime.datetime.now() + self.clock_offset
+
+        payload = (self._name() + bytes(6) +
+                   config['sampling interval'].to_bytes(3, 'little') +
+                   (len(self.payload)//12).to_bytes(2, 'little') +
+                   self.readings_limit.to_bytes(2, 'little') +
+                   bytes([100,
+                          int(config['overwrite records']),
+                          int(config['delay start'])]) +
+                   config['delay timing'].to_bytes(3, 'little') +
+                   bytes([0,
+                          _signed(config['high temperature alarm']),
+                          _signed(config['low temperature alarm']),
+                          config['high humidity alarm'],
+                          config['low humidity alarm']]) +
+                   _device_time(now))
+
+        return command_frame(0x11, payload)
+
+    # %%
+    def _offsets_frame(self):
+        """Returns the read offsets response, the current readings come from
+        the last record"""
+
+        temperature, humidity, pressure = 215, 480, 0
+        if self.payload:
+            record = np.frombuffer(self.payload[-12:], dtype=RECORD_DTYPE)[0]
+            temperature = int(record['temperature'])
+            humidity = int(record['humidity'])
+            pressure = int(record['pressure'])
+
+        def offset(key):
+            return _signed(round(self.offsets[key]*10))
+
+        payload = (temperature.to_bytes(2, 'little', signed=True) +
+                   bytes([offset('temperature offset')]) +
+                   humidity.to_bytes(2, 'little') +
+                   bytes([offset('humidity offset')]) +
+                   pressure.to_bytes(2, 'little') +
+                   bytes([offset('pressure offset'), 0, 0, 0]))
+
+        return command_frame(0x17, payload)
+
+    # %%
+    def _data_frame(self):
+        """Returns the read data response: an eight byte header giving the
+        length of the rest, then the records and the CRC"""
+
+        header = b'\xab\xcd\x00\x19' + \
+            (len(self.payload) + 2).to_bytes(4, 'little')
+
+        crc = crc16(self.payload, crc16(header))
+
+        return header + self.payload + bytes([crc & 255, crc >> 8])
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 16:52:18 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+A local SQLite store for UT330 readings from every device. Each reading is
+kept once, keyed by device name and timestamp, so downloading the same
+device again (e.g. with overwrite records on, when downloads overlap) only
+adds the new readings. Readings for a device and time range come back as
+columns, without reading every data file.
+
+As readings are added, the store keeps rollups of them - the count, min,
+max, and mean of each reading per minute, hour, and day - updating only the
+periods the new readings fall in. Charts of long periods use the rollups,
+so they read a few thousand rows rather than millions of readings.
+
+Here's how to use it:
+
+    with DataStore() as store:
+        store.ingest('UT330B', ut330.read_data())
+        week = store.fetch('UT330B', start='2026-10-11', end='2026-10-18')
+        hours = store.fetch_rollup('UT330B', 'hour')
+
+To load existing data files into the store, go to the UT330BUI folder and
+type in:
+
+    python -m model.store ingest data/UT330_data_*.csv --device UT330B
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import argparse
+import datetime
+import os
+import sqlite3
+import threading
+from itertools import repeat
+
+import numpy as np
+
+from model.UT330 import STORE_FILE, RecordBatch, TimestampRuns
+
+
+# %%---------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# The readings are stored as tenths, these are the columns for each
+TENTHS = {'Temperature (C)': 'temperature',
+          'Relative humidity (%)': 'humidity',
+          'Pressure (hPa)': 'pressure'}
+
+# Timestamps are stored as whole seconds since 1970 in the device's time.
+# The table is clustered on (device, timestamp), so a time range for one
+# device is a single range scan, and the timestamp index covers time
+# ranges across every device.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    device TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    temperature INTEGER NOT NULL,
+    humidity INTEGER NOT NULL,
+    pressure INTEGER NOT NULL,
+    PRIMARY KEY (device, timestamp)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS readings_timestamp ON readings (timestamp);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    device TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    temperature_min INTEGER NOT NULL,
+    temperature_max INTEGER NOT NULL,
+    temperature_sum INTEGER NOT NULL,
+    humidity_min INTEGER NOT NULL,
+    humidity_max INTEGER NOT NULL,
+    humidity_sum INTEGER NOT NULL,
+    pressure_min INTEGER NOT NULL,
+    pressure_max INTEGER NOT NULL,
+    pressure_sum INTEGER NOT NULL,
+    PRIMARY KEY (device, resolution, bucket)
+) WITHOUT ROWID;
+"""
+
+# The rollup resolutions in seconds, finest first. Each is built from the
+# one before it (minutes from the readings), so they must divide each other.
+RESOLUTIONS = {'minute': 60,
+               'hour': 3600,
+               'day': 86400}
+
+# The rollup statistics, in the order they're stored for each reading
+STATISTICS = ('min', 'max', 'sum')
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def to_columns(data):
+    """Converts the output of UT330.read_data in any mode (or a dataframe
+    from a data file) to columns of NumPy arrays, with the timestamps as
+    datetime64[s]"""
+
+    if isinstance(data, list):
+        data = {column: [record[column] for record in data]
+                for column in ['Timestamp'] + list(TENTHS)}
+
+    timestamps = data['Timestamp']
+    if isinstance(timestamps, TimestampRuns):
+        timestamps = timestamps.timestamps()
+
+    columns = {'Timestamp': np.asarray(timestamps, dtype='datetime64[s]')}
+    for column in TENTHS:
+        columns[column] = np.asarray(data[column], dtype=np.float64)
+
+    return columns
+
+
+def _seconds(timestamp):
+    """Converts a datetime, datetime64, or ISO format string to seconds
+    since 1970"""
+
+    return int(np.datetime64(timestamp, 's').astype(np.int64))
+
+
+# %%---------------------------------------------------------------------------
+# DataStore
+# -----------------------------------------------------------------------------
+class DataStore():
+    """Keeps the readings from every device in a SQLite database. A reading
+    that's already there (the same device and timestamp) isn't added
+    again."""
+
+    # %%
+    def __init__(self, path=STORE_FILE):
+        """path is the SQLite database file, it's created if it isn't
+        there"""
+
+        self.path = path
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        # The connection is shared by the threads using the store, one at a
+        # time
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock, self._connection:
+            # Readers don't block the writer, so the GUI can query while a
+            # download is stored
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(SCHEMA)
+
+            # Stores made before there were rollups need them building
+            if self._connection.execute(
+                    'SELECT 1 FROM readings LIMIT 1').fetchone() and \
+               not self._connection.execute(
+                    'SELECT 1 FROM rollups LIMIT 1').fetchone():
+                for (device,) in self._connection.execute(
+                        'SELECT DISTINCT device FROM readings').fetchall():
+                    self._update_rollups(device, None, None)
+
+    # %%
+    def __enter__(self):
+        """Function to make this class work with Python's with statement"""
+
+        return self
+
+    # %%
+    def __exit__(self, type_ex, value_ex, traceback_ex):
+        """Function to make this class work with Python's with statement"""
+
+        self.close()
+
+    # %%
+    def close(self):
+        """Closes the database"""
+
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    # %%
+    def ingest(self, device, data):
+        """Adds the readings from device to the store in one transaction.
+        data is the output of read_data in any mode, or a dataframe from a
+        data file. Readings already in the store are skipped. Returns the
+        number of readings added."""
+
+        # A batch already holds the readings as tenths
+        if not isinstance(data, RecordBatch):
+            data = RecordBatch.from_columns(to_columns(data))
+
+        seconds = data.timestamps.astype(np.int64)
+
+        rows = zip(repeat(device), seconds.tolist(),
+                   *[getattr(data, name).tolist()
+                     for name in TENTHS.values()])
+
+        with self._lock, self._connection:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO readings VALUES (?, ?, ?, ?, ?)', rows)
+            added = self._connection.total_changes - before
+
+            # Only the periods the readings fall in need updating
+            if added:
+                self._update_rollups(device, int(seconds.min()),
+                                     int(seconds.max()))
+
+        return added
+
+    # %%
+    def _update_rollups(self, device, first, last):
+        """Rebuilds device's rollups for the periods that the times first
+        to last (seconds since 1970) fall in, or every period if they're
+        None. Minutes are built from the readings, and each coarser
+        resolution from the one before. The caller holds the lock and the
+        transaction."""
+
+        names = list(TENTHS.values())
+
+        # Statistics from the readings, and from the finer rollups
+        from_readings = ', '.join('MIN({0}), MAX({0}), SUM({0})'.format(name)
+                                  for name in names)
+        from_rollups = ', '.join('MIN({0}_min), MAX({0}_max), SUM({0}_sum)'
+                                 .format(name) for name in names)
+
+        previous = None
+
+        for resolution in RESOLUTIONS.values():
+
+            if first is None:
+                start, end = -2**62, 2**62
+            else:
+                start = first - first % resolution
+                end = last - last % resolution + resolution
+
+            if previous is None:
+                select = ('SELECT device, {0}, timestamp/{0}*{0} AS period, '
+                          'COUNT(*), {1} FROM readings WHERE device = ? AND '
+                          'timestamp >= ? AND timestamp < ? '
+                          'GROUP BY period'.format(resolution, from_readings))
+                parameters = (device, start, end)
+            else:
+                select = ('SELECT device, {0}, bucket/{0}*{0} AS period, '
+                          'SUM(count), {1} FROM rollups WHERE device = ? AND '
+                          'resolution = ? AND bucket >= ? AND bucket < ? '
+                          'GROUP BY period'.format(resolution, from_rollups))
+                parameters = (device, previous, start, end)
+
+            self._connection.execute(
+                'INSERT OR REPLACE INTO rollups ' + select, parameters)
+
+            previous = resolution
+
+    # %%
+    def fetch(self, device, start=None, end=None):
+        """Returns the readings from device from start up to (but not
+        including) end, oldest first, as a dict of NumPy arrays - the same
+        as read_data(mode='columns') gives. start and end can be datetimes,
+        datetime64s, or ISO format strings. If either isn't given, the range
+        is open at that end."""
+
+        query = ('SELECT timestamp, temperature, humidity, pressure '
+                 'FROM readings WHERE device = ?')
+        parameters = [device]
+
+        if start is not None:
+            query += ' AND timestamp >= ?'
+            parameters.append(_seconds(start))
+
+        if end is not None:
+            query += ' AND timestamp < ?'
+            parameters.append(_seconds(end))
+
+        query += ' ORDER BY timestamp'
+
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+
+        values = np.array(rows, dtype=np.int64).reshape(-1, 4)
+
+        columns = {'Timestamp': values[:, 0].astype('datetime64[s]')}
+        for index, column in enumerate(TENTHS, 1):
+            columns[column] = values[:, index] / 10
+
+        return columns
+
+    # %%
+    def fetch_rollup(self, device, resolution, start=None, end=None):
+        """Returns device's rollup at resolution ('minute', 'hour', or
+        'day') for the periods from the one start is in up to end, as a
+        dict of NumPy arrays. 'Timestamp' is the start of each period and
+        'Count' is the number of readings in it. Each reading column (e.g.
+        'Temperature (C)') is the mean, and has ' min' and ' max' columns
+        too (e.g. 'Temperature (C) min')."""
+
+        if resolution not in RESOLUTIONS:
+            raise ValueError('Error! The rollup resolution is {0} but it '
+                             'must be one of {1}'.format(resolution,
+                                                         list(RESOLUTIONS)))
+
+        seconds = RESOLUTIONS[resolution]
+        names = list(TENTHS.values())
+
+        query = ('SELECT bucket, count, ' +
+                 ', '.join('{0}_min, {0}_max, {0}_sum'.format(name)
+                           for name in names) +
+                 ' FROM rollups WHERE device = ? AND resolution = ?')
+        parameters = [device, seconds]
+
+        if start is not None:
+            start = _seconds(start)
+            query += ' AND bucket >= ?'
+            parameters.append(start - start % seconds)
+
+        if end is not None:
+            query += ' AND bucket < ?'
+            parameters.append(_seconds(end))
+
+        query += ' ORDER BY bucket'
+
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+
+        values = np.array(rows, dtype=np.int64).reshape(-1, 2 + 3*len(names))
+        count = values[:, 1]
+
+        columns = {'Timestamp': values[:, 0].astype('datetime64[s]'),
+                   'Count': count}
+
+        for index, column in enumerate(TENTHS):
+            offset = 2 + 3*index
+            columns[column] = values[:, offset + 2] / count / 10
+            columns[column + ' min'] = values[:, offset] / 10
+            columns[column + ' max'] = values[:, offset + 1] / 10
+
+        return columns
+
+    # %%
+    def fetch_for_width(self, device, start, end, points):
+        """Returns device's data from start to end for a chart that can
+        show points points: the coarsest rollup that still has at least
+        points periods in the range, or the readings if none has. Returns
+        the resolution name (None for the readings) and the columns."""
+
+        span = _seconds(end) - _seconds(start)
+
+        for resolution, seconds in reversed(list(RESOLUTIONS.items())):
+            if span/seconds >= points:
+                return resolution, self.fetch_rollup(device, resolution,
+                                                     start, end)
+
+        return None, self.fetch(device, start, end)
+
+    # %%
+    def devices(self):
+        """Returns a list of the devices in the store, each a dict of the
+        device name, the number of readings, and the first and last
+        timestamps"""
+
+        # The counts come from the daily rollups, and the first and last
+        # readings are at the ends of each device's part of the table
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT device, SUM(count), '
+                '(SELECT MIN(timestamp) FROM readings '
+                'WHERE readings.device = rollups.device), '
+                '(SELECT MAX(timestamp) FROM readings '
+                'WHERE readings.device = rollups.device) '
+                'FROM rollups WHERE resolution = ? GROUP BY device '
+                'ORDER BY device', (RESOLUTIONS['day'],)).fetchall()
+
+        epoch = datetime.datetime(1970, 1, 1)
+
+        return [{'device name': device,
+                 'readings': count,
+                 'first': epoch + datetime.timedelta(seconds=first),
+                 'last': epoch + datetime.timedelta(seconds=last)}
+                for device, count, first, last in rows]
+
+
+# %%---------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+def main():
+    """Loads data files into the store, or lists what's in it."""
+
+    parser = argparse.ArgumentParser(
+        description='Stores UT330 readings in a SQLite database.')
+    parser.add_argument('--store', default=STORE_FILE,
+                        help='database file (default: {0})'
+                             .format(STORE_FILE))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_ingest = commands.add_parser(
+        'ingest', help='add the readings in CSV or Parquet data files')
+    parser_ingest.add_argument('files', nargs='+', help='data files')
+    parser_ingest.add_argument('--device', required=True,
+                               help='name of the device the files are from')
+
+    commands.add_parser('devices', help='list the devices in the store')
+
+    args = parser.parse_args()
+
+    with DataStore(args.store) as store:
+
+        if args.command == 'ingest':
+            # Only loading files needs pandas
+            from model.archive import read_frame
+
+            for file_name in args.files:
+                added = store.ingest(args.device, read_frame(file_name))
+                print("Added {0} readings from {1}".format(added, file_name))
+
+        for device in store.devices():
+            print("{0}: {1} readings from {2} to {3}".format(
+                device['device name'], device['readings'], device['first'],
+                device['last']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 17:02:44 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Shared setup for the tests. The tests run the model against the simulator in
+model/simulator.py, so no hardware is needed (Linux and macOS only). To run
+them, go to the UT330BUI folder and type in:
+
+    python -m pytest tests
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import os
+import sys
+
+import pytest
+
+# The code imports its modules as model.UT330 etc., like the Bokeh app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from model.UT330 import UT330  # noqa: E402
+from model.simulator import UT330Simulator  # noqa: E402
+
+
+# %%---------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def simulator():
+    """A simulated device with 1000 records"""
+
+    with UT330Simulator(records=1000) as device:
+        yield device
+
+
+@pytest.fixture
+def ut330(simulator):
+    """A UT330 connected to the simulator, with a short read timeout so
+    faults don't slow the tests down"""
+
+    device = UT330()
+    device.connect(simulator.port)
+    device.tuner.learn = False
+    device.tuner.read_timeout = 0.5
+
+    yield device
+
+    device.disconnect()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 19:15:33 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests writing and reading the CSV and Parquet data files.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.UT330 import RECORD_DTYPE, RecordBatch
+from model.archive import (COLUMNS, TENTHS, convert_folder, read_frame,
+                           write_frame)
+from model.simulator import make_payload
+
+
+# %%---------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def batch():
+    """1000 readings, with negative temperatures and humidity and pressure
+    over 3276.7"""
+
+    payload = bytearray(make_payload(1000))
+    records = np.frombuffer(payload, dtype=RECORD_DTYPE)
+    records['temperature'][:10] = -123
+    records['humidity'][:10] = 40000
+    records['pressure'][:10] = 65535
+
+    return RecordBatch.from_payload(bytes(payload))
+
+
+@pytest.fixture
+def parquet():
+    """Skips the test if there's no Parquet engine"""
+
+    pytest.importorskip('pyarrow')
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def check(df, batch):
+    """Checks the dataframe has the same readings as the batch"""
+
+    assert list(df.columns) == COLUMNS
+    assert np.array_equal(df['Timestamp'].values.astype('datetime64[s]'),
+                          batch.timestamps)
+
+    for column in COLUMNS[1:]:
+        assert np.allclose(df[column], batch[column])
+
+
+# %%---------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+def test_csv(batch, tmp_path):
+    """A CSV file reads back as it was written"""
+
+    name = write_frame(batch, str(tmp_path / 'readings'))
+    assert name.endswith('readings.csv')
+
+    check(read_frame(name), batch)
+
+    # A dataframe is written the same as a batch
+    name = write_frame(batch.to_frame(), str(tmp_path / 'frame'))
+    check(read_frame(name), batch)
+
+
+def test_parquet(batch, tmp_path, parquet):
+    """A Parquet file stores tenths as 16 bit integers, and reads back as
+    it was written, from disk or from the file's bytes"""
+
+    name = write_frame(batch, str(tmp_path / 'readings'), 'Parquet')
+    assert name.endswith('readings.parquet')
+
+    stored = pd.read_parquet(name)
+    assert stored[TENTHS['Temperature (C)']].dtype == np.int16
+    assert stored[TENTHS['Relative humidity (%)']].dtype == np.uint16
+    assert stored[TENTHS['Pressure (hPa)']].dtype == np.uint16
+
+    check(read_frame(name), batch)
+
+    with open(name, 'rb') as parquet_file:
+        check(read_frame('upload.parquet', parquet_file.read()), batch)
+
+    # A dataframe is written the same as a batch
+    name = write_frame(batch.to_frame(), str(tmp_path / 'frame'), 'Parquet')
+    check(read_frame(name), batch)
+
+
+def test_old_files(batch, tmp_path):
+    """Older files call the pressure column 'Pressure (Pa)'"""
+
+    name = str(tmp_path / 'old.csv')
+    batch.to_frame().rename(
+        columns={'Pressure (hPa)': 'Pressure (Pa)'}).to_csv(name, index=False)
+
+    check(read_frame(name), batch)
+
+
+def test_bad_format(batch, tmp_path):
+    """Only CSV and Parquet can be written"""
+
+    with pytest.raises(ValueError, match='file format'):
+        write_frame(batch, str(tmp_path / 'readings'), 'Excel')
+
+
+def test_convert_folder(batch, tmp_path, parquet):
+    """Every UT330 CSV file in the folder is converted to Parquet, and
+    other files are left alone"""
+
+    for index in range(3):
+        write_frame(batch[index*100:], str(tmp_path /
+                                           'UT330_data_{0}'.format(index)))
+    write_frame(batch, str(tmp_path / 'other'))
+
+    names = convert_folder(str(tmp_path), workers=2)
+
+    assert [os.path.basename(name) for name in names] == \
+        ['UT330_data_{0}.parquet'.format(index) for index in range(3)]
+    assert not os.path.exists(str(tmp_path / 'other.parquet'))
+
+    for index, name in enumerate(names):
+        check(read_frame(name), batch[index*100:])
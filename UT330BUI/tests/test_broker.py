@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 17:26:09 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests the UT330 broker and its client against the simulator.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import os
+import socket
+import stat
+import time
+
+import pytest
+
+from model.UT330 import PartialDataError, RecordBatch
+from model.broker import (COMMANDS, PROGRESS, UT330Broker, UT330Client,
+                          encode, receive, send)
+from model.simulator import UT330Simulator
+
+
+# %%---------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def socket_path(tmp_path):
+    """A socket path in a folder only this user can use"""
+
+    folder = tmp_path / 'broker'
+    folder.mkdir(mode=0o700)
+
+    return str(folder / 'broker.sock')
+
+
+def start(simulator, path):
+    """Starts a broker for the simulator on path"""
+
+    broker = UT330Broker(path, [simulator.port], tuning_file=None)
+    broker.start()
+
+    # Keep fault tests quick
+    port, device, lock = broker.device(simulator.port)
+    device.tuner.learn = False
+    device.tuner.read_timeout = 0.5
+
+    return broker
+
+
+# %%---------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+def test_read_data(simulator, socket_path):
+    """The client gets the same readings as reading the device directly"""
+
+    broker = start(simulator, socket_path)
+
+    try:
+        with UT330Client(socket_path) as client:
+            batch = client.read_data()
+            records = client.read_data(mode='records')
+            name = client.read_device_name()
+    finally:
+        broker.close()
+
+    assert isinstance(batch, RecordBatch)
+    assert len(batch) == 1000
+    assert batch.records() == records
+    assert name == 'UT330B'
+
+
+def test_partial_download(socket_path):
+    """A download that stops part way reaches the client as a
+    PartialDataError with the complete records"""
+
+    with UT330Simulator(records=1000, seed=3) as simulator:
+        broker = start(simulator, socket_path)
+
+        try:
+            with UT330Client(socket_path) as client:
+                simulator.faults = {'truncate': 1.0}
+                with pytest.raises(PartialDataError) as error:
+                    client.read_data()
+        finally:
+            broker.close()
+
+    assert len(error.value.data) == error.value.received
+    assert error.value.expected == 1000
+
+
+def test_socket_permissions(simulator, socket_path):
+    """Only this user can use the socket"""
+
+    broker = start(simulator, socket_path)
+
+    try:
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+    finally:
+        broker.close()
+
+
+def test_shared_folder(simulator, tmp_path):
+    """Neither the broker nor the client use a socket in a folder other
+    users can write to"""
+
+    folder = tmp_path / 'shared'
+    folder.mkdir()
+    folder.chmod(0o777)
+    path = str(folder / 'broker.sock')
+
+    with pytest.raises(IOError, match='must belong to this user'):
+        UT330Broker(path, [simulator.port], tuning_file=None).start()
+
+    with pytest.raises(IOError, match='must belong to this user'):
+        UT330Client(path).connect()
+
+
+def test_client_leaves_during_download(socket_path):
+    """If the client goes part way through a download, the device isn't
+    asked for the data again and the next client gets all of it"""
+
+    with UT330Simulator(records=20000, bandwidth=200000) as simulator:
+        broker = start(simulator, socket_path)
+
+        try:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.connect(socket_path)
+            send(connection, COMMANDS.index('read_data'),
+                 encode({'port': simulator.port, 'args': []}))
+
+            code, _ = receive(connection)
+            assert code == PROGRESS
+            connection.close()
+
+            with UT330Client(socket_path) as client:
+                # The client waits for the first download to finish
+                data = client.read_data()
+                name = client.read_device_name()
+
+            # Give the broker time to try again, if it was going to
+            time.sleep(0.5)
+        finally:
+            broker.close()
+
+    assert simulator.commands[0x19] == 2
+    assert len(data) == 20000
+    assert name == 'UT330B'
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 18:44:05 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests CachedUT330 against the simulator. simulator.commands counts the
+commands that reached the device: 0x11 is read config, 0x17 is read
+offsets, and 0x51 is read device name.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import time
+
+import pytest
+
+from model.UT330 import UT330
+from model.cache import CachedUT330
+
+
+# %%---------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def cached(simulator):
+    """A cached UT330 connected to the simulator"""
+
+    device = CachedUT330(UT330(), ttl=30)
+    device.connect(simulator.port)
+
+    yield device
+
+    device.disconnect()
+
+
+# %%---------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+def test_reads_cached(cached, simulator):
+    """Repeated reads come from the cache, unless they're too old"""
+
+    config = cached.read_config()
+    assert cached.read_config() == config
+    assert cached.read_device_name() == 'UT330B'
+    assert cached.read_device_name() == 'UT330B'
+    assert (simulator.commands[0x11], simulator.commands[0x51]) == (1, 1)
+
+    cached.read_config(max_age=0)
+    assert simulator.commands[0x11] == 2
+
+    stats = cached.stats()
+    assert (stats['hits'], stats['misses']) == (2, 3)
+    assert stats['commands']['read_config'] == {'hits': 1, 'misses': 2}
+
+
+def test_ttl(simulator):
+    """Results older than the ttl are read again"""
+
+    cached = CachedUT330(UT330(), ttl=0.1)
+    cached.connect(simulator.port)
+
+    cached.read_offsets()
+    cached.read_offsets()
+    assert simulator.commands[0x17] == 1
+
+    time.sleep(0.15)
+    cached.read_offsets()
+    assert simulator.commands[0x17] == 2
+
+    cached.disconnect()
+
+    with pytest.raises(ValueError):
+        CachedUT330(UT330(), ttl=-1)
+
+
+def test_changes_invalidate(cached, simulator):
+    """Commands that change the device clear only the results they make
+    out of date"""
+
+    config = cached.read_config()
+    offsets = cached.read_offsets()
+
+    offsets['temperature offset'] = 1.0
+    cached.write_offsets(offsets)
+    cached.read_config()
+    assert cached.read_offsets()['temperature offset'] == 1.0
+    assert (simulator.commands[0x11], simulator.commands[0x17]) == (1, 2)
+
+    config['device name'] = 'Office'
+    cached.write_config(config)
+    assert cached.read_device_name() == 'Office'
+    assert cached.read_config()['device name'] == 'Office'
+    cached.read_offsets()
+    assert (simulator.commands[0x11], simulator.commands[0x17]) == (2, 2)
+
+    cached.delete_data()
+    assert cached.read_config()['readings count'] == 0
+    assert simulator.commands[0x11] == 3
+
+    cached.disconnect()
+    cached.connect(simulator.port)
+    cached.read_offsets()
+    assert simulator.commands[0x17] == 3
+    assert cached.stats()['invalidations'] == 6
+
+
+def test_results_are_copies(cached):
+    """Changing a result doesn't change the cache"""
+
+    cached.read_config()['device name'] = 'changed'
+
+    assert cached.read_config()['device name'] == 'UT330B'
+
+
+def test_snapshot_fills_cache(cached, simulator):
+    """A snapshot caches the device name, config, and offsets"""
+
+    snapshot = cached.snapshot()
+    counts = dict(simulator.commands)
+
+    assert cached.read_config() == snapshot['config']
+    assert cached.read_offsets() == snapshot['offsets']
+    assert cached.read_device_name() == snapshot['device name']
+    assert cached.read_times('read_config') == snapshot['config times']
+    assert dict(simulator.commands) == counts
+
+
+def test_read_during_change_not_cached(cached, simulator):
+    """A result read while the device was being changed isn't cached"""
+
+    device_read = cached.device.read_config
+
+    def read_config():
+        config = device_read()
+        cached.invalidate('read_config')
+        return config
+
+    cached.device.read_config = read_config
+    cached.read_config()
+    del cached.device.read_config
+
+    cached.read_config()
+    assert simulator.commands[0x11] == 2
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 18:02:26 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests the command line tool against the simulator.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import datetime
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cli
+from model.UT330 import UT330
+from model.simulator import UT330Simulator
+from model.store import DataStore
+
+
+# %%---------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def tuning_file(tmp_path):
+    """A tuning file that doesn't exist yet"""
+
+    return str(tmp_path / 'tuning.json')
+
+
+@pytest.fixture
+def no_devices(monkeypatch):
+    """Makes it look like no UT330 is plugged in"""
+
+    monkeypatch.setattr(cli, 'find_ports', lambda: [])
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def run(simulator, tuning_file, *argv):
+    """Runs the command line tool on the simulator, returns the exit
+    code"""
+
+    return cli.main(['--port', simulator.port, '--tuning-file', tuning_file] +
+                    list(argv))
+
+
+def expected(simulator):
+    """Returns the readings on the simulator, read directly"""
+
+    ut330 = UT330()
+    ut330.connect(simulator.port)
+    data = ut330.read_data()
+    ut330.disconnect()
+
+    return data
+
+
+# %%---------------------------------------------------------------------------
+# Download
+# -----------------------------------------------------------------------------
+def test_download_csv(simulator, tuning_file, tmp_path):
+    """A download is written as CSV, the same as the GUI writes"""
+
+    data = expected(simulator)
+    output = str(tmp_path / 'readings')
+
+    assert run(simulator, tuning_file, 'download', '--output', output) == 0
+
+    frame = pd.read_csv(output + '.csv', parse_dates=['Timestamp'])
+    assert list(frame.columns) == cli.HEADER.strip().split(',')
+    assert np.array_equal(frame['Timestamp'].values.astype('datetime64[s]'),
+                          data.timestamps)
+    for column in ('Temperature (C)', 'Relative humidity (%)',
+                   'Pressure (hPa)'):
+        assert np.allclose(frame[column], data[column])
+
+    # Nothing was erased
+    assert len(expected(simulator)) == 1000
+
+
+def test_download_folder(simulator, tuning_file, tmp_path):
+    """Without --output, the file is named after the latest reading"""
+
+    latest = expected(simulator).timestamps.max().item()
+    folder = tmp_path / 'downloads'
+
+    assert run(simulator, tuning_file, 'download', '--folder',
+               str(folder)) == 0
+
+    assert os.listdir(folder) == ['UT330_data_{0}.csv'.format(
+        latest.strftime('%Y%m%d_%H%M%S'))]
+
+
+def test_download_stdout(simulator, tuning_file, capsys):
+    """--output - writes the CSV to stdout"""
+
+    assert run(simulator, tuning_file, 'download', '--output', '-') == 0
+
+    frame = pd.read_csv(io.StringIO(capsys.readouterr().out))
+    assert len(frame) == 1000
+
+
+def test_download_store_and_erase(simulator, tuning_file, tmp_path,
+                                  capsys):
+    """--store adds the readings to the store without duplicates, and
+    --erase erases the device once they're safe"""
+
+    path = str(tmp_path / 'store.sqlite')
+    output = str(tmp_path / 'readings.csv')
+
+    assert run(simulator, tuning_file, 'download', '--output', output,
+               '--store', path) == 0
+    assert 'Added 1000 new readings' in capsys.readouterr().err
+
+    assert run(simulator, tuning_file, 'download', '--output', output,
+               '--store', path, '--erase') == 0
+    assert 'Added 0 new readings' in capsys.readouterr().err
+
+    with DataStore(path) as store:
+        assert store.devices()[0]['readings'] == 1000
+
+    assert len(expected(simulator)) == 0
+
+    assert run(simulator, tuning_file, 'download', '--output', output) == 0
+    assert 'No data on the device.' in capsys.readouterr().err
+
+
+def test_download_partial(tuning_file, tmp_path, capsys):
+    """A download that stops part way saves what arrived, exits with 1, and
+    doesn't erase the device"""
+
+    output = str(tmp_path / 'readings.csv')
+
+    with UT330Simulator(records=1000, faults={'truncate': 1.0}) as simulator:
+
+        # Each try waits for the read timeout, so keep it short
+        assert run(simulator, tuning_file, 'tuning', '--read-timeout',
+                   '1') == 0
+
+        assert run(simulator, tuning_file, 'download', '--output', output,
+                   '--erase') == 1
+        assert 'records' in capsys.readouterr().err
+
+        simulator.faults = {}
+        assert len(expected(simulator)) == 1000
+
+
+def test_no_device(tuning_file, tmp_path, capsys):
+    """A port with no device gives an error and an exit code of 1"""
+
+    assert cli.main(['--port', str(tmp_path / 'missing'), '--tuning-file',
+                     tuning_file, 'config']) == 1
+    assert capsys.readouterr().err
+
+
+# %%---------------------------------------------------------------------------
+# Settings
+# -----------------------------------------------------------------------------
+def test_config_and_offsets(simulator, tuning_file, capsys):
+    """config and offsets print one value per line"""
+
+    assert run(simulator, tuning_file, 'config') == 0
+    output = capsys.readouterr().out
+    assert 'device name: UT330B\n' in output
+    assert 'readings count: 1000\n' in output
+
+    assert run(simulator, tuning_file, 'offsets') == 0
+    assert 'temperature offset: ' in capsys.readouterr().out
+
+
+def test_sync_time_and_erase(simulator, tuning_file):
+    """sync-time sets the device clock, and erase erases the data"""
+
+    simulator.clock_offset = datetime.timedelta(days=3)
+
+    assert run(simulator, tuning_file, 'sync-time') == 0
+    assert abs(simulator.clock_offset) < datetime.timedelta(seconds=2)
+
+    assert run(simulator, tuning_file, 'erase') == 0
+    assert simulator.payload == b''
+
+
+# %%---------------------------------------------------------------------------
+# Tuning
+# -----------------------------------------------------------------------------
+def test_tuning_without_device(tuning_file, no_devices, capsys):
+    """The tuning can be changed and shown without the device plugged in"""
+
+    port = '/dev/missing'
+
+    assert cli.main(['--port', port, '--tuning-file', tuning_file,
+                     'tuning', '--page-size', '8192',
+                     '--read-timeout', '2']) == 0
+
+    with open(tuning_file) as saved:
+        transport = json.load(saved)[port]['transport']
+    assert transport['page size'] == 8192
+    assert transport['read timeout'] == 2
+    assert not transport['learn']
+
+    # The only port in the tuning file is used if there's no --port
+    capsys.readouterr()
+    assert cli.main(['--tuning-file', tuning_file, 'tuning']) == 0
+    output = capsys.readouterr().out
+    assert 'port: /dev/missing\n' in output
+    assert 'page size: 8192\n' in output
+
+    assert cli.main(['--tuning-file', tuning_file, 'tuning', '--reset']) == 0
+    with open(tuning_file) as saved:
+        assert json.load(saved)[port]['transport']['learn']
+
+
+def test_tuning_needs_a_port(tuning_file, no_devices, capsys):
+    """With no device, no --port, and nothing saved, there's no port to
+    tune"""
+
+    assert cli.main(['--tuning-file', tuning_file, 'tuning']) == 1
+    assert 'use --port' in capsys.readouterr().err
+
+
+def test_tuning_bad_page_size(tuning_file, capsys):
+    """A page size outside the tuner's limits is an error"""
+
+    assert cli.main(['--port', '/dev/missing', '--tuning-file', tuning_file,
+                     'tuning', '--page-size', '10']) == 1
+    assert 'page size is 10' in capsys.readouterr().err
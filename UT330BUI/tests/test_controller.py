@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 18:21:40 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests the controller and the views against the simulator. There's no Bokeh
+server, so the device actions run straight away.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import pytest
+
+import controller.controller
+from controller.controller import Controller
+from model.UT330 import RecordBatch, RetryPolicy
+from model.simulator import UT330Simulator, make_payload
+
+
+# %%---------------------------------------------------------------------------
+# Simulators
+# -----------------------------------------------------------------------------
+class StoppingSimulator(UT330Simulator):
+    """Stops sending half way through the read data response"""
+
+    def _data_frame(self):
+
+        frame = super()._data_frame()
+
+        return frame[:len(frame)//2]
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def start(port):
+    """Returns a controller connected to the device on port, with a short
+    read timeout and no tuning file"""
+
+    app = Controller()
+    app.UT330B.tuning_file = None
+    app.setup()
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr('model.UT330.find_ports', lambda: [port])
+        app.connect()
+
+    assert app.connected
+
+    app.UT330B.tuner.learn = False
+    app.UT330B.tuner.read_timeout = 0.5
+
+    return app
+
+
+def stop(app):
+    """Disconnects the controller and stops its worker"""
+
+    app.disconnect()
+    app.executor.shutdown()
+
+
+def panel(app, kind):
+    """Returns the app's panel of the class kind"""
+
+    return next(view for view in app.panels
+                if type(view).__name__ == kind)
+
+
+# %%---------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def gui(simulator, monkeypatch, tmp_path):
+    """A controller connected to the simulator, with the store in
+    tmp_path"""
+
+    monkeypatch.setattr(controller.controller, 'STORE_FILE',
+                        str(tmp_path / 'store.sqlite'))
+
+    app = start(simulator.port)
+
+    yield app
+
+    stop(app)
+
+
+# %%---------------------------------------------------------------------------
+# Read data
+# -----------------------------------------------------------------------------
+def test_read_data_progress(gui):
+    """The progress bar goes when the download finishes"""
+
+    reports = []
+    show = gui.show_progress
+    gui.show_progress = lambda progress: (reports.append(progress),
+                                          show(progress))
+
+    gui.read_data()
+
+    assert reports
+    assert len(gui.device_data) == 1000
+    assert gui.device_progress is None
+    assert panel(gui, 'ReadSave').progress.text == ''
+
+
+def test_read_data_fails():
+    """The progress bar goes when the download fails part way"""
+
+    with StoppingSimulator(records=20000) as simulator:
+        app = start(simulator.port)
+        app.UT330B.tuner.page_size = 1024
+        app.UT330B.tuner.read_timeout = 0.2
+
+        app.read_data()
+
+        assert 'Error!' in app.status
+        assert 0 < len(app.device_data) < 20000
+        assert app.device_progress is None
+        assert panel(app, 'ReadSave').progress.text == ''
+
+        stop(app)
+
+
+# %%---------------------------------------------------------------------------
+# Settings
+# -----------------------------------------------------------------------------
+def test_snapshot(gui, simulator):
+    """The settings panel shows a snapshot, but not the old one when the
+    next snapshot fails"""
+
+    settings = panel(gui, 'Settings')
+
+    settings.callback_read_config()
+    assert gui.device_snapshot is not None
+    assert settings.device_name.value == 'UT330B'
+    assert settings.sample_interval.value == str(
+        gui.device_config['sampling interval'])
+
+    settings.device_name.value = 'before'
+    settings.temp_offset.value = 'before'
+
+    gui.UT330B.retry = RetryPolicy(attempts=1)
+    gui.UT330B.tuner.read_timeout = 0.1
+    simulator.faults = {'drop': 1.0}
+    settings.callback_read_config()
+
+    assert gui.device_snapshot is None
+    assert 'Error!' in settings.connect_status.text
+    assert settings.device_name.value == 'before'
+    assert settings.temp_offset.value == 'before'
+
+    simulator.faults = {}
+
+
+# %%---------------------------------------------------------------------------
+# Read & display
+# -----------------------------------------------------------------------------
+def test_show_data_plots_once():
+    """Loading data plots it once, the range change it makes doesn't plot
+    it again, but zooming does"""
+
+    app = Controller()
+    app.setup()
+    display = panel(app, 'ReadDisplay')
+
+    plots = []
+    plot_data = display.plot_data
+
+    def count_plots():
+        plots.append(display.x_range.start)
+        plot_data()
+
+    display.plot_data = count_plots
+
+    display.show_data(RecordBatch.from_payload(make_payload(1000)))
+    assert len(plots) == 1
+
+    # The debounced replot for the range show_data set
+    display.callback_refresh()
+    assert len(plots) == 1
+
+    # Zooming in
+    display.x_range.start += 3600*1000
+    assert display.refresh is not None
+    display.callback_refresh()
+    assert len(plots) == 2
+
+    app.executor.shutdown()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 18:58:12 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests downsampling long series for plotting.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import numpy as np
+import pytest
+
+from model.downsample import lttb, min_max
+
+
+# %%---------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def series():
+    """A day of readings a second apart, a slow cycle with noise and one
+    short spike"""
+
+    generator = np.random.default_rng(0)
+
+    x = np.datetime64('2020-01-01T00:00:00') + np.arange(86400)
+    y = 20 + 5*np.sin(np.arange(86400)/86400*2*np.pi) + \
+        generator.normal(0, 0.1, 86400)
+    y[40000] = 60
+
+    return x, y
+
+
+# %%---------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+def test_lttb(series):
+    """LTTB keeps the ends and the spike, and picks points from the
+    series in order"""
+
+    x, y = series
+    x_small, y_small = lttb(x, y, 1000)
+
+    assert len(x_small) == len(y_small) == 1000
+    assert x_small.dtype == x.dtype
+    assert (x_small[0], x_small[-1]) == (x[0], x[-1])
+    assert np.all(np.diff(x_small) > np.timedelta64(0, 's'))
+    assert y_small.max() == 60
+
+    index = np.searchsorted(x, x_small)
+    assert np.array_equal(y[index], y_small)
+
+
+def test_lttb_numbers():
+    """LTTB works with numbers for x, and short series aren't changed"""
+
+    x = np.arange(10)
+    y = np.array([0, 1, 0, 1, 9, 1, 0, 1, 0, 1])
+
+    x_small, y_small = lttb(x, y, 5)
+    assert list(x_small[[0, -1]]) == [0, 9]
+    assert 9 in y_small
+
+    for points in (10, 20, 2):
+        assert len(lttb(x, y, points)[0]) == 10
+
+
+def test_min_max(series):
+    """min_max keeps the lowest and highest point of each bucket"""
+
+    x, y = series
+    x_small, y_small = min_max(x, y, 1000)
+
+    assert len(x_small) <= 1000
+    assert y_small.max() == y.max()
+    assert y_small.min() == y.min()
+    assert np.all(np.diff(x_small) > np.timedelta64(0, 's'))
+
+    index = np.searchsorted(x, x_small)
+    assert np.array_equal(y[index], y_small)
+
+    # The buckets are 172 points, so the first bucket's extremes are kept
+    assert y[:172].max() in y_small
+    assert y[:172].min() in y_small
+
+
+def test_min_max_short():
+    """Short series aren't changed"""
+
+    x = np.arange(5)
+    y = np.arange(5.0)
+
+    assert len(min_max(x, y, 10)[0]) == 5
+    assert len(min_max(x, y, 1)[0]) == 5
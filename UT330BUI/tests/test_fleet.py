@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 17:18:31 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests UT330Fleet against the simulator.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import pytest
+
+from model.UT330 import RecordBatch
+from model.UT330Fleet import UT330Fleet
+from model.simulator import UT330Simulator
+
+
+# %%---------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+def test_read_data(simulator):
+    """The fleet downloads from every device"""
+
+    with UT330Fleet(ports=[simulator.port]) as fleet:
+        data = fleet.read_data()
+
+    assert list(data) == ['UT330B']
+    assert isinstance(data['UT330B'], RecordBatch)
+    assert len(data['UT330B']) == 1000
+
+
+def test_bad_port(simulator, tmp_path):
+    """A port that can't be connected to is reported, and the other devices
+    are still used"""
+
+    missing = str(tmp_path / 'missing')
+
+    fleet = UT330Fleet(ports=[missing, simulator.port])
+    fleet.connect()
+
+    try:
+        assert list(fleet.devices) == ['UT330B']
+        assert list(fleet.failures) == [missing]
+        assert isinstance(fleet.failures[missing], IOError)
+        assert len(fleet.read_data()['UT330B']) == 1000
+    finally:
+        fleet.disconnect()
+
+
+def test_every_port_bad(tmp_path):
+    """If no device can be connected to, connect raises an IOError and
+    doesn't leave anything open"""
+
+    ports = [str(tmp_path / 'missing 1'), str(tmp_path / 'missing 2')]
+    fleet = UT330Fleet(ports=ports)
+
+    with pytest.raises(IOError, match='No UT330 devices could be'):
+        fleet.connect()
+
+    assert fleet.devices == {}
+    assert fleet._executor is None
+    assert list(fleet.failures) == ports
+
+
+def test_devices_with_the_same_name():
+    """Devices with the same name get their port added to the name"""
+
+    with UT330Simulator(records=10) as first, \
+            UT330Simulator(records=20) as second:
+
+        with UT330Fleet(ports=[first.port, second.port]) as fleet:
+            data = fleet.read_data()
+
+    assert sorted(len(readings) for readings in data.values()) == [10, 20]
+    assert 'UT330B ({0})'.format(second.port) in data
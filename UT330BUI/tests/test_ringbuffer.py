@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 19:03:47 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests the ring buffer the live chart keeps its readings in.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import numpy as np
+import pytest
+
+from model.ringbuffer import RingBuffer
+
+
+# %%---------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+DTYPES = {'Timestamp': 'datetime64[ms]', 'Temperature (C)': np.float64}
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def reading(index):
+    """Returns reading number index"""
+
+    return {'Timestamp': np.datetime64('2020-01-01') + np.timedelta64(
+        index, 's'), 'Temperature (C)': float(index)}
+
+
+def filled(capacity, count):
+    """Returns a buffer of capacity with count readings added"""
+
+    buffer = RingBuffer(capacity, DTYPES)
+    for index in range(count):
+        buffer.append(reading(index))
+
+    return buffer
+
+
+# %%---------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+def test_append():
+    """The buffer keeps the most recent readings, oldest first"""
+
+    buffer = filled(5, 3)
+    assert len(buffer) == 3
+    assert list(buffer.columns()['Temperature (C)']) == [0, 1, 2]
+
+    buffer = filled(5, 12)
+    columns = buffer.columns()
+    assert len(buffer) == 5
+    assert list(columns['Temperature (C)']) == [7, 8, 9, 10, 11]
+    assert columns['Timestamp'][0] == reading(7)['Timestamp']
+    assert columns['Timestamp'].dtype == np.dtype('datetime64[ms]')
+
+
+def test_columns_are_copies():
+    """Changing the columns doesn't change the buffer"""
+
+    buffer = filled(5, 3)
+    buffer.columns()['Temperature (C)'][0] = 100
+
+    assert buffer.columns()['Temperature (C)'][0] == 0
+
+
+def test_resize():
+    """Resizing keeps the most recent readings that fit"""
+
+    buffer = filled(5, 12)
+
+    buffer.resize(3)
+    assert list(buffer.columns()['Temperature (C)']) == [9, 10, 11]
+
+    buffer.resize(6)
+    buffer.append(reading(12))
+    assert list(buffer.columns()['Temperature (C)']) == [9, 10, 11, 12]
+
+    for index in range(13, 20):
+        buffer.append(reading(index))
+    assert list(buffer.columns()['Temperature (C)']) == list(range(14, 20))
+
+
+def test_clear():
+    """Clearing empties the buffer"""
+
+    buffer = filled(5, 7)
+    buffer.clear()
+
+    assert len(buffer) == 0
+    assert len(buffer.columns()['Timestamp']) == 0
+
+    buffer.append(reading(1))
+    assert list(buffer.columns()['Temperature (C)']) == [1]
+
+
+def test_bad_capacity():
+    """The capacity must be at least 1"""
+
+    with pytest.raises(ValueError):
+        RingBuffer(0, DTYPES)
+
+    with pytest.raises(ValueError):
+        filled(5, 1).resize(0)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 17:41:57 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests the data store, its rollups, and downsampling the rollups for charts.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import numpy as np
+import pytest
+
+from model.UT330 import RecordBatch
+from model.downsample import merge_periods
+from model.simulator import make_payload
+from model.store import DataStore
+
+
+# %%---------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def batch():
+    """Three days of readings, five minutes apart"""
+
+    return RecordBatch.from_payload(make_payload(3*288))
+
+
+@pytest.fixture
+def store(tmp_path):
+    """An empty store"""
+
+    with DataStore(str(tmp_path / 'store.db')) as data_store:
+        yield data_store
+
+
+# %%---------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+def test_ingest(store, batch):
+    """Readings are stored once, however often they're added"""
+
+    assert store.ingest('UT330B', batch) == len(batch)
+    assert store.ingest('UT330B', batch) == 0
+    assert store.ingest('UT330B', batch.records()[:10]) == 0
+
+    columns = store.fetch('UT330B')
+    for column in RecordBatch.COLUMNS:
+        assert np.array_equal(columns[column], batch[column])
+
+    devices = store.devices()
+    assert [device['device name'] for device in devices] == ['UT330B']
+    assert devices[0]['readings'] == len(batch)
+
+
+def test_rollups(store, batch):
+    """The hourly rollup agrees with grouping the readings by hour"""
+
+    store.ingest('UT330B', batch)
+    rollup = store.fetch_rollup('UT330B', 'hour')
+
+    hours = batch.timestamps.astype('datetime64[h]')
+    starts, index, count = np.unique(hours, return_index=True,
+                                     return_counts=True)
+
+    assert np.array_equal(rollup['Timestamp'], starts.astype('datetime64[s]'))
+    assert np.array_equal(rollup['Count'], count)
+
+    for column in RecordBatch.COLUMNS:
+        if column == 'Timestamp':
+            continue
+        readings = batch[column]
+        assert np.allclose(rollup[column],
+                           np.add.reduceat(readings, index)/count)
+        assert np.array_equal(rollup[column + ' min'],
+                              np.minimum.reduceat(readings, index))
+        assert np.array_equal(rollup[column + ' max'],
+                              np.maximum.reduceat(readings, index))
+
+
+def test_fetch_for_width(store, batch):
+    """A wide range comes from a rollup, a narrow one from the readings"""
+
+    store.ingest('UT330B', batch)
+    start = batch.timestamps[0]
+
+    resolution, columns = store.fetch_for_width(
+        'UT330B', start, start + np.timedelta64(3, 'D'), 50)
+    assert resolution == 'hour'
+    assert columns['Count'].sum() == len(batch)
+
+    resolution, columns = store.fetch_for_width(
+        'UT330B', start, start + np.timedelta64(30, 'm'), 50)
+    assert resolution is None
+    assert len(columns['Timestamp']) == 6
+
+    with pytest.raises(ValueError):
+        store.fetch_rollup('UT330B', 'week')
+
+
+def test_merge_periods(store, batch):
+    """Merging rollup periods keeps the lowest and highest readings"""
+
+    store.ingest('UT330B', batch)
+    rollup = store.fetch_rollup('UT330B', 'minute')
+    column = 'Temperature (C)'
+
+    x, mean, low, high = merge_periods(
+        rollup['Timestamp'], rollup['Count'], rollup[column],
+        rollup[column + ' min'], rollup[column + ' max'], 100)
+
+    assert len(x) <= 100
+    assert low.min() == batch[column].min()
+    assert high.max() == batch[column].max()
+    assert np.all(low <= mean) and np.all(mean <= high)
+    assert np.isclose(np.average(mean, weights=np.add.reduceat(
+        rollup['Count'], np.searchsorted(rollup['Timestamp'], x))),
+        batch[column].mean())
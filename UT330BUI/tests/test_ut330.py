@@ -0,0 +1,746 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 17:05:12 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+
+Tests read_data in every mode, and its retries and error handling, against
+the simulator.
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import asyncio
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from model.AsyncUT330 import AsyncUT330
+from model.UT330 import (UT330, CommandPacer, PartialDataError, RECORD_DTYPE,
+                         ReadTuner, RecordBatch, RetryPolicy, TimestampRuns,
+                         crc16, load_tuning)
+from model.simulator import UT330Simulator, make_payload
+
+
+# %%---------------------------------------------------------------------------
+# Simulators
+# -----------------------------------------------------------------------------
+class HeaderSimulator(UT330Simulator):
+    """Answers read data with a header giving length and the CRC, but no
+    records"""
+
+    def __init__(self, length, **kwargs):
+
+        self.length = length
+        super().__init__(**kwargs)
+
+    def _data_frame(self):
+
+        header = b'\xab\xcd\x00\x19' + self.length.to_bytes(4, 'little')
+        crc = crc16(header)
+
+        return header + bytes([crc & 255, crc >> 8])
+
+
+class FlakySimulator(UT330Simulator):
+    """Corrupts the first failures responses, then works"""
+
+    def __init__(self, failures, **kwargs):
+
+        self.failures = failures
+        super().__init__(**kwargs)
+
+    def _fault(self, response):
+
+        if self.failures:
+            self.failures -= 1
+            return response[:-1] + bytes([response[-1] ^ 1])
+
+        return response
+
+
+class LoggingSimulator(UT330Simulator):
+    """Keeps a list of the commands it's received, in order"""
+
+    def __init__(self, **kwargs):
+
+        self.log = []
+        super().__init__(**kwargs)
+
+    def respond(self, command, payload=b''):
+
+        self.log.append(command)
+
+        return super().respond(command, payload)
+
+
+# %%---------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def connect(simulator, device=None):
+    """Connects device (a new UT330 if None) to the simulator with a short
+    read timeout"""
+
+    device = UT330() if device is None else device
+    device.connect(simulator.port)
+    device.tuner.learn = False
+    device.tuner.read_timeout = 0.5
+
+    return device
+
+
+def run(start, step, count):
+    """Returns count timestamps step seconds apart from start"""
+
+    return start + np.arange(count)*np.timedelta64(step, 's')
+
+
+def waiting(device):
+    """Returns the number of bytes the device has sent that haven't been
+    read, once they've had time to arrive"""
+
+    time.sleep(0.1)
+
+    return device._ut330.in_waiting
+
+
+# %%---------------------------------------------------------------------------
+# Decode modes
+# -----------------------------------------------------------------------------
+def test_modes_agree(ut330):
+    """Every read_data mode gives the same readings"""
+
+    batch = ut330.read_data()
+    records = ut330.read_data(mode='records')
+    columns = ut330.read_data(mode='columns')
+    runs = ut330.read_data(mode='runs')
+    raw = ut330.read_data(mode='raw')
+
+    assert isinstance(batch, RecordBatch)
+    assert len(batch) == len(records) == 1000
+    assert batch.records() == records
+    assert list(batch) == records
+    assert batch[0] == records[0]
+    assert batch[-1] == records[-1]
+
+    for column in RecordBatch.COLUMNS:
+        assert np.array_equal(batch[column], columns[column])
+
+    assert np.array_equal(runs['Timestamp'].timestamps(),
+                          columns['Timestamp'])
+    assert np.array_equal(RecordBatch.from_payload(raw).timestamps,
+                          batch.timestamps)
+
+
+def test_high_humidity_and_pressure():
+    """Humidity and pressure are unsigned, so readings of 3276.8 and over
+    don't wrap round to negative numbers"""
+
+    payload = bytearray(make_payload(100))
+    records = np.frombuffer(payload, dtype=RECORD_DTYPE)
+    records['humidity'][:50] = 40000
+    records['pressure'][:50] = 65535
+    records['temperature'][:50] = -300
+
+    with UT330Simulator(records=bytes(payload)) as simulator:
+        ut330 = connect(simulator)
+        batch = ut330.read_data()
+        columns = ut330.read_data(mode='columns')
+        records = ut330.read_data(mode='records')
+        ut330.disconnect()
+
+    for column in RecordBatch.COLUMNS:
+        assert np.array_equal(batch[column], columns[column])
+
+    assert batch.records() == records
+    assert batch[0]['Relative humidity (%)'] == 4000.0
+    assert batch[0]['Pressure (hPa)'] == 6553.5
+    assert batch[0]['Temperature (C)'] == -30.0
+
+
+def test_batch_round_trip(ut330):
+    """A batch made from records or columns is the same as the original"""
+
+    batch = ut330.read_data()
+
+    assert RecordBatch.from_records(batch.records()).records() == \
+        batch.records()
+    assert RecordBatch.from_columns(batch.columns()).records() == \
+        batch.records()
+    assert len(batch[10:20]) == 10
+    assert not batch[:0]
+
+
+def test_empty_device():
+    """A device with no records gives an empty batch"""
+
+    with UT330Simulator(records=0) as simulator:
+        ut330 = connect(simulator)
+        assert len(ut330.read_data()) == 0
+        assert waiting(ut330) == 0
+        ut330.disconnect()
+
+
+# %%---------------------------------------------------------------------------
+# Read data header
+# -----------------------------------------------------------------------------
+def test_zero_length_header():
+    """A header giving a length of zero still has its CRC read, so nothing
+    is left for the next command"""
+
+    with HeaderSimulator(0, records=10) as simulator:
+        ut330 = connect(simulator)
+
+        assert len(ut330.read_data()) == 0
+        assert waiting(ut330) == 0
+        assert ut330.read_device_name() == 'UT330B'
+
+        ut330.disconnect()
+
+
+def test_zero_length_header_async():
+    """The same as test_zero_length_header for AsyncUT330"""
+
+    async def read(port):
+        ut330 = AsyncUT330()
+        ut330.connect(port)
+        data = await ut330.read_data()
+        left = waiting(ut330)
+        name = await ut330.read_device_name()
+        ut330.disconnect()
+        return data, left, name
+
+    with HeaderSimulator(0, records=10) as simulator:
+        data, left, name = asyncio.run(read(simulator.port))
+
+    assert len(data) == 0
+    assert left == 0
+    assert name == 'UT330B'
+
+
+@pytest.mark.parametrize('length', [0xFFFFFFF0, 2 + 12*60001, 2 + 12*100 + 5])
+def test_bad_header_length(length):
+    """A header length that can't be right raises an IOError before the
+    buffer for the data is allocated, and the next command still works"""
+
+    with HeaderSimulator(length, records=10) as simulator:
+        ut330 = connect(simulator)
+        ut330.retry = RetryPolicy(attempts=1)
+
+        tracemalloc.start()
+        try:
+            with pytest.raises(IOError, match='header gives a length'):
+                ut330.read_data()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert peak < 1e6
+        assert ut330.read_device_name() == 'UT330B'
+
+        ut330.disconnect()
+
+
+def test_bad_header_length_async():
+    """The same as test_bad_header_length for AsyncUT330"""
+
+    async def read(port):
+        ut330 = AsyncUT330()
+        ut330.connect(port)
+        ut330.retry = RetryPolicy(attempts=1)
+        try:
+            with pytest.raises(IOError, match='header gives a length'):
+                await ut330.read_data()
+        finally:
+            ut330.disconnect()
+
+    with HeaderSimulator(0xFFFFFFF0, records=10) as simulator:
+        asyncio.run(read(simulator.port))
+
+
+def test_async_pages():
+    """AsyncUT330 reads in the tuner's page size and reports each page to
+    the tuner"""
+
+    async def read(port):
+        ut330 = AsyncUT330()
+        ut330.connect(port)
+        ut330.tuner.page_size = 1024
+        ut330.tuner.learn = False
+        pages = []
+        data = await ut330.read_data(progress=pages.append)
+        ut330.disconnect()
+        return ut330.tuner, pages, data
+
+    with UT330Simulator(records=1000) as simulator:
+        tuner, pages, data = asyncio.run(read(simulator.port))
+
+    # The 8 byte header is one page, then the records and CRC are 12,002
+    # bytes
+    assert len(data) == 1000
+    assert len(pages) == 12
+    assert [page['bytes received'] for page in pages[:2]] == [1024, 2048]
+    assert tuner.pages == 13
+    assert tuner.page_size == 1024
+
+
+def test_async_tuning():
+    """AsyncUT330 learns the page size and read timeout"""
+
+    async def read(port):
+        ut330 = AsyncUT330()
+        ut330.connect(port)
+        ut330.tuner.page_size = 1024
+        data = await ut330.read_data()
+        ut330.disconnect()
+        return ut330.tuner, data
+
+    with UT330Simulator(records=5000) as simulator:
+        tuner, data = asyncio.run(read(simulator.port))
+
+    assert len(data) == 5000
+    assert tuner.page_size > 1024
+    assert tuner.rate is not None
+    assert tuner.read_timeout == tuner.min_read_timeout
+
+
+def test_async_read_timeout():
+    """AsyncUT330 gives up on a device that stops sending after the tuner's
+    read timeout"""
+
+    async def read(port):
+        ut330 = AsyncUT330()
+        ut330.connect(port)
+        ut330.tuner.learn = False
+        ut330.tuner.read_timeout = 0.2
+        ut330.retry = RetryPolicy(attempts=1)
+        start = time.monotonic()
+        try:
+            with pytest.raises(PartialDataError):
+                await ut330.read_data()
+        finally:
+            ut330.disconnect()
+        return time.monotonic() - start
+
+    with UT330Simulator(records=1000, faults={'truncate': 1.0}) as simulator:
+        assert asyncio.run(read(simulator.port)) < 1
+
+
+# %%---------------------------------------------------------------------------
+# Retries and partial downloads
+# -----------------------------------------------------------------------------
+def test_retry_after_corruption():
+    """A corrupted response is tried again"""
+
+    with FlakySimulator(2, records=100) as simulator:
+        ut330 = connect(simulator)
+
+        assert ut330.read_config()['device name'] == 'UT330B'
+        assert simulator.commands[0x11] == 3
+
+        assert len(ut330.read_data()) == 100
+
+        ut330.disconnect()
+
+
+def test_retries_run_out():
+    """When every try fails, the last error is raised"""
+
+    with FlakySimulator(10, records=100) as simulator:
+        ut330 = connect(simulator)
+        ut330.retry = RetryPolicy(attempts=2, backoff=0)
+
+        with pytest.raises(IOError, match='bad CRC'):
+            ut330.read_config()
+
+        assert simulator.commands[0x11] == 2
+
+        ut330.disconnect()
+
+
+@pytest.mark.parametrize('mode', ['batch', 'records', 'columns', 'raw'])
+def test_partial_download(mode):
+    """If the device stops part way through every try, the complete records
+    that arrived are kept"""
+
+    with UT330Simulator(records=1000, seed=3) as simulator:
+        ut330 = connect(simulator)
+        full = ut330.read_data()
+
+        simulator.faults = {'truncate': 1.0}
+        with pytest.raises(PartialDataError) as error:
+            ut330.read_data(mode=mode)
+
+        ut330.disconnect()
+
+    data = error.value.data
+    if mode == 'raw':
+        data = RecordBatch.from_payload(data)
+    elif mode != 'batch':
+        data = RecordBatch.from_columns(data) if mode == 'columns' \
+            else RecordBatch.from_records(data)
+
+    assert error.value.expected == 1000
+    assert error.value.missing == 1000 - error.value.received
+    assert len(data) == error.value.received
+    assert np.array_equal(data.timestamps, full.timestamps[:len(data)])
+
+
+# %%---------------------------------------------------------------------------
+# iter_records
+# -----------------------------------------------------------------------------
+def test_iter_records(ut330):
+    """iter_records gives the same readings as read_data"""
+
+    assert list(ut330.iter_records(page_size=1000)) == \
+        ut330.read_data(mode='records')
+    assert ut330.pacer.floors == {}
+
+
+def test_iter_records_stopped_early(ut330):
+    """Stopping iter_records early isn't a device failure, so the read data
+    pause isn't raised, and the device can still be used"""
+
+    for count, reading in enumerate(ut330.iter_records(page_size=120)):
+        if count == 5:
+            break
+
+    readings = ut330.iter_records(page_size=120)
+    next(readings)
+    with pytest.raises(KeyError):
+        readings.throw(KeyError('consumer'))
+
+    assert ut330.pacer.floors == {}
+    assert len(ut330.read_data()) == 1000
+
+
+def test_iter_records_bad_crc():
+    """A corrupted download is a device failure"""
+
+    with FlakySimulator(1, records=100) as simulator:
+        ut330 = connect(simulator)
+
+        with pytest.raises(IOError, match='bad CRC'):
+            list(ut330.iter_records())
+
+        assert 'read_data' in ut330.pacer.floors
+
+        ut330.disconnect()
+
+
+# %%---------------------------------------------------------------------------
+# CommandPacer
+# -----------------------------------------------------------------------------
+def test_pacer_gaps():
+    """The pause shortens as a command works, and there's no pause before
+    the first command"""
+
+    pacer = CommandPacer(gap=0.01)
+    assert pacer.delay('read_config') == 0
+
+    pacer.record('read_config', True)
+    assert pacer.gaps['read_config'] == pytest.approx(0.0075)
+    assert 0 < pacer.delay('read_config') <= 0.0075
+
+    # Commands are paced separately
+    assert 0.0075 < pacer.delay('read_data') <= 0.01
+
+    for _ in range(50):
+        pacer.record('read_config', True)
+    assert pacer.gaps['read_config'] < 1e-6
+
+    # An unknown outcome changes nothing
+    pacer.record('read_data', None)
+    assert 'read_data' not in pacer.gaps
+
+
+def test_pacer_floors():
+    """A failure raises the pause and it never goes below twice the pause
+    that failed, up to max_gap"""
+
+    pacer = CommandPacer(gap=0.01, max_gap=0.05)
+
+    pacer.record('read_config', True)
+    pacer.record('read_config', False)
+    assert pacer.floors['read_config'] == pytest.approx(0.015)
+    assert pacer.gaps['read_config'] == pytest.approx(0.015)
+
+    for _ in range(20):
+        pacer.record('read_config', True)
+    assert pacer.gaps['read_config'] == pytest.approx(0.015)
+
+    for _ in range(5):
+        pacer.record('read_config', False)
+    assert pacer.floors['read_config'] == 0.05
+
+    # A failure with no pause still gives a small floor
+    pacer = CommandPacer(gap=0)
+    pacer.record('read_config', False)
+    assert pacer.floors['read_config'] == 0.002
+
+    copy = CommandPacer()
+    copy.load(pacer.settings())
+    assert copy.settings() == pacer.settings()
+
+
+def test_pacer_learns(ut330):
+    """Commands that work shorten the pause, and a corrupted response sets a
+    floor for that command only"""
+
+    for _ in range(5):
+        ut330.read_device_name()
+
+    assert ut330.pacer.gaps['read_device_name'] < ut330.pacer.gap
+    assert ut330.pacer.floors == {}
+
+    with FlakySimulator(1, records=10) as simulator:
+        flaky = connect(simulator)
+        flaky.read_config()
+        flaky.read_device_name()
+        flaky.disconnect()
+
+    assert list(flaky.pacer.floors) == ['read_config']
+    assert flaky.pacer.gaps['read_device_name'] < flaky.pacer.gap
+
+
+# %%---------------------------------------------------------------------------
+# ReadTuner
+# -----------------------------------------------------------------------------
+def test_tuner_short_pages():
+    """A partially filled page halves the page size, and it never grows
+    back to that size"""
+
+    tuner = ReadTuner(page_size=8192)
+
+    tuner.record(8192, 5000, 0.1)
+    assert tuner.page_size == 4096
+    assert tuner.ceiling == 8192
+    assert tuner.short_pages == 1
+
+    # Full pages grow the page size, but not up to the ceiling
+    for _ in range(3*ReadTuner.GROW_AFTER):
+        tuner.record(tuner.page_size, tuner.page_size, 0.01)
+    assert tuner.page_size == 4096
+
+    # No data says nothing about the page size
+    tuner.record(4096, 0, 1)
+    assert tuner.pages == 1 + 3*ReadTuner.GROW_AFTER
+
+
+def test_tuner_growth_and_timeout():
+    """Full pages double the page size and set the timeout from the rate,
+    within the limits"""
+
+    tuner = ReadTuner(page_size=1024, max_page_size=4096)
+
+    for _ in range(4*ReadTuner.GROW_AFTER):
+        tuner.record(tuner.page_size, tuner.page_size, tuner.page_size/1e6)
+
+    assert tuner.page_size == 4096
+    assert tuner.rate == pytest.approx(1e6)
+    assert tuner.read_timeout == tuner.min_read_timeout
+
+    # A slow link gets a longer timeout
+    for _ in range(50):
+        tuner.record(4096, 4096, 20)
+    assert tuner.read_timeout == tuner.max_read_timeout
+
+
+def test_tuner_not_learning():
+    """With learning off, pages are counted but nothing changes"""
+
+    tuner = ReadTuner(page_size=8192)
+    tuner.learn = False
+
+    tuner.record(8192, 100, 0.1)
+    for _ in range(2*ReadTuner.GROW_AFTER):
+        tuner.record(8192, 8192, 0.01)
+
+    assert tuner.page_size == 8192
+    assert tuner.read_timeout == 5
+    assert tuner.ceiling is None
+    assert (tuner.pages, tuner.short_pages) == (1 + 2*ReadTuner.GROW_AFTER, 1)
+
+
+def test_tuner_load_limits():
+    """Loaded values outside the limits are brought inside them"""
+
+    settings = ReadTuner().settings()
+    settings.update({'page size': 10, 'read timeout': 100})
+
+    tuner = ReadTuner()
+    tuner.load(settings)
+
+    assert tuner.page_size == tuner.min_page_size
+    assert tuner.read_timeout == tuner.max_read_timeout
+
+
+def test_tuning_file(simulator, tmp_path):
+    """What's learned for a port is saved when the device disconnects and
+    loaded when it connects again"""
+
+    path = str(tmp_path / 'tuning.json')
+
+    ut330 = UT330(tuning_file=path)
+    ut330.connect(simulator.port)
+    ut330.tuner.page_size = 1024
+    ut330.read_data()
+    ut330.disconnect()
+
+    saved = load_tuning(path, simulator.port)
+    assert saved == ut330.tuning()
+    assert saved['transport']['pages'] == 13
+    assert saved['transport']['rate'] is not None
+    assert saved['pacer']['gaps']['read_data'] < 0.01
+    assert load_tuning(path, '/dev/other') is None
+
+    again = UT330(tuning_file=path)
+    again.connect(simulator.port)
+    assert again.tuning() == saved
+    again.disconnect()
+
+
+# %%---------------------------------------------------------------------------
+# Snapshot
+# -----------------------------------------------------------------------------
+# The commands a snapshot sends: read device name, config, and offsets
+SNAPSHOT = [0x51, 0x11, 0x17]
+
+
+def test_snapshot(ut330):
+    """A snapshot has the same results as reading each one"""
+
+    snapshot = ut330.snapshot()
+
+    assert snapshot['device name'] == ut330.read_device_name()
+    assert snapshot['config'] == dict(ut330.read_config(),
+                                      timestamp=snapshot['config']
+                                      ['timestamp'])
+    assert snapshot['offsets'] == ut330.read_offsets()
+
+    before, after = snapshot['config times']
+    assert before <= after
+    assert set(snapshot['timings']) == {'read_device_name', 'read_config',
+                                        'read_offsets'}
+    assert snapshot['total time'] >= sum(snapshot['timings'].values())
+
+
+def test_snapshot_not_interrupted():
+    """Another thread's command waits until the snapshot's finished"""
+
+    with LoggingSimulator(records=10, latency=0.02) as simulator:
+        ut330 = connect(simulator)
+
+        thread = threading.Thread(target=ut330.snapshot)
+        thread.start()
+        time.sleep(0.01)
+        ut330.read_offsets()
+        thread.join()
+
+        ut330.disconnect()
+
+    assert simulator.log == SNAPSHOT + [0x17]
+
+
+def test_snapshot_not_interrupted_async():
+    """Another coroutine's command waits until the snapshot's finished"""
+
+    async def read(port):
+        ut330 = AsyncUT330()
+        ut330.connect(port)
+
+        snapshot = asyncio.create_task(ut330.snapshot())
+        await asyncio.sleep(0.01)
+        offsets = await ut330.read_offsets()
+        result = await snapshot
+
+        ut330.disconnect()
+        return result, offsets
+
+    with LoggingSimulator(records=10, latency=0.02) as simulator:
+        snapshot, offsets = asyncio.run(read(simulator.port))
+
+    assert simulator.log == SNAPSHOT + [0x17]
+    assert snapshot['device name'] == 'UT330B'
+    assert set(snapshot['offsets']) == set(offsets)
+
+
+# %%---------------------------------------------------------------------------
+# TimestampRuns
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def timestamps():
+    """Five runs of ten readings: a restart an hour later, a delayed start
+    600s later, a change to a 120s interval, then a wraparound"""
+
+    start = np.datetime64('2020-01-01T00:00:00')
+
+    runs = [run(start, 60, 10)]
+    for gap, step in ((3600, 60), (600, 60), (120, 120)):
+        runs.append(run(runs[-1][-1] + np.timedelta64(gap, 's'), step, 10))
+    runs.append(run(start - np.timedelta64(6000, 's'), 60, 10))
+
+    return np.concatenate(runs)
+
+
+def test_runs(timestamps):
+    """The timestamps are stored as runs and built again exactly"""
+
+    runs = TimestampRuns.from_timestamps(timestamps)
+
+    assert list(runs.counts) == [10]*5
+    assert list(runs.steps.astype(np.int64)) == [60, 60, 60, 120, 60]
+    assert len(runs) == 50
+    assert np.array_equal(runs.timestamps(), timestamps)
+    assert runs.ends()[0] == timestamps[9]
+
+    single = TimestampRuns.from_timestamps(timestamps[:1])
+    assert list(single.counts) == [1]
+    assert np.array_equal(single.timestamps(), timestamps[:1])
+
+
+def test_gaps(timestamps):
+    """Each gap between runs is found and its kind worked out"""
+
+    gaps = TimestampRuns.from_timestamps(timestamps).gaps(interval=60,
+                                                          delay=600)
+
+    assert [gap['kind'] for gap in gaps] == ['restart', 'delay start',
+                                             'interval change', 'wraparound']
+    assert [gap['index'] for gap in gaps] == [10, 20, 30, 40]
+    assert [gap['gap'] for gap in gaps[:3]] == [3600, 600, 120]
+    assert gaps[3]['gap'] < 0
+    assert gaps[0]['before'] == timestamps[9]
+    assert gaps[0]['after'] == timestamps[10]
+
+
+def test_gaps_defaults(timestamps):
+    """Without the delay, a delayed start is a restart. Without the
+    interval, the longest run's step is used."""
+
+    gaps = TimestampRuns.from_timestamps(timestamps).gaps()
+
+    assert [gap['kind'] for gap in gaps] == ['restart', 'restart',
+                                             'interval change', 'wraparound']
+
+    assert TimestampRuns.from_timestamps(timestamps[:10]).gaps() == []
+    assert TimestampRuns([], [], []).gaps() == []
+
+
+def test_gaps_from_device(ut330):
+    """A download from a device that logged without stopping has no
+    gaps"""
+
+    runs = ut330.read_data(mode='runs')['Timestamp']
+    config = ut330.read_config()
+
+    assert runs.gaps(config['sampling interval'],
+                     config['delay timing']) == []
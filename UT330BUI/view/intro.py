@@ -33,6 +33,8 @@ class Intro():
                     """device, including the ability to erase data """
                     """to make space for more readings</li>"""
                     """<li>Visualize the temperature and humidity data</li>"""
+                    """<li>Watch the current temperature and humidity """
+                    """live</li>"""
                     """</ul>"""
                     """Any operations involving configuration or reading/"""
                     """erasing device data obviously requires the UT330B """
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on: 15:36:40 18-Oct-2026
+
+Author: Mike Woodward
+
+This code is licensed under the MIT license
+"""
+
+
+# %%---------------------------------------------------------------------------
+# Imports
+# -----------------------------------------------------------------------------
+import datetime
+from bokeh.io import curdoc
+from bokeh.models.widgets import (Div, Panel, Spinner, Toggle)
+from bokeh.plotting import Figure
+from bokeh.layouts import column, row
+from bokeh.models import ColumnDataSource, LinearAxis, Range1d
+from model.ringbuffer import RingBuffer
+
+
+# %%---------------------------------------------------------------------------
+# Live
+# -----------------------------------------------------------------------------
+class Live():
+    """Shows the current temperature and humidity on the UT330B, updated
+    every few seconds."""
+
+    INSTRUCTIONS = ("""Connect to the UT330B on the 'Read & save' or """
+                    """'Settings' tab, choose how often to read the """
+                    """device, then press Start live monitoring. The """
+                    """chart keeps the most recent readings, the oldest """
+                    """are dropped when it's full.""")
+
+    # The columns in the live readings
+    COLUMNS = {'Timestamp': 'datetime64[ms]',
+               'Temperature (C)': 'float64',
+               'Relative humidity (%)': 'float64'}
+
+    # %%
+    def __init__(self, controller):
+        """Method sets up object.  First part of two-part initialization."""
+
+        self.controller = controller
+
+        # The periodic callback that reads the device, and the document
+        # it's on
+        self.poll = None
+        self.document = None
+
+        # Instructions header
+        self.instructions_header =\
+            Div(text="""<span style='font-weight:bold'>"""
+                     """How to use this tab</span>""")
+        # Provides instructions on how to use the tab.
+        self.instructions = Div(text=self.INSTRUCTIONS)
+        # How often to read the device
+        self.interval =\
+            Spinner(title="""Read every (s)""", low=1, high=3600, step=1,
+                    value=5, width=150)
+        # The number of readings to keep
+        self.keep =\
+            Spinner(title="""Readings to keep""", low=10, high=1000000,
+                    step=100, value=17280, width=150)
+        # Starts and stops live monitoring
+        self.start_stop =\
+            Toggle(label="""Start live monitoring""",
+                   button_type="""success""")
+        # The latest readings and any errors
+        self.status = Div(text="""Not monitoring""")
+
+        # The readings, held on the server in fixed size arrays
+        self.buffer = RingBuffer(int(self.keep.value), self.COLUMNS)
+
+        self.cds = ColumnDataSource({name: [] for name in self.COLUMNS})
+
+        # Chart to show temperature and humidity.
+        self.temphumidity = Figure(x_axis_type='datetime',
+                                   title="Live humidity & temperature",
+                                   x_axis_label='Datetime',
+                                   y_axis_label='Temperature (C)')
+
+        self.temphumidity.line(x='Timestamp',
+                               y='Temperature (C)',
+                               line_color='red',
+                               legend_label='Temperature (C)',
+                               line_width=2,
+                               line_alpha=0.5,
+                               source=self.cds)
+
+        self.temphumidity.extra_y_ranges = \
+            {"humidity": Range1d(start=0, end=100)}
+
+        self.temphumidity.add_layout(
+            LinearAxis(y_range_name="humidity",
+                       axis_label='Humidity (%)'), 'right')
+
+        self.temphumidity.line(x='Timestamp',
+                               y='Relative humidity (%)',
+                               legend_label='Relative humidity (%)',
+                               line_color='blue',
+                               line_width=2,
+                               line_alpha=0.5,
+                               source=self.cds,
+                               y_range_name="humidity")
+
+        self.temphumidity.legend.click_policy = "hide"
+
+        self.temphumidity.title.text_font_size = '20px'
+        self.temphumidity.xaxis.axis_label_text_font_size = '15px'
+        self.temphumidity.xaxis.major_label_text_font_size = '15px'
+        self.temphumidity.yaxis.axis_label_text_font_size = '15px'
+        self.temphumidity.yaxis.major_label_text_font_size = '15px'
+
+        # Layout
+        self.layout = row(
+            children=[column(children=[self.instructions_header,
+                                       self.instructions,
+                                       self.interval,
+                                       self.keep,
+                                       self.start_stop,
+                                       self.status],
+                             sizing_mode='fixed',
+                             width=250),
+                      column(self.temphumidity, sizing_mode='stretch_both')],
+            sizing_mode='stretch_both')
+        self.panel = Panel(child=self.layout, title='Live')
+
+    # %%
+    def setup(self):
+        """Method sets up object. Second part of two-part initialization."""
+
+        self.start_stop.on_change("active", self.callback_start_stop)
+        self.interval.on_change("value", self.callback_interval)
+        self.keep.on_change("value", self.callback_keep)
+
+        curdoc().on_session_destroyed(self.callback_session_destroyed)
+
+    # %%
+    def update(self):
+        """Method updates object."""
+
+        # Stop reading if the device has gone
+        if self.poll is not None and not self.controller.connected:
+            self.start_stop.active = False
+
+    # %%
+    def start(self):
+        """Starts reading the device"""
+
+        if self.poll is None:
+            self.document = curdoc()
+            self.poll = self.document.add_periodic_callback(
+                self.callback_poll, int(self.interval.value*1000))
+
+        self.start_stop.label = """Stop live monitoring"""
+        self.status.text = """Monitoring..."""
+
+    # %%
+    def stop(self):
+        """Stops reading the device"""
+
+        if self.poll is not None:
+            try:
+                self.document.remove_periodic_callback(self.poll)
+            except ValueError:
+                # The callback has already gone, e.g. the session closed
+                pass
+            self.poll = None
+
+        self.start_stop.label = """Start live monitoring"""
+
+    # %%
+    def callback_start_stop(self, attrname, old, new):
+        """Callback method for Start/stop live monitoring"""
+
+        if new:
+            self.start()
+        else:
+            self.stop()
+
+    # %%
+    def callback_interval(self, attrname, old, new):
+        """Callback method for the read interval, restarts the reading at
+        the new interval"""
+
+        if self.poll is not None:
+            self.stop()
+            self.start()
+
+    # %%
+    def callback_keep(self, attrname, old, new):
+        """Callback method for the number of readings to keep. The readings
+        so far are kept, up to the new number."""
+
+        self.buffer.resize(int(new))
+        self.cds.data = self.buffer.columns()
+
+    # %%
+    def callback_poll(self):
+        """Callback method to read the current temperature and humidity"""
+
+        self.controller.read_current(self.show_current)
+
+    # %%
+    def show_current(self):
+        """Adds the current readings once the controller has read them"""
+
+        readings = self.controller.device_current
+
+        if readings is None:
+            self.start_stop.active = False
+            self.status.text = self.controller.status
+            return
+
+        reading = {'Timestamp': datetime.datetime.now(),
+                   'Temperature (C)': readings['temperature'],
+                   'Relative humidity (%)': readings['humidity']}
+
+        self.buffer.append(reading)
+        self.cds.stream({name: [value] for name, value in reading.items()},
+                        rollover=self.buffer.capacity)
+
+        self.status.text = ("""{0:%H:%M:%S} - {1} C, {2} %RH"""
+                            .format(reading['Timestamp'],
+                                    reading['Temperature (C)'],
+                                    reading['Relative humidity (%)']))
+
+    # %%
+    def callback_session_destroyed(self, session_context):
+        """Callback method for the browser session closing"""
+
+        self.stop()
+        self.buffer.clear()
@@ -12,14 +12,19 @@ This code is licensed under the MIT license
 # %%---------------------------------------------------------------------------
 # Imports
 # -----------------------------------------------------------------------------
-from bokeh.models.widgets import (Div, FileInput, Panel)
+from bokeh.io import curdoc
+from bokeh.models.widgets import (Button, Div, FileInput, Panel, Select)
 from bokeh.plotting import Figure
 from bokeh.layouts import column, row
 from bokeh.models import ColumnDataSource, LinearAxis, Range1d
 
+import numpy as np
 import pandas as pd
-from io import BytesIO
 import base64
+import sqlite3
+from model.archive import COLUMNS, read_frame
+from model.UT330 import RecordBatch
+from model.downsample import lttb, merge_periods
 
 # %%---------------------------------------------------------------------------
 # ReadDisplay
@@ -27,6 +32,20 @@ import base64
 class ReadDisplay():
     """Reads data saved to file into the system and displays it."""
 
+    # The number of points plotted per pixel of chart width. Long files are
+    # downsampled to this many points so the browser stays responsive.
+    POINTS_PER_PIXEL = 2
+
+    # The chart width in pixels to use before the browser has told us the
+    # actual width
+    DEFAULT_WIDTH = 1500
+
+    # How long to wait (ms) after the last zoom or pan before replotting
+    DEBOUNCE = 250
+
+    # The data for a min to max band with nothing in it
+    NO_BAND = {'Timestamp': [], 'min': [], 'max': []}
+
     # %%
     def __init__(self, controller):
         """Method sets up object.  First part of two-part initialization."""
@@ -40,15 +59,32 @@ class ReadDisplay():
                      sizing_mode='stretch_width')
 
         # Selects the data file to read into the system
-        self.select_file = FileInput(accept=".csv",
+        self.select_file = FileInput(accept=".csv,.parquet",
                                      sizing_mode='stretch_width')
-        
+
+        # Selects a device in the store to display instead of a file
+        self.select_device = Select(title="""Or choose a device from the """
+                                          """store""",
+                                    options=[''],
+                                    value='',
+                                    sizing_mode='stretch_width')
+
+        # Displays the data read from the device on the Read & save tab
+        self.show_device = Button(label="Display UT330B data",
+                                  button_type="success",
+                                  sizing_mode='stretch_width')
+
         # Shows summary and status for data read in.
         self.status = Div(text="""No file connected""",
                           sizing_mode='stretch_width')
 
+        # The x range is set to the data when a file is read in. Zooming and
+        # panning change it, and the data in the new range is replotted.
+        self.x_range = Range1d(start=0, end=1)
+
         # Chart to show temperature and/or humidity.
         self.temphumidity = Figure(x_axis_type='datetime',
+                                   x_range=self.x_range,
                                    title="Humidity & temperature by datetime",
                                    x_axis_label='Datetime',
                                    y_axis_label='Temperature (C)')
@@ -58,7 +94,40 @@ class ReadDisplay():
              'Temperature (C)': [25.0],
              'Relative humidity (%)': [40.0]})
 
-        self.cds = ColumnDataSource(df)
+        # The data read in from file or the device, at full resolution, as a
+        # RecordBatch sorted by timestamp
+        self.data = None
+
+        # The device in the store that's displayed instead of a file, and
+        # the store version the device list is from
+        self.device = None
+        self.store_version = None
+
+        # The pending replot after a zoom or pan, and the x range last
+        # plotted
+        self.refresh = None
+        self.plotted = None
+
+        # Temperature and humidity are downsampled separately, so they each
+        # have their own timestamps
+        self.temperature_cds = ColumnDataSource(
+            df[['Timestamp', 'Temperature (C)']])
+        self.humidity_cds = ColumnDataSource(
+            df[['Timestamp', 'Relative humidity (%)']])
+
+        # The min to max band for each period when a rollup from the store
+        # is shown, so peaks the means smooth out stay visible. They're
+        # empty for readings.
+        self.temperature_band = ColumnDataSource(self.NO_BAND)
+        self.humidity_band = ColumnDataSource(self.NO_BAND)
+
+        self.temphumidity.varea(x='Timestamp',
+                                y1='min',
+                                y2='max',
+                                fill_color='red',
+                                fill_alpha=0.2,
+                                legend_label='Temperature (C)',
+                                source=self.temperature_band)
 
         self.temphumidity.line(x='Timestamp',
                                y='Temperature (C)',
@@ -66,7 +135,7 @@ class ReadDisplay():
                                legend_label='Temperature (C)',
                                line_width=2,
                                line_alpha=0.5,
-                               source=self.cds)
+                               source=self.temperature_cds)
 
         self.temphumidity.extra_y_ranges = \
             {"humidity": Range1d(start=0, end=100)}
@@ -81,9 +150,18 @@ class ReadDisplay():
                                line_color='blue',
                                line_width=2,
                                line_alpha=0.5,
-                               source=self.cds,
+                               source=self.humidity_cds,
                                y_range_name="humidity")
 
+        self.temphumidity.varea(x='Timestamp',
+                                y1='min',
+                                y2='max',
+                                fill_color='blue',
+                                fill_alpha=0.2,
+                                legend_label='Relative humidity (%)',
+                                source=self.humidity_band,
+                                y_range_name="humidity")
+
         self.temphumidity.legend.click_policy = "hide"
 
         self.temphumidity.title.text_font_size = '20px'
@@ -96,9 +174,11 @@ class ReadDisplay():
         self.layout = row(
             children=[column(children=[self.file_header,
                                        self.select_file,
+                                       self.select_device,
+                                       self.show_device,
                                        self.status],
                              sizing_mode='fixed',
-                             width=250, height=80),
+                             width=250, height=180),
                       column(self.temphumidity, sizing_mode='stretch_both')],
             sizing_mode='stretch_both')
         self.panel = Panel(child=self.layout, title='Read & display')
@@ -108,12 +188,213 @@ class ReadDisplay():
         """Method sets up object. Second part of two-part initialization."""
 
         self.select_file.on_change("value", self.callback_select_file)
+        self.select_device.on_change("value", self.callback_select_device)
+        self.show_device.on_click(self.callback_show_device)
+        self.temphumidity.on_change("inner_width", self.callback_resize)
+        self.x_range.on_change("start", self.callback_x_range)
+        self.x_range.on_change("end", self.callback_x_range)
 
     # %%
     def update(self):
         """Method updates object."""
 
-        pass
+        # List the devices in the store when readings have been added
+        if self.store_version == self.controller.store_version:
+            return
+
+        # Don't make an empty store just to list it, it's made when data is
+        # stored
+        try:
+            store = self.controller.data_store(create=False)
+            if store is None:
+                return
+            devices = store.devices()
+        except (sqlite3.Error, OSError):
+            return
+
+        self.store_version = self.controller.store_version
+
+        self.select_device.options = [''] + [device['device name']
+                                             for device in devices]
+
+    # %%
+    def plot_data(self):
+        """Plots the data read in that's inside the x range. If there's more
+        data than the chart can show, it's downsampled to fit the chart
+        width."""
+
+        if self.data is None and self.device is None:
+            return
+
+        width = self.temphumidity.inner_width or self.DEFAULT_WIDTH
+        points = width*self.POINTS_PER_PIXEL
+
+        self.plotted = (self.x_range.start, self.x_range.end)
+
+        if self.device is not None:
+            self.plot_store(points)
+            return
+
+        # The x range is in milliseconds since the epoch. Keep one reading
+        # either side of the range so the lines run to the chart edges.
+        timestamps = self.data.timestamps
+        window = np.array([self.x_range.start, self.x_range.end],
+                          dtype=np.int64).astype('datetime64[ms]')
+        window = window.astype(timestamps.dtype)
+        first, last = np.searchsorted(timestamps, window)
+        first = max(first - 1, 0)
+        last = min(last + 1, len(timestamps))
+
+        data = self.data[first:last]
+
+        self.temperature_band.data = dict(self.NO_BAND)
+        self.humidity_band.data = dict(self.NO_BAND)
+
+        for cds, name in ((self.temperature_cds, 'Temperature (C)'),
+                          (self.humidity_cds, 'Relative humidity (%)')):
+            x, y = lttb(data.timestamps, data[name], points)
+            cds.data = {'Timestamp': x, name: y}
+
+    # %%
+    def plot_store(self, points):
+        """Plots the device in the store for the x range. Long ranges come
+        from the coarsest rollup that still has at least points periods,
+        plotted as the period means with a band from the period min to max,
+        so peaks stay visible. Short ranges come from the readings."""
+
+        start, end = np.array([self.x_range.start, self.x_range.end],
+                              dtype=np.int64).astype('datetime64[ms]')
+
+        resolution, data = self.controller.data_store().fetch_for_width(
+            self.device, start, end, points)
+
+        for cds, band, name in (
+                (self.temperature_cds, self.temperature_band,
+                 'Temperature (C)'),
+                (self.humidity_cds, self.humidity_band,
+                 'Relative humidity (%)')):
+
+            if resolution is None:
+                x, y = lttb(data['Timestamp'], data[name], points)
+                band.data = dict(self.NO_BAND)
+            else:
+                # A rollup can still have more periods than points, merge
+                # them rather than pick some
+                x, y, low, high = merge_periods(
+                    data['Timestamp'], data['Count'], data[name],
+                    data[name + ' min'], data[name + ' max'], points)
+                band.data = {'Timestamp': x, 'min': low, 'max': high}
+
+            cds.data = {'Timestamp': x, name: y}
+
+        self.status.text = ('Showing {0} from the store, {1}.'.format(
+            self.device,
+            'the readings' if resolution is None
+            else 'the mean, min, and max for each ' + resolution))
+
+    # %%
+    def callback_x_range(self, attrname, old, new):
+        """Callback method for zooming and panning. Zooming or panning
+        changes the range many times a second, so the replot waits until
+        the changes stop. Setting the range in code (see show_all) calls
+        this too, but that range has already been plotted."""
+
+        if (self.x_range.start, self.x_range.end) == self.plotted:
+            return
+
+        document = curdoc()
+
+        if self.refresh is not None:
+            document.remove_timeout_callback(self.refresh)
+
+        self.refresh = document.add_timeout_callback(self.callback_refresh,
+                                                     self.DEBOUNCE)
+
+    # %%
+    def callback_refresh(self):
+        """Callback method for replotting after zooming or panning"""
+
+        self.refresh = None
+
+        if (self.x_range.start, self.x_range.end) != self.plotted:
+            self.plot_data()
+
+    # %%
+    def callback_resize(self, attrname, old, new):
+        """Callback method for the chart width changing"""
+
+        self.plot_data()
+
+    # %%
+    def show_all(self, start, end):
+        """Sets the x range to start to end (ms since 1970). Setting the
+        reset values makes the reset tool go back to all of the data
+        too."""
+
+        end = max(end, start + 1)
+        self.x_range.update(start=start, end=end,
+                            reset_start=start, reset_end=end)
+
+    # %%
+    def show_data(self, data):
+        """Shows all of data (a RecordBatch) instead of the store. Returns
+        the number of points plotted, or None if there are no readings in
+        data, when nothing is changed."""
+
+        if not data:
+            return None
+
+        self.device = None
+        self.select_device.value = ''
+
+        self.data = data.sorted()
+
+        start, end = (self.data.timestamps[[0, -1]]
+                      .astype('datetime64[ms]').astype(np.int64).tolist())
+        self.show_all(start, end)
+        self.plot_data()
+
+        return len(self.temperature_cds.data['Timestamp'])
+
+    # %%
+    def callback_show_device(self):
+        """Callback method for Display UT330B data"""
+
+        data = self.controller.device_data
+
+        if not data:
+            self.status.text = ("""There's no UT330B data to display, """
+                                """read it on the Read & save tab first.""")
+            return
+
+        shown = self.show_data(data)
+        self.status.text = ('Showing {0} of {1} readings from the UT330B.'
+                            .format(shown, len(data)))
+
+    # %%
+    def callback_select_device(self, attrname, old, new):
+        """Callback method for select device"""
+
+        if not new:
+            return
+
+        devices = {device['device name']: device
+                   for device in self.controller.data_store().devices()}
+
+        if new not in devices:
+            self.status.text = """{0} isn't in the store""".format(new)
+            return
+
+        self.data = None
+        self.device = new
+
+        # The store's time ranges don't include the end, so go one second
+        # past the last reading
+        start, end = (np.array([devices[new]['first'], devices[new]['last']],
+                               dtype='datetime64[ms]')
+                      .astype(np.int64).tolist())
+        self.show_all(start, end + 1000)
+        self.plot_data()
 
     # %%
     def callback_select_file(self, attrname, old, new):
@@ -121,30 +402,31 @@ class ReadDisplay():
 
         self.status.text = 'Reading in the data file....'
 
-        # Convert the data to a Pandas dataframe
-        convert = BytesIO(base64.b64decode(self.select_file.value))
-        df = pd.read_csv(convert)
+        # Convert the data to a Pandas dataframe, the file can be CSV or
+        # Parquet
+        try:
+            df = read_frame(self.select_file.filename,
+                            base64.b64decode(self.select_file.value))
+        except (ImportError, ValueError) as error:
+            self.status.text = ("""Can't read the file {0}: {1}"""
+                                .format(self.select_file.filename, error))
+            return
 
         # Check the Pandas dataframe has the correct fields
-        if set(df.columns) != set(['Timestamp',
-                                   'Temperature (C)',
-                                   'Relative humidity (%)',
-                                   'Pressure (Pa)']):
+        if set(df.columns) != set(COLUMNS):
             self.status.text = ("""The file {0} has the columns {1} """
                                 """when it should have the columns {2} """
                                 .format(self.select_file.filename,
                                         set(df.columns),
-                                        set(['Timestamp',
-                                             'Temperature (C)',
-                                             'Relative humidity (%)',
-                                             'Pressure (Pa)'])))
+                                        set(COLUMNS)))
             return
 
-        # Make sure the data types are correct
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+        shown = self.show_data(RecordBatch.from_columns(df))
 
-        self.cds.data = {'Timestamp': df['Timestamp'],
-                         'Temperature (C)': df['Temperature (C)'],
-                         'Relative humidity (%)': df['Relative humidity (%)']}
+        if shown is None:
+            self.status.text = ("""The file {0} has no readings in it."""
+                                .format(self.select_file.filename))
+            return
 
-        self.status.text = 'Read in the data file correctly.'
+        self.status.text = ('Read in the data file correctly, showing {0} '
+                            'of {1} readings.'.format(shown, len(df)))
@@ -13,9 +13,10 @@ This code is licensed under the MIT license
 # Imports
 # -----------------------------------------------------------------------------
 import os
-from bokeh.models.widgets import (Button, Div, Panel)
+import sqlite3
+from bokeh.models.widgets import (Button, Div, Panel, Select)
 from bokeh.layouts import column, row
-import pandas as pd
+from model.archive import FORMATS, write_frame
 
 
 # %%---------------------------------------------------------------------------
@@ -40,7 +41,8 @@ class ReadSave():
                     """    Write to disk - this button writes the """
                     """    temperature and humidity data read from the """
                     """    device to disk, the file name is the most """
-                    """    recent date and time in the data"""
+                    """    recent date and time in the data. Choose CSV or """
+                    """    the smaller and faster Parquet format first."""
                     """    </li>"""
                     """    <li>"""
                     """    Erase UT330B data - this button erases the """
@@ -59,6 +61,11 @@ class ReadSave():
 
         self.controller = controller
 
+        # The folder data files are written to
+        self.folder = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+            'data')
+
         # Instructions header
         self.instructions_header =\
             Div(text="""<span style='font-weight:bold'>"""
@@ -78,6 +85,10 @@ class ReadSave():
         # Writes temperature and humidity data to disk.
         self.write_to_disk =\
             Button(label="""Write to disk""", button_type="""success""")
+        # The format to write data files in.
+        self.file_format =\
+            Select(options=list(FORMATS), value='CSV',
+                   title="""File format""", width=150)
         # Removes all UT33)B temperature and humidity data from device.
         self.erase_data =\
             Button(label="""Erase UT330B data""", button_type="""success""")
@@ -91,16 +102,20 @@ class ReadSave():
                      """Connection status</span>""")
         # Status information on UT330B.
         self.status = Div(text=self.controller.status)
+        # Progress of reading data from the UT330B.
+        self.progress = Div(text="")
         # Layout widget and figures
         self.layout =\
             column(children=[self.instructions_header,
                              self.instructions,
                              self.status_header,
-                             self.status,   
+                             self.status,
+                             self.progress,
                              self.widgets_header,
                              row(self.connect, self.read_ut330b,
                                  self.write_to_disk, self.erase_data,
-                                 self.disconnect)],
+                                 self.disconnect),
+                             self.file_format],
                    sizing_mode="stretch_both")
         self.panel = Panel(child=self.layout,
                            title='Read & save')
@@ -120,6 +135,16 @@ class ReadSave():
         """Method updates object."""
         self.status.text = self.controller.status
 
+        progress = self.controller.device_progress
+        if progress is None:
+            self.progress.text = ""
+        else:
+            self.progress.text = (
+                """<progress value="{0}" max="{1}" style="width:400px">"""
+                """</progress> {2:.0f}%""".format(
+                    progress['bytes received'], progress['bytes total'],
+                    100*progress['bytes received']/progress['bytes total']))
+
     # %%
     def callback_connect(self):
         """Callback method for Connect"""
@@ -134,31 +159,47 @@ class ReadSave():
     def callback_write_to_disk(self):
         """Callback method for Write to disk"""
 
-        df = pd.DataFrame(self.controller.device_data)
+        data = self.controller.device_data
 
-        if df.empty:
+        if not data:
             self.status.text = ("Can't write data to UT330B because "
                                 "there's no data to write.")
             return
 
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-        time_str = df['Timestamp'].max().strftime("%Y%m%d_%H%M%S")
+        # The data is the RecordBatch from read_data
+        time_str = data.timestamps.max().item().strftime("%Y%m%d_%H%M%S")
 
-        # Check folder exists, if not, create it        
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        dir_path = os.path.dirname(dir_path)
-        folder = os.path.join(dir_path, 'data')
-        if not os.path.isdir(folder):
-            os.mkdir(folder)
+        # Check folder exists, if not, create it
+        if not os.path.isdir(self.folder):
+            os.mkdir(self.folder)
 
-        data_file = \
-            os.path.join(folder,
-                         'UT330_data_{0}.csv'.format(time_str))
+        data_file = os.path.join(self.folder,
+                                 'UT330_data_{0}'.format(time_str))
 
-        df.to_csv(data_file, index=False)
+        try:
+            data_file = write_frame(data, data_file, self.file_format.value)
+        except ImportError as error:
+            self.status.text = ("Can't write {0} files: {1}"
+                                .format(self.file_format.value, error))
+            return
 
         self.status.text = "Wrote data to file {0}.".format(data_file)
 
+        # Add the readings to the store too, so they can be charted with
+        # the readings from earlier downloads
+        try:
+            added = self.controller.store_data()
+        except (sqlite3.Error, OSError) as error:
+            self.status.text += " Can't add the data to the store: {0}".format(
+                error)
+            return
+
+        # The other tabs list the devices in the store, so update them all
+        self.controller.status = (self.status.text +
+                                  " Added {0} new readings to the store."
+                                  .format(added))
+        self.controller.update()
+
     # %%
     def callback_erase_data(self):
         """Callback method for Erase data"""
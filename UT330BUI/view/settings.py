@@ -42,7 +42,7 @@ class Settings():
         # Connect to the UT330B device.
         self.connect_ut330b =\
             Button(label="""Connect to UT330B""", button_type="""success""")
-        # Reads in the UT330B configuration
+        # Reads in the UT330B configuration (and offsets)
         self.read_config =\
             Button(label="""Read UT330B configuration""",
                    button_type="""success""")
@@ -225,13 +225,30 @@ class Settings():
     def callback_read_config(self):
         """Callback method for Read config"""
 
-        before = datetime.datetime.now()
-        self.controller.read_config()
-        after = datetime.datetime.now()
+        self.controller.read_snapshot(self.show_snapshot)
+
+    # %%
+    def show_snapshot(self):
+        """Shows the config and offsets once the controller has read
+        them. If the snapshot failed, the panels are left as they are and
+        the status shows the error."""
+
+        if self.controller.device_snapshot is None:
+            return
+
+        self.show_config()
+        self.show_offsets()
+
+    # %%
+    def show_config(self):
+        """Shows the config once the controller has read it"""
+
         config = self.controller.device_config
         if not config:
             return
 
+        before, after = self.controller.device_config_times
+
         self.time_offset = after - before
 
         # Likely computer time hen UT330B time sample was done
@@ -288,8 +305,13 @@ class Settings():
     def callback_read_offsets(self):
         """Callback method for read offsets"""
 
-        self.controller.read_offsets()
-        offsets = self.controller.device_offsets    
+        self.controller.read_offsets(self.show_offsets)
+
+    # %%
+    def show_offsets(self):
+        """Shows the offsets once the controller has read them"""
+
+        offsets = self.controller.device_offsets
         if not offsets:
             return
 